@@ -1,5 +1,7 @@
-# adapters/__init__.py
 import os
+import threading
+
+from .response_cache import CACHE_ENABLED, CachedClient, shared_cache
 
 USE_MOCK = os.getenv("AI_USE_MOCK", "").lower() in {"1", "true", "yes"}
 
@@ -10,7 +12,62 @@ else:
     from .ai_client import AIClient  # noqa: F401
     _SOURCE = "adapters.ai_client"
 
-__all__ = ["AIClient"]
+__all__ = ["AIClient", "get_client", "get_async_client", "client_stats"]
+
+_CLIENTS: dict = {}
+_CLIENTS_LOCK = threading.Lock()
+
 
 def which_client() -> str:
     return _SOURCE
+
+
+def _want_mock() -> bool:
+    return USE_MOCK or os.getenv("USE_MOCK", "0") == "1"
+
+
+def _shared(cls):
+    client = _CLIENTS.get(cls)
+    if client is None:
+        with _CLIENTS_LOCK:
+            client = _CLIENTS.get(cls)
+            if client is None:
+                client = cls()
+                if CACHE_ENABLED:
+                    client = CachedClient(client, shared_cache())
+                _CLIENTS[cls] = client
+    return client
+
+
+def get_client():
+    """
+    Process-wide AI client (one per mock/real choice), safe to share across
+    request threads. Mock vs real is decided at call time from USE_MOCK /
+    AI_USE_MOCK so tests and dev can flip it without re-importing. Unless
+    AI_CACHE_ENABLED=0, replies are served through the shared response cache.
+    """
+    if _want_mock():
+        from .mock_client import AIClient as cls
+    else:
+        from .ai_client import AIClient as cls
+    return _shared(cls)
+
+
+def get_async_client():
+    """
+    get_client() for the asyncio app: the same object also has an awaitable
+    acomplete(). Kept separate so the threaded app never imports httpx.
+    """
+    if _want_mock():
+        from .mock_client import AIClient as cls
+    else:
+        from .async_client import AsyncAIClient as cls
+    return _shared(cls)
+
+
+def client_stats() -> dict:
+    """Stats for every client built so far in this process."""
+    return {
+        f"{cls.__module__}": c.stats() if hasattr(c, "stats") else {}
+        for cls, c in list(_CLIENTS.items())
+    }
@@ -1,71 +1,75 @@
 # adapters/ai_client.py
 from __future__ import annotations
 
-import os
 import json
+import logging
+import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
 import requests
 
+from . import hooks
+from .http_pool import CONNECT_TIMEOUT, PooledSession
+from .backends import BackendPool, Endpoint, endpoints_from_env
+from .resilience import AIHTTPError, parse_retry_after
+from .json_extract import extract_json
+from .json_repair import note_llm_fallback, repair_json, repair_stats
+from .capabilities import (
+    CapabilityCache,
+    JSON_PARAMS,
+    is_unsupported_params_error,
+    rejected_from_error,
+    shared_capabilities,
+)
 
-# --- helpers ---------------------------------------------------------------
 
-_CODE_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE | re.MULTILINE)
-_JSON_STR_RE   = re.compile(r'"(?:\\.|[^"\\])*"')  # match a JSON string literal (rough but effective)
+logger = logging.getLogger(__name__)
+
+# Gateway error bodies are cut to this many chars in exception messages.
+ERROR_BODY_CHARS = 2000
 
+# Prompt-cache breakpoints (cache_control on the system message) for
+# gateways that only cache when asked (Anthropic models, also via LiteLLM).
+# "auto": only for models matching CACHE_HINT_MODELS; "on": every endpoint;
+# "off": never. OpenAI/vLLM/NIM cache shared prefixes automatically.
+CACHE_HINTS           = (os.getenv("AI_CACHE_HINTS") or "auto").strip().lower()
+CACHE_HINT_MODELS     = re.compile(os.getenv("AI_CACHE_HINT_MODELS") or r"claude|anthropic", re.I)
+# Providers won't cache prefixes shorter than ~1024 tokens; don't bother below.
+CACHE_HINT_MIN_CHARS  = int(os.getenv("AI_CACHE_HINT_MIN_CHARS") or 4000)
+CACHE_HINT_PARAM      = "cache_control"
 
-def _strip_code_fences(text: str) -> str:
-    if not isinstance(text, str):
-        return text
-    return _CODE_FENCE_RE.sub("", text)
 
+# --- helpers ---------------------------------------------------------------
 
-def _maybe_extract_json(text: str) -> str:
+def clean_json_text(text: str) -> str:
     """
-    Best-effort: return a JSON object string.
-    - Strip code fences if present
-    - If whole text parses, return it
-    - Else try to extract the last {...} blob
+    Return the JSON object in a model reply as strict-loadable text; falls
+    back to the local repair engine when the single-pass extractor finds none.
     """
-    if not text:
-        return text
-    text = _strip_code_fences(text).strip()
-
-    # fast path
-    try:
-        json.loads(text)
-        return text
-    except Exception:
-        pass
-
-    # extract last {...} block (greedy)
-    m = re.search(r"\{(?:.|\n|\r)*\}\s*$", text)
-    if m:
-        candidate = m.group(0)
-        try:
-            json.loads(candidate)
-            return candidate
-        except Exception:
-            pass
+    found = extract_json(text)
+    if found:
+        return found[0]
+    return repair_json(text) or text
 
-    return text  # give back original for further handling
 
+# --- shared session --------------------------------------------------------
 
-def _escape_ctrl_in_json_strings(text: str) -> str:
-    """
-    Escape raw control characters inside JSON string literals so json.loads won't choke.
-    Only modifies the contents of quoted strings. Does NOT blanket-escape backslashes.
-    """
-    if not isinstance(text, str):
-        return text
+_SESSION: PooledSession | None = None
+_SESSION_LOCK = threading.Lock()
 
-    def _fix(m: re.Match) -> str:
-        s = m.group(0)  # includes quotes
-        inner = s[1:-1]
-        # Replace actual control characters with escaped sequences
-        inner = inner.replace("\r", r"\r").replace("\n", r"\n").replace("\t", r"\t")
-        return f'"{inner}"'
 
-    return _JSON_STR_RE.sub(_fix, text)
+def shared_session() -> PooledSession:
+    """Process-wide keep-alive session (created on first use)."""
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                _SESSION = PooledSession()
+    return _SESSION
 
 
 # --- client ----------------------------------------------------------------
@@ -73,41 +77,321 @@ def _escape_ctrl_in_json_strings(text: str) -> str:
 class AIClient:
     """
     Minimal OpenAI-compatible chat completions client with:
-      - Litellm/NIM compatibility (auto-drop unsupported params)
-      - JSON enforcement/repair
+      - Litellm/NIM compatibility (auto-drop unsupported params, remembered
+        per base URL + model so later calls skip the rejected ones)
+      - JSON enforcement/repair (local repair engine first, LLM only as a last resort)
       - Control-character sanitation
+      - Pooled keep-alive connections shared across threads
+      - Retries with jittered backoff and optional hedging
+      - One or more gateways (AI_BACKENDS) with latency-aware routing and
+        per-endpoint health ejection
     """
 
-    def __init__(self):
-        self.base  = os.getenv("AI_API_BASE")
-        self.key   = os.getenv("AI_API_KEY")
-        self.model = os.getenv("AI_MODEL", "meta/llama-3.3-70b-instruct")
-
-        if not (self.base and self.key):
-            raise RuntimeError("Missing AI_API_BASE or AI_API_KEY in .env")
+    def __init__(
+        self,
+        session: PooledSession | None = None,
+        capabilities: CapabilityCache | None = None,
+        pool: BackendPool | None = None,
+    ):
+        self.pool = pool or BackendPool(endpoints_from_env())
+        primary = self.pool.endpoints[0]
+        # Kept for callers/caches that key on "the" model (e.g. CachedClient).
+        self.base  = primary.base
+        self.model = primary.model
 
-        self.base = self.base.rstrip("/")
+        self.session = session or shared_session()
+        self.caps = capabilities or shared_capabilities()
 
     # --- HTTP ---
 
-    def _post(self, body: dict) -> str:
-        url = f"{self.base}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.key}",
+    def _headers(self, ep: Endpoint) -> dict:
+        return {
+            "Authorization": f"Bearer {ep.key}",
             "Content-Type": "application/json",
         }
-        r = requests.post(url, json=body, headers=headers, timeout=60)
+
+    @staticmethod
+    def _error_message(status: int, url: str, body: dict, text: str) -> str:
+        """
+        Short error text: a summary of the request (never the prompt itself)
+        and the head of the gateway's reply, which is where capability
+        rejections are parsed from (see rejected_from_error).
+        """
+        msgs = body.get("messages") or []
+        chars = sum(len(m.get("content") or "") for m in msgs)
+        params = sorted(k for k in body if k not in ("messages", "model"))
+        text = text or ""
+        if len(text) > ERROR_BODY_CHARS:
+            text = text[:ERROR_BODY_CHARS] + f"... [{len(text) - ERROR_BODY_CHARS} more chars]"
+        return (f"AI API error {status} at {url}\n"
+                f"Request: {len(msgs)} messages, {chars} chars, params={params}\n"
+                f"Response: {text}")
+
+    def _raise_for_status(self, r: requests.Response, url: str, body: dict) -> None:
         try:
             r.raise_for_status()
         except requests.HTTPError as e:
-            raise RuntimeError(
-                f"AI API error {r.status_code} at {url}\nRequest body: {body}\nResponse: {r.text}"
+            raise AIHTTPError(
+                self._error_message(r.status_code, url, body, r.text),
+                status_code=r.status_code,
+                retry_after=parse_retry_after(r.headers.get("Retry-After")),
             ) from e
 
+    # --- prompt-cache hints ---
+
+    def _cache_hinted(self, ep: Endpoint, body: dict) -> dict | None:
+        """
+        Wire body with a cache_control breakpoint after the (static) system
+        prompt, or None when this endpoint shouldn't get hints.
+        """
+        if CACHE_HINTS == "off" or (CACHE_HINTS == "auto" and not CACHE_HINT_MODELS.search(ep.model)):
+            return None
+        msgs = body.get("messages") or []
+        if (not msgs or msgs[0].get("role") != "system" or not isinstance(msgs[0].get("content"), str)
+                or len(msgs[0]["content"]) < CACHE_HINT_MIN_CHARS):
+            return None
+        if CACHE_HINT_PARAM in self.caps.rejected(ep.base, ep.model):
+            self.caps.note_saved_round_trip()
+            return None
+        system = {"role": "system", "content": [{
+            "type": "text", "text": msgs[0]["content"], CACHE_HINT_PARAM: {"type": "ephemeral"},
+        }]}
+        return dict(body, model=ep.model, messages=[system, *msgs[1:]])
+
+    @staticmethod
+    def _hints_maybe_rejected(e: AIHTTPError) -> bool:
+        """A 400/422 to a hinted request that isn't plainly about the JSON params."""
+        if e.status_code not in (400, 422):
+            return False
+        reply = str(e).split("Response:", 1)[-1]
+        return CACHE_HINT_PARAM in reply or not is_unsupported_params_error(reply)
+
+    def _hints_rejected(self, ep: Endpoint) -> None:
+        # only called once the same request without hints went through
+        logger.info("gateway rejected prompt-cache hints; sending plain content", extra={"endpoint": ep.name})
+        self.caps.record_rejected(ep.base, ep.model, [CACHE_HINT_PARAM])
+
+    def _post_once(self, ep: Endpoint, body: dict) -> str:
+        hinted = self._cache_hinted(ep, body)
+        if hinted is not None:
+            try:
+                return self._post_wire(ep, body, hinted)
+            except AIHTTPError as e:
+                if not self._hints_maybe_rejected(e):
+                    raise
+            out = self._post_wire(ep, body, dict(body, model=ep.model))
+            self._hints_rejected(ep)
+            return out
+        return self._post_wire(ep, body, dict(body, model=ep.model))
+
+    def _post_wire(self, ep: Endpoint, body: dict, wire: dict) -> str:
+        url = f"{ep.base}/chat/completions"
+        t0 = time.monotonic()
+        try:
+            r = self.session.post(url, json=wire, headers=self._headers(ep))
+        except requests.RequestException:
+            self._emit_upstream(ep, body, "error", t0)
+            raise
+        if not r.ok:
+            self._emit_upstream(ep, body, r.status_code, t0)
+        self._raise_for_status(r, url, body)
+
         data = r.json()
+        out = self._content(data)
+        self._emit_upstream(ep, body, r.status_code, t0, out, data.get("usage"))
+        return out
+
+    def warm(self, connections: int = 1) -> dict:
+        """
+        Open `connections` keep-alive sockets (TCP + TLS) to every gateway so
+        the first real request doesn't pay for them. Uses GET {base}/models,
+        which any OpenAI-compatible gateway answers; the status is ignored.
+        Returns {endpoint name: True | error string}.
+        """
+        def _touch(ep: Endpoint) -> None:
+            r = self.session.get(f"{ep.base}/models", headers=self._headers(ep),
+                                 timeout=(CONNECT_TIMEOUT, CONNECT_TIMEOUT))
+            r.close()  # hands the socket back to the pool
+
+        out: dict = {}
+        n = max(int(connections), 1)
+        with ThreadPoolExecutor(max_workers=n * len(self.pool.endpoints)) as ex:
+            futures = {ep.name: [ex.submit(_touch, ep) for _ in range(n)] for ep in self.pool.endpoints}
+        for name, fs in futures.items():
+            errors = [str(f.exception()) for f in fs if f.exception() is not None]
+            out[name] = errors[0] if errors else True
+        return out
+
+    @staticmethod
+    def _content(data: dict) -> str:
         # defensive: some providers nest differently, but this is standard
         return data["choices"][0]["message"]["content"]
 
+    @staticmethod
+    def _emit_upstream(ep: Endpoint, body: dict, status, t0: float,
+                       out: str | None = None, usage: dict | None = None) -> None:
+        usage = usage or {}
+        # OpenAI-style prompt_tokens_details.cached_tokens, Anthropic-style cache_read_input_tokens
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        if cached is None:
+            cached = usage.get("cache_read_input_tokens")
+        hooks.emit(
+            "upstream",
+            backend=ep.name,
+            status=status,
+            seconds=time.monotonic() - t0,
+            prompt_chars=sum(len(m.get("content") or "") for m in body.get("messages") or []),
+            response_chars=len(out or ""),
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            cached_tokens=cached,
+        )
+
+    def _json_mode_body(self, ep: Endpoint, body_base: dict) -> dict:
+        """body_base plus the JSON-enforcement flags this endpoint hasn't rejected."""
+        flags = {
+            "response_format": {"type": "json_object"},  # OpenAI/OpenRouter-style
+            "format": "json",                             # some vendors accept this alias
+            "tool_choice": "none",                        # can trigger rejections; we'll drop if needed
+        }
+        rejected = self.caps.rejected(ep.base, ep.model) & flags.keys()
+        if rejected:  # only JSON flags; a rejected cache hint is counted in _cache_hinted
+            self.caps.note_saved_round_trip()
+        body_try = dict(body_base)
+        body_try.update({k: v for k, v in flags.items() if k not in rejected})
+        return body_try
+
+    def _should_retry_clean(self, ep: Endpoint, body_try: dict, e: RuntimeError) -> bool:
+        """Your Litellm/NIM proxy rejects some params -> remember them and retry clean."""
+        msg = str(e)
+        sent = [k for k in JSON_PARAMS if k in body_try]
+        if sent and is_unsupported_params_error(msg):
+            self.caps.record_rejected(ep.base, ep.model, rejected_from_error(msg, sent))
+            return True
+        return False
+
+    def _post_json_mode(self, ep: Endpoint, body_base: dict) -> str:
+        """
+        Try JSON-enforcement flags (some backends accept them), minus any this
+        endpoint is already known to reject; on rejection remember + retry clean.
+        """
+        body_try = self._json_mode_body(ep, body_base)
+        try:
+            return self._post_once(ep, body_try)
+        except RuntimeError as e:
+            if self._should_retry_clean(ep, body_try, e):
+                return self._post_once(ep, body_base)  # drop response_format / tool_choice / format
+            raise
+
+    def _post(self, body: dict, json_mode: bool = False) -> str:
+        if json_mode:
+            return self.pool.call(lambda ep: self._post_json_mode(ep, body))
+        return self.pool.call(lambda ep: self._post_once(ep, body))
+
+    def _open_stream(self, ep: Endpoint, body: dict) -> requests.Response:
+        hinted = self._cache_hinted(ep, body)
+        if hinted is not None:
+            try:
+                return self._open_wire(ep, body, hinted)
+            except AIHTTPError as e:
+                if not self._hints_maybe_rejected(e):
+                    raise
+            r = self._open_wire(ep, body, dict(body, model=ep.model))
+            self._hints_rejected(ep)
+            return r
+        return self._open_wire(ep, body, dict(body, model=ep.model))
+
+    def _open_wire(self, ep: Endpoint, body: dict, wire: dict) -> requests.Response:
+        url = f"{ep.base}/chat/completions"
+        t0 = time.monotonic()
+        try:
+            r = self.session.post(url, json=wire, headers=self._headers(ep), stream=True)
+        except requests.RequestException:
+            self._emit_upstream(ep, body, "error", t0)
+            raise
+        self._emit_upstream(ep, body, r.status_code, t0)  # time to headers; body chars unknown
+        try:
+            self._raise_for_status(r, url, body)
+        except Exception:
+            r.close()
+            raise
+        return r
+
+    def _post_stream(self, body: dict) -> Iterator[str]:
+        """POST with stream=True and yield content deltas from the SSE reply."""
+        body = dict(body, stream=True)
+        # Retries/failover cover opening the stream; once tokens flow we can't replay.
+        r = self.pool.call(lambda ep: self._open_stream(ep, body), hedge=False)
+        try:
+            for line in r.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except ValueError:
+                    continue
+                for choice in chunk.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+        finally:
+            r.close()
+
+    def stats(self) -> dict:
+        return {
+            "pool": self.session.stats(),
+            "capabilities": self.caps.stats(),
+            "json_repair": repair_stats(),
+            "resilience": self.pool.resilience.stats(),
+            "backends": self.pool.stats(),
+        }
+
+    # --- request shaping (shared with the asyncio client) ---
+
+    @staticmethod
+    def _messages(prompt: str, system: str | None) -> list[dict]:
+        return ([{"role": "system", "content": system}] if system else []) + [
+            {"role": "user", "content": prompt}
+        ]
+
+    @staticmethod
+    def _local_json(out: str) -> str | None:
+        """Single-pass extract, then deterministic repair; None if both fail."""
+        # Enforce JSON: single-pass extract (fences, prose, raw control chars)
+        t0 = time.perf_counter()
+        found = extract_json(out)
+        if found:
+            hooks.emit("json_path", path="extract", seconds=time.perf_counter() - t0)
+            return found[0]
+        # Deterministic local repair (trailing commas, quotes, truncation, ...)
+        fixed = repair_json(out)
+        if fixed is not None:
+            hooks.emit("json_path", path="local_repair", seconds=time.perf_counter() - t0)
+        return fixed
+
+    def _repair_body(self, base_msgs: list[dict], out: str, max_tokens: int) -> dict:
+        """Last resort: ask model to re-emit its previous answer as strict JSON."""
+        note_llm_fallback()
+        hooks.emit("json_path", path="llm_fallback", seconds=None)
+        logger.info("local JSON repair failed; asking the model to re-emit", extra={"reply_chars": len(out)})
+        return {
+            "model": self.model,
+            "messages": base_msgs + [{"role": "assistant", "content": out}, {
+                "role": "user",
+                "content": (
+                    "Convert your previous answer to ONE valid JSON object with exactly these keys: "
+                    "\"summary\" (string), \"tasks\" (string), \"open_questions\" (array of strings). "
+                    "Return MINIFIED JSON (single line). Escape all newlines/tabs in strings as \\n and \\t. "
+                    "No prose, no code fences, no markdown outside JSON."
+                ),
+            }],
+            "max_tokens": max_tokens,
+            "temperature": 0.0,
+        }
+
     # --- public API ---
 
     def complete(
@@ -116,70 +400,52 @@ class AIClient:
         system: str | None = None,
         json_mode: bool = False,
         max_tokens: int = 2500,
+        temperature: float = 0.2,
     ) -> str:
         """
         Return the model's message content as a STRING.
         If json_mode=True, guarantees a valid JSON string is returned.
         """
-        base_msgs = ([{"role": "system", "content": system}] if system else []) + [
-            {"role": "user", "content": prompt}
-        ]
+        base_msgs = self._messages(prompt, system)
 
         body_base = {
-            "model": self.model,
+            "model": self.model,  # overridden per endpoint by the backend pool
             "messages": base_msgs,
             "max_tokens": max_tokens,
-            "temperature": 0.2,
+            "temperature": temperature,
         }
 
-        # First attempt: try JSON-enforcement flags (some backends accept them)
-        body_try = dict(body_base)
-        if json_mode:
-            body_try.update({
-                "response_format": {"type": "json_object"},  # OpenAI/OpenRouter-style
-                "format": "json",                             # some vendors accept this alias
-                "tool_choice": "none",                        # can trigger rejections; we'll drop if needed
-            })
-
-        # Call #1
-        try:
-            out = self._post(body_try)
-        except RuntimeError as e:
-            msg = str(e)
-            # Your Litellm/NIM proxy rejects some params -> retry clean
-            if ("UnsupportedParamsError" in msg) or ("does not support parameters" in msg):
-                out = self._post(body_base)  # drop response_format / tool_choice / format
-            else:
-                raise
+        out = self._post(body_base, json_mode=json_mode)
 
         if not json_mode:
             return out
 
-        # Enforce JSON: clean, sanitize, parse
-        cleaned = _maybe_extract_json(out)
-        cleaned = _escape_ctrl_in_json_strings(cleaned)
-        try:
-            json.loads(cleaned)
-            return cleaned
-        except Exception:
-            # One-shot repair: ask model to re-emit as strict JSON
-            repair_body = {
-                "model": self.model,
-                "messages": base_msgs + [{
-                    "role": "user",
-                    "content": (
-                        "Convert your previous answer to ONE valid JSON object with exactly these keys: "
-                        "\"summary\" (string), \"tasks\" (string), \"open_questions\" (array of strings). "
-                        "Return MINIFIED JSON (single line). Escape all newlines/tabs in strings as \\n and \\t. "
-                        "No prose, no code fences, no markdown outside JSON."
-                    ),
-                }],
-                "max_tokens": max_tokens,
-                "temperature": 0.0,
-            }
-            repaired = self._post(repair_body)
-            repaired = _maybe_extract_json(repaired)
-            repaired = _escape_ctrl_in_json_strings(repaired)
-            # Final guard (raise with helpful message if still invalid)
-            json.loads(repaired)
-            return repaired
+        fixed = self._local_json(out)
+        if fixed is not None:
+            return fixed
+
+        repair_body = self._repair_body(base_msgs, out, max_tokens)
+        repaired = clean_json_text(self._post(repair_body))
+        # Final guard (raise with helpful message if still invalid)
+        json.loads(repaired)
+        return repaired
+
+    def stream(
+        self,
+        prompt: str,
+        system: str | None = None,
+        max_tokens: int = 2500,
+        temperature: float = 0.2,
+    ) -> Iterator[str]:
+        """
+        Yield the model's reply as text deltas while it is being generated.
+        No JSON enforcement happens here; callers clean up the joined text
+        (see clean_json_text) once the stream ends.
+        """
+        msgs = self._messages(prompt, system)
+        yield from self._post_stream({
+            "model": self.model,
+            "messages": msgs,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        })
@@ -0,0 +1,152 @@
+# adapters/async_client.py
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from .ai_client import AIClient, clean_json_text
+from .backends import Endpoint
+from .http_pool import CONNECT_TIMEOUT, READ_TIMEOUT
+from .resilience import AIHTTPError, parse_retry_after
+
+# One event loop multiplexes every in-flight call, so the pool can be far
+# larger than the threaded client's (which is capped by GUNICORN_THREADS).
+ASYNC_POOL_SIZE = int(os.getenv("AI_ASYNC_POOL_SIZE") or 200)
+
+
+class AsyncAIClient(AIClient):
+    """
+    asyncio twin of AIClient for the ASGI app (services/asgi_app.py).
+
+    Same request shaping, capability memory, JSON repair, routing, retries
+    and hedging -- only the transport differs: an httpx.AsyncClient, so a
+    waiting call costs a coroutine instead of a thread. The blocking
+    complete()/stream() inherited from AIClient still work.
+    """
+
+    def __init__(self, *args, http: httpx.AsyncClient | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = http
+        self._requests = 0
+
+    def _client(self) -> httpx.AsyncClient:
+        # Built lazily inside the server's event loop.
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=ASYNC_POOL_SIZE,
+                                    max_keepalive_connections=ASYNC_POOL_SIZE),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def awarm(self, connections: int = 1) -> dict:
+        """warm() for the async pool: open sockets to every gateway in this loop."""
+        async def _touch(ep: Endpoint) -> None:
+            await self._client().get(f"{ep.base}/models", headers=self._headers(ep),
+                                     timeout=CONNECT_TIMEOUT)
+
+        n = max(int(connections), 1)
+        out: dict = {}
+        for ep in self.pool.endpoints:
+            results = await asyncio.gather(*(_touch(ep) for _ in range(n)), return_exceptions=True)
+            errors = [str(r) for r in results if isinstance(r, BaseException)]
+            out[ep.name] = errors[0] if errors else True
+        return out
+
+    # --- HTTP ---
+
+    async def _apost_once(self, ep: Endpoint, body: dict) -> str:
+        hinted = self._cache_hinted(ep, body)
+        if hinted is not None:
+            try:
+                return await self._apost_wire(ep, body, hinted)
+            except AIHTTPError as e:
+                if not self._hints_maybe_rejected(e):
+                    raise
+            out = await self._apost_wire(ep, body, dict(body, model=ep.model))
+            self._hints_rejected(ep)
+            return out
+        return await self._apost_wire(ep, body, dict(body, model=ep.model))
+
+    async def _apost_wire(self, ep: Endpoint, body: dict, wire: dict) -> str:
+        url = f"{ep.base}/chat/completions"
+        self._requests += 1
+        t0 = time.monotonic()
+        try:
+            r = await self._client().post(url, json=wire, headers=self._headers(ep))
+        except httpx.TransportError:
+            self._emit_upstream(ep, body, "error", t0)
+            raise
+        if r.status_code >= 400:
+            self._emit_upstream(ep, body, r.status_code, t0)
+            raise AIHTTPError(
+                self._error_message(r.status_code, url, body, r.text),
+                status_code=r.status_code,
+                retry_after=parse_retry_after(r.headers.get("Retry-After")),
+            )
+        data = r.json()
+        out = self._content(data)
+        self._emit_upstream(ep, body, r.status_code, t0, out, data.get("usage"))
+        return out
+
+    async def _apost_json_mode(self, ep: Endpoint, body_base: dict) -> str:
+        body_try = self._json_mode_body(ep, body_base)
+        try:
+            return await self._apost_once(ep, body_try)
+        except RuntimeError as e:
+            if self._should_retry_clean(ep, body_try, e):
+                return await self._apost_once(ep, body_base)
+            raise
+
+    async def _apost(self, body: dict, json_mode: bool = False) -> str:
+        if json_mode:
+            return await self.pool.acall(lambda ep: self._apost_json_mode(ep, body))
+        return await self.pool.acall(lambda ep: self._apost_once(ep, body))
+
+    def stats(self) -> dict:
+        out = super().stats()
+        out["async_pool"] = {
+            "pool_size": ASYNC_POOL_SIZE,
+            "requests": self._requests,
+        }
+        return out
+
+    # --- public API ---
+
+    async def acomplete(
+        self,
+        prompt: str,
+        system: str | None = None,
+        json_mode: bool = False,
+        max_tokens: int = 2500,
+        temperature: float = 0.2,
+    ) -> str:
+        """Awaitable complete(): same contract, including the JSON guarantee."""
+        base_msgs = self._messages(prompt, system)
+        body_base = {
+            "model": self.model,
+            "messages": base_msgs,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+        out = await self._apost(body_base, json_mode=json_mode)
+        if not json_mode:
+            return out
+
+        fixed = self._local_json(out)
+        if fixed is not None:
+            return fixed
+
+        repaired = clean_json_text(await self._apost(self._repair_body(base_msgs, out, max_tokens)))
+        json.loads(repaired)
+        return repaired
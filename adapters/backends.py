@@ -0,0 +1,178 @@
+# adapters/backends.py
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from .resilience import (
+    BREAKER_RESET,
+    BREAKER_THRESHOLD,
+    CircuitBreaker,
+    CircuitOpenError,
+    Resilience,
+    is_retryable,
+)
+
+T = TypeVar("T")
+
+# "least_outstanding" (default) or "ewma" (peak-EWMA: latency x queue depth)
+ROUTING      = (os.getenv("AI_ROUTING") or "least_outstanding").strip().lower()
+EWMA_ALPHA   = float(os.getenv("AI_EWMA_ALPHA") or 0.3)
+DEFAULT_MODEL = "meta/llama-3.3-70b-instruct"
+
+
+class Endpoint:
+    """One OpenAI-compatible gateway plus its live routing/health state."""
+
+    def __init__(self, base: str, key: str, model: str, name: str | None = None):
+        self.base = base.rstrip("/")
+        self.key = key
+        self.model = model
+        self.name = name or self.base
+        # Health: the breaker *is* ejection -- after AI_BREAKER_THRESHOLD
+        # consecutive failures it opens (out of rotation), and after
+        # AI_BREAKER_RESET seconds a half-open trial request brings it back.
+        self.breaker = CircuitBreaker(threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET)
+        self._lock = threading.Lock()
+        self.outstanding = 0
+        self.ewma: float | None = None
+        self.requests = 0
+        self.failures = 0
+
+    def _observe(self, seconds: float) -> None:
+        self.ewma = seconds if self.ewma is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.ewma
+
+    def cost(self) -> float:
+        if ROUTING == "ewma":
+            return (self.ewma or 0.0) * (self.outstanding + 1)
+        return float(self.outstanding)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "model": self.model,
+                "outstanding": self.outstanding,
+                "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+                "requests": self.requests,
+                "failures": self.failures,
+                "state": self.breaker.state,
+            }
+
+
+def endpoints_from_env() -> list[Endpoint]:
+    """
+    AI_BACKENDS: JSON list of {"base", "key" | "key_env", "model"?, "name"?}.
+    Falls back to the single AI_API_BASE / AI_API_KEY / AI_MODEL gateway.
+    """
+    default_model = os.getenv("AI_MODEL", DEFAULT_MODEL)
+    raw = (os.getenv("AI_BACKENDS") or "").strip()
+    if raw:
+        try:
+            items = json.loads(raw)
+        except ValueError as e:
+            raise RuntimeError(f"AI_BACKENDS is not valid JSON: {e}") from e
+        out = []
+        for i, it in enumerate(items if isinstance(items, list) else []):
+            base = (it.get("base") or "").strip()
+            key = it.get("key") or os.getenv(it.get("key_env") or "", "")
+            if not (base and key):
+                raise RuntimeError(f"AI_BACKENDS[{i}] needs 'base' and 'key' (or 'key_env')")
+            out.append(Endpoint(base, key, it.get("model") or default_model, it.get("name")))
+        if out:
+            return out
+
+    base, key = os.getenv("AI_API_BASE"), os.getenv("AI_API_KEY")
+    if not (base and key):
+        raise RuntimeError("Missing AI_API_BASE or AI_API_KEY in .env")
+    return [Endpoint(base, key, default_model)]
+
+
+class BackendPool:
+    """
+    Route each upstream call to the cheapest healthy endpoint. Retries and
+    hedges go back through routing, so they naturally land on another
+    gateway when the first one is slow or failing.
+    """
+
+    def __init__(self, endpoints: list[Endpoint], resilience: Resilience | None = None):
+        if not endpoints:
+            raise RuntimeError("BackendPool needs at least one endpoint")
+        self.endpoints = endpoints
+        self.resilience = resilience or Resilience()
+        self._lock = threading.Lock()
+
+    def pick(self) -> Endpoint:
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.breaker.state != "open"]
+            random.shuffle(healthy)
+            for ep in sorted(healthy, key=Endpoint.cost):
+                if ep.breaker.allow():
+                    with ep._lock:
+                        ep.outstanding += 1
+                        ep.requests += 1
+                    return ep
+        raise CircuitOpenError("All AI backends are ejected; failing fast")
+
+    def _dispatch(self, send: Callable[[Endpoint], T]) -> T:
+        ep = self.pick()
+        t0 = time.monotonic()
+        try:
+            out = send(ep)
+        except Exception as e:
+            with ep._lock:
+                ep.outstanding -= 1
+                if is_retryable(e):
+                    ep.failures += 1
+                    # penalise so routing drifts away before the breaker trips
+                    ep._observe(max(time.monotonic() - t0, (ep.ewma or 0) * 2))
+            if is_retryable(e):
+                ep.breaker.record_failure()
+            else:
+                ep.breaker.record_success()
+            raise
+        with ep._lock:
+            ep.outstanding -= 1
+            ep._observe(time.monotonic() - t0)
+        ep.breaker.record_success()
+        return out
+
+    async def _adispatch(self, asend: Callable[[Endpoint], Awaitable[T]]) -> T:
+        ep = self.pick()
+        t0 = time.monotonic()
+        try:
+            out = await asend(ep)
+        except BaseException as e:
+            with ep._lock:
+                ep.outstanding -= 1
+                if is_retryable(e):
+                    ep.failures += 1
+                    ep._observe(max(time.monotonic() - t0, (ep.ewma or 0) * 2))
+            if is_retryable(e):
+                ep.breaker.record_failure()
+            elif isinstance(e, Exception):
+                ep.breaker.record_success()
+            else:
+                ep.breaker.abandon()  # cancelled (e.g. the losing hedge)
+            raise
+        with ep._lock:
+            ep.outstanding -= 1
+            ep._observe(time.monotonic() - t0)
+        ep.breaker.record_success()
+        return out
+
+    def call(self, send: Callable[[Endpoint], T], hedge: bool | None = None) -> T:
+        return self.resilience.call(lambda: self._dispatch(send), hedge=hedge)
+
+    async def acall(self, asend: Callable[[Endpoint], Awaitable[T]], hedge: bool | None = None) -> T:
+        return await self.resilience.acall(lambda: self._adispatch(asend), hedge=hedge)
+
+    def stats(self) -> dict:
+        return {
+            "routing": ROUTING,
+            "endpoints": [e.stats() for e in self.endpoints],
+        }
@@ -0,0 +1,170 @@
+# adapters/capabilities.py
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, merge is still done
+    fcntl = None
+
+# Params we add for JSON enforcement; some LiteLLM/NIM backends reject them.
+JSON_PARAMS = ("response_format", "format", "tool_choice")
+
+# How long a "this backend rejects X" record is trusted before we re-probe.
+CAPS_TTL  = float(os.getenv("AI_CAPS_TTL") or 3600)
+# Optional JSON file so every worker (and restarts) share what was learned.
+# Writers merge with it under an flock; readers reload it when it changes.
+CAPS_PATH = os.getenv("AI_CAPS_PATH") or ""
+
+
+def is_unsupported_params_error(msg: str) -> bool:
+    return ("UnsupportedParamsError" in msg) or ("does not support parameters" in msg)
+
+
+def rejected_from_error(msg: str, sent) -> set[str]:
+    """Params named in a rejection message; all of `sent` if none are named."""
+    # Only look at the upstream reply: the request body echo names everything.
+    reply = msg.split("Response:", 1)[-1]
+    named = {p for p in sent if re.search(rf"\b{re.escape(p)}\b", reply)}
+    return named or set(sent)
+
+
+class CapabilityCache:
+    """
+    Per-(base URL, model) memory of request params the backend rejected.
+
+    Entries expire after `ttl` seconds so a backend upgrade is picked up by a
+    fresh probe instead of being remembered forever.
+    """
+
+    def __init__(self, path: str = CAPS_PATH, ttl: float = CAPS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        self._counters = {"round_trips_saved": 0, "rejections_recorded": 0, "probes": 0}
+        self._seen_mtime: int | None = None
+        self._load()
+
+    @staticmethod
+    def _key(base: str, model: str) -> str:
+        return f"{base}|{model}"
+
+    # --- persistence ---
+
+    def _read(self) -> dict[str, dict]:
+        """Unexpired entries in the file; empty if it's missing or unreadable."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f) or {}
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        out = {}
+        for k, v in raw.items() if isinstance(raw, dict) else ():
+            if isinstance(v, dict) and now - float(v.get("recorded_at") or 0) < self.ttl:
+                out[k] = {"rejected": list(v.get("rejected") or []),
+                          "recorded_at": float(v["recorded_at"])}
+        return out
+
+    def _merge(self, entries: dict[str, dict]) -> None:
+        # newest record per key wins; record_rejected unions before writing
+        for k, v in entries.items():
+            mine = self._entries.get(k)
+            if mine is None or v["recorded_at"] > mine["recorded_at"]:
+                self._entries[k] = v
+
+    def _mtime(self) -> int | None:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        mtime = self._mtime()
+        self._merge(self._read())
+        self._seen_mtime = mtime
+
+    def _refresh(self) -> None:
+        """Pick up what other workers wrote since we last looked (lock held)."""
+        if self.path and self._mtime() != self._seen_mtime:
+            self._load()
+
+    def _save(self) -> None:
+        """Merge with the file on disk and write the union back (lock held)."""
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        lock_fd = None
+        try:
+            if fcntl:
+                lock_fd = os.open(f"{self.path}.lock", os.O_CREAT | os.O_RDWR, 0o644)
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            self._merge(self._read())
+            now = time.time()
+            live = {k: v for k, v in self._entries.items() if now - v["recorded_at"] < self.ttl}
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(live, f)
+            os.replace(tmp, self.path)
+            self._seen_mtime = self._mtime()
+        except OSError:
+            pass  # persistence is best-effort; memory copy still works
+        finally:
+            if lock_fd is not None:
+                os.close(lock_fd)  # releases the flock
+
+    # --- API ---
+
+    def rejected(self, base: str, model: str) -> set[str]:
+        """
+        Params known to be rejected by this backend. Empty when unknown or
+        expired, which makes the next call a re-probe with the full param set.
+        """
+        k = self._key(base, model)
+        with self._lock:
+            self._refresh()
+            e = self._entries.get(k)
+            if not e:
+                return set()
+            if time.time() - e["recorded_at"] >= self.ttl:
+                self._entries.pop(k, None)
+                self._counters["probes"] += 1
+                return set()
+            return set(e["rejected"])
+
+    def record_rejected(self, base: str, model: str, params) -> None:
+        k = self._key(base, model)
+        with self._lock:
+            self._refresh()
+            prev = set((self._entries.get(k) or {}).get("rejected") or [])
+            self._entries[k] = {"rejected": sorted(prev | set(params)), "recorded_at": time.time()}
+            self._counters["rejections_recorded"] += 1
+            self._save()
+
+    def note_saved_round_trip(self) -> None:
+        with self._lock:
+            self._counters["round_trips_saved"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+
+_CAPS: CapabilityCache | None = None
+_CAPS_LOCK = threading.Lock()
+
+
+def shared_capabilities() -> CapabilityCache:
+    global _CAPS
+    if _CAPS is None:
+        with _CAPS_LOCK:
+            if _CAPS is None:
+                _CAPS = CapabilityCache()
+    return _CAPS
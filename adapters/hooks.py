@@ -0,0 +1,39 @@
+# adapters/hooks.py
+from __future__ import annotations
+
+import threading
+from typing import Callable
+
+# Tiny observer hook so the service layer (metrics, tracing, logging) can see
+# what the adapters do without adapters importing services. Events:
+#
+#   "upstream"   one HTTP round trip to a gateway:
+#                backend, status (int, or "error" for transport failures),
+#                seconds, prompt_chars, response_chars,
+#                prompt_tokens, completion_tokens, cached_tokens (prompt
+#                tokens served from the provider's prefix cache; None if
+#                not reported)
+#   "json_path"  how a json_mode reply became valid JSON:
+#                path = "extract" | "local_repair" | "llm_fallback",
+#                seconds spent locally (None for llm_fallback; that round
+#                trip shows up as another "upstream" event)
+
+Listener = Callable[[str, dict], None]
+
+_LISTENERS: list[Listener] = []
+_LOCK = threading.Lock()
+
+
+def subscribe(listener: Listener) -> None:
+    with _LOCK:
+        if listener not in _LISTENERS:
+            _LISTENERS.append(listener)
+
+
+def emit(event: str, **fields) -> None:
+    """Call every listener; a failing listener never breaks the LLM call."""
+    for listener in list(_LISTENERS):
+        try:
+            listener(event, fields)
+        except Exception:
+            pass
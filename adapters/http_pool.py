@@ -0,0 +1,151 @@
+# adapters/http_pool.py
+from __future__ import annotations
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+# --- config ----------------------------------------------------------------
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+# Pool is sized to the gunicorn thread count so every request thread can hold
+# one keep-alive connection to the gateway without waiting on another thread.
+POOL_SIZE       = _env_int("AI_POOL_SIZE", _env_int("GUNICORN_THREADS", 4))
+CONNECT_TIMEOUT = _env_float("AI_CONNECT_TIMEOUT", 5.0)
+READ_TIMEOUT    = _env_float("AI_READ_TIMEOUT", 60.0)
+
+
+# --- stats -----------------------------------------------------------------
+
+class PoolStats:
+    """Thread-safe counters for connections opened vs requests sent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+        self.in_flight = 0
+
+    def conn_opened(self) -> None:
+        with self._lock:
+            self.opened += 1
+
+    def request_started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def request_finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connections_opened": self.opened,
+                "connections_reused": max(self.requests - self.opened, 0),
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+            }
+
+
+def _counting_pool(base: type, stats: PoolStats) -> type:
+    """Subclass a urllib3 pool so every new socket bumps `stats.opened`."""
+
+    class _Pool(base):
+        def _new_conn(self):
+            stats.conn_opened()
+            return super()._new_conn()
+
+    _Pool.__name__ = f"Counting{base.__name__}"
+    return _Pool
+
+
+class _CountingAdapter(HTTPAdapter):
+    def __init__(self, stats: PoolStats, **kwargs):
+        self._stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http":  _counting_pool(HTTPConnectionPool, self._stats),
+            "https": _counting_pool(HTTPSConnectionPool, self._stats),
+        }
+
+
+# --- session ---------------------------------------------------------------
+
+class PooledSession:
+    """
+    Keep-alive HTTP session shared by every thread in the process.
+
+    A single urllib3 pool manager (thread-safe) is mounted into one
+    requests.Session per thread, so sockets are reused across requests while
+    Session state (cookies, hooks) is never mutated concurrently.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = POOL_SIZE,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+    ):
+        self.pool_size = max(int(pool_size), 1)
+        self.timeout = (connect_timeout, read_timeout)
+        self._stats = PoolStats()
+        self._adapter = _CountingAdapter(
+            self._stats,
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+        )
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = requests.Session()
+            s.mount("https://", self._adapter)
+            s.mount("http://", self._adapter)
+            self._local.session = s
+        return s
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        self._stats.request_started()
+        try:
+            return self._session().request(method, url, **kwargs)
+        finally:
+            self._stats.request_finished()
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def stats(self) -> dict:
+        out = self._stats.snapshot()
+        out["pool_size"] = self.pool_size
+        out["connect_timeout"], out["read_timeout"] = self.timeout
+        return out
+
+    def close(self) -> None:
+        self._adapter.close()
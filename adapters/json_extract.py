@@ -0,0 +1,148 @@
+# adapters/json_extract.py
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+# Single-pass JSON object extraction shared by the AI client, the generator
+# orchestrator and ingest normalisation. One linear scan finds every
+# top-level balanced {...} span (string- and escape-aware), and each
+# candidate is handed to json.loads once -- no backtracking regexes (the
+# only regexes here are single-character classes used to hop between
+# structurally significant characters).
+
+_CTRL_ESC = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+# Characters that can change scanner state; everything else is skipped in C.
+_SIG_RE      = re.compile(r'[{}"\\]')
+_CTRL_SIG_RE = re.compile(r'["\\\x00-\x1f]')
+
+
+def strip_fences(text: str) -> str:
+    """Drop a leading ```lang line and a trailing ``` from a model reply."""
+    s = (text or "").strip()
+    if s.startswith("```"):
+        nl = s.find("\n")
+        s = s[nl + 1:] if nl != -1 else ""
+        if s.rstrip().endswith("```"):
+            s = s.rstrip()[:-3]
+    return s.strip()
+
+
+def object_spans(text: str) -> list[tuple[int, int]]:
+    """
+    (start, end) of every top-level balanced {...} in `text`, in order.
+    Quotes only count inside an object, so apostrophes in surrounding prose
+    don't derail the scan; an unterminated trailing object yields no span.
+    """
+    spans = []
+    depth = 0
+    start = -1
+    skip = -1
+    in_str = False
+    for m in _SIG_RE.finditer(text):
+        i = m.start()
+        if i < skip:
+            continue
+        ch = text[i]
+        if in_str:
+            if ch == "\\":
+                skip = i + 2
+            elif ch == '"':
+                in_str = False
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif depth:
+            if ch == '"':
+                in_str = True
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    spans.append((start, i + 1))
+    return spans
+
+
+def escape_ctrl_in_strings(text: str) -> str:
+    """
+    Escape raw newlines/tabs/CRs inside JSON string literals so a strict
+    json.loads accepts them; whitespace between tokens is left alone.
+    """
+    out = []
+    last = 0
+    skip = -1
+    in_str = False
+    for m in _CTRL_SIG_RE.finditer(text):
+        i = m.start()
+        if i < skip:
+            continue
+        ch = text[i]
+        if in_str:
+            if ch == "\\":
+                skip = i + 2
+            elif ch == '"':
+                in_str = False
+            else:
+                out.append(text[last:i])
+                out.append(_CTRL_ESC.get(ch, f"\\u{ord(ch):04x}"))
+                last = i + 1
+        elif ch == '"':
+            in_str = True
+    out.append(text[last:])
+    return "".join(out)
+
+
+def _loads(candidate: str) -> tuple[str, Any] | None:
+    try:
+        return candidate, json.loads(candidate)
+    except ValueError as e:
+        # Raw control chars inside strings are the common LLM slip; re-escape
+        # only when that's what the parser tripped on.
+        if "control character" not in str(e):
+            return None
+    fixed = escape_ctrl_in_strings(candidate)
+    try:
+        return fixed, json.loads(fixed)
+    except ValueError:
+        return None
+
+
+def extract_json(text: str) -> tuple[str, Any] | None:
+    """
+    Return (json_text, parsed) for the JSON object in a model reply, or None.
+    `json_text` is always loadable by a strict json.loads.
+
+    The whole (fence-stripped) reply is tried first; otherwise the largest
+    balanced object wins, then the others from last to first.
+    """
+    if not isinstance(text, str):
+        return None
+    s = strip_fences(text)
+    if not s:
+        return None
+    if s[0] == "{" and s[-1] == "}":
+        found = _loads(s)
+        if found:
+            return found
+
+    spans = object_spans(s)
+    if len(spans) == 1 and spans[0] == (0, len(s)):
+        return None  # whole text already tried above
+    for a, b in sorted(reversed(spans), key=lambda ab: ab[0] - ab[1]):
+        found = _loads(s[a:b])
+        if found:
+            return found
+    return None
+
+
+def coerce_json_object(text) -> dict | None:
+    """dict passthrough, else the parsed JSON object in `text`, else None."""
+    if isinstance(text, dict):
+        return text
+    if text is None:
+        return None
+    found = extract_json(str(text))
+    if found and isinstance(found[1], dict):
+        return found[1]
+    return None
@@ -0,0 +1,244 @@
+# adapters/json_repair.py
+from __future__ import annotations
+
+import json
+import re
+import threading
+
+# Deterministic, local repair for the JSON mistakes LLMs make most often:
+#   - prose / code fences around the object
+#   - trailing commas
+#   - single-quoted strings and keys
+#   - unquoted keys and Python literals (True/False/None)
+#   - unescaped quotes, newlines and tabs inside strings
+#   - invalid escapes such as \' or \d
+#   - truncated output (unterminated string, dangling key, unclosed brackets)
+# The engine never calls the model; AIClient only falls back to an LLM
+# repair round trip when this returns None.
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z0-9_-]*\s*|\s*```\s*$", re.MULTILINE)
+# matched in place (pattern.match(s, pos)): slicing s per word is quadratic
+_WORD_RE = re.compile(r"[A-Za-z_]\w*")
+_BARE_KEY_RE = re.compile(r"[A-Za-z_]\w*\s*:")
+_CTRL_ESC = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_VALID_ESC = set('"\\/bfnrtu')
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_JSON_WORDS = ("true", "false", "null")
+
+
+# --- stats -----------------------------------------------------------------
+
+class RepairStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+
+    def bump(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+_STATS = RepairStats()
+
+
+def repair_stats() -> dict:
+    """attempts / repaired / failed / llm_fallbacks plus one counter per fix kind."""
+    return _STATS.snapshot()
+
+
+def note_llm_fallback() -> None:
+    _STATS.bump("llm_fallbacks")
+
+
+# --- scanner helpers -------------------------------------------------------
+
+def _next_sig(s: str, j: int) -> int:
+    n = len(s)
+    while j < n and s[j] in " \t\r\n":
+        j += 1
+    return j
+
+
+def _closes_string(s: str, j: int) -> bool:
+    """Is a quote followed by s[j:] plausibly the end of a string literal?"""
+    j = _next_sig(s, j)
+    if j >= len(s):
+        return True
+    c = s[j]
+    if c in "}]:":
+        return True
+    if c != ",":
+        return False
+    k = _next_sig(s, j + 1)
+    if k >= len(s):
+        return True
+    c2 = s[k]
+    return (c2 in "\"'{[}]-" or c2.isdigit() or s.startswith(_JSON_WORDS, k)
+            or s.startswith(tuple(_PY_LITERALS), k) or bool(_BARE_KEY_RE.match(s, k, k + 64)))
+
+
+def _drop_trailing_comma(out: list[str]) -> bool:
+    i = len(out) - 1
+    while i >= 0 and out[i] in (" ", "\t", "\r", "\n"):
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+        return True
+    return False
+
+
+def _strip_prose(text: str) -> tuple[str, bool]:
+    s = _FENCE_RE.sub("", text).strip()
+    start = s.find("{")
+    if start == -1:
+        start = s.find("[")
+    if start == -1:
+        return s, False
+    return s[start:], start > 0 or s != text.strip()
+
+
+# --- engine ----------------------------------------------------------------
+
+def _rewrite(s: str, fixes: set[str]) -> str:
+    out: list[str] = []
+    frames: list[list] = []     # [opener, expecting_key]
+    in_str = False
+    quote = '"'
+    esc = False
+    str_is_key = False
+    i, n = 0, len(s)
+
+    while i < n:
+        ch = s[i]
+
+        if in_str:
+            if esc:
+                esc = False
+                if ch in _VALID_ESC:
+                    out.append(ch)
+                elif ch == "'":
+                    out[-1] = "'"                   # \' -> '
+                    fixes.add("invalid_escape")
+                else:
+                    out.append("\\" + ch)           # \d -> \\d
+                    fixes.add("invalid_escape")
+            elif ch == "\\":
+                esc = True
+                out.append("\\")
+            elif ch == quote:
+                if _closes_string(s, i + 1):
+                    in_str = False
+                    out.append('"')
+                    if str_is_key:
+                        frames[-1][1] = False
+                else:
+                    out.append('\\"' if quote == '"' else "'")
+                    fixes.add("unescaped_quote")
+            elif ch == '"':                         # literal " inside a '...' string
+                out.append('\\"')
+            elif ch < " ":
+                out.append(_CTRL_ESC.get(ch, f"\\u{ord(ch):04x}"))
+                fixes.add("control_char")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            if ch == "'":
+                fixes.add("single_quotes")
+            in_str, quote = True, ch
+            str_is_key = bool(frames) and frames[-1][0] == "{" and frames[-1][1]
+            out.append('"')
+        elif ch in "{[":
+            frames.append([ch, ch == "{"])
+            out.append(ch)
+        elif ch in "}]":
+            if _drop_trailing_comma(out):
+                fixes.add("trailing_comma")
+            if not frames:
+                break
+            opener = frames.pop()[0]
+            out.append("}" if opener == "{" else "]")
+            if not frames:
+                if s[i + 1:].strip():
+                    fixes.add("prose_stripped")
+                break
+        elif ch == ",":
+            out.append(ch)
+            if frames and frames[-1][0] == "{":
+                frames[-1][1] = True
+        elif ch == ":":
+            out.append(ch)
+            if frames:
+                frames[-1][1] = False
+        elif ch.isalpha() or ch == "_":
+            m = _WORD_RE.match(s, i)
+            word = m.group(0)
+            if frames and frames[-1][0] == "{" and frames[-1][1]:
+                out.append(f'"{word}"')
+                frames[-1][1] = False
+                fixes.add("unquoted_key")
+            elif word in _PY_LITERALS:
+                out.append(_PY_LITERALS[word])
+                fixes.add("python_literal")
+            else:
+                out.append(word)
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # --- truncated output: close whatever is still open ---
+    if in_str or frames:
+        fixes.add("truncated")
+    if in_str:
+        if esc:
+            out.pop()
+        out.append('"')
+        if str_is_key:
+            out.append(":null")
+    while out and out[-1] in (" ", "\t", "\r", "\n"):
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+    elif out and out[-1] == ":":
+        out.append("null")
+    elif frames and frames[-1][0] == "{" and out and out[-1] == '"' and not in_str:
+        # a complete key with no ':' yet, e.g. '{"a": 1, "b"'
+        tail = "".join(out[-200:])
+        if re.search(r'[{,]\s*"(?:\\.|[^"\\])*"$', tail):
+            out.append(":null")
+    for opener, _ in reversed(frames):
+        out.append("}" if opener == "{" else "]")
+
+    return "".join(out)
+
+
+def repair_json(text: str) -> str | None:
+    """
+    Return a valid JSON string built from `text`, or None if the local
+    engine can't produce one (caller may then fall back to the model).
+    """
+    if not isinstance(text, str) or not text.strip():
+        return None
+    _STATS.bump("attempts")
+
+    body, stripped = _strip_prose(text)
+    fixes: set[str] = {"prose_stripped"} if stripped else set()
+    candidate = _rewrite(body, fixes)
+    try:
+        json.loads(candidate)
+    except ValueError:
+        _STATS.bump("failed")
+        return None
+
+    _STATS.bump("repaired")
+    for f in fixes:
+        _STATS.bump(f"fix_{f}")
+    return candidate
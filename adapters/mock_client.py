@@ -1,7 +1,20 @@
 # adapters/mock_client.py
+import asyncio
 import json
+import os
+import re
+import time
 from datetime import datetime
 
+# Latency model (ms) so streaming/concurrency work can be exercised without a
+# real gateway. Both default to 0, i.e. instant replies.
+FIRST_TOKEN_MS = float(os.getenv("AI_MOCK_FIRST_TOKEN_MS") or 0)
+TOKEN_MS       = float(os.getenv("AI_MOCK_TOKEN_MS") or 0)
+_CHARS_PER_TOKEN = 4
+# Section prompts (generate "sections" strategy) ask for one key only.
+_SINGLE_KEY_RE = re.compile(r'with the single key "(\w+)"')
+
+
 class AIClient:
     """
     Dumb stub to unblock dev. Returns JSON strings the rest of the app can parse.
@@ -9,7 +22,33 @@ class AIClient:
     """
 
     def complete(self, prompt: str, system: str | None = None,
-                 json_mode: bool = False, max_tokens: int = 2500) -> str:
+                 json_mode: bool = False, max_tokens: int = 2500,
+                 temperature: float = 0.2) -> str:
+        out = self._reply(prompt, system)
+        tokens = len(out) / _CHARS_PER_TOKEN
+        time.sleep((FIRST_TOKEN_MS + TOKEN_MS * tokens) / 1000.0)
+        return out
+
+    async def acomplete(self, prompt: str, system: str | None = None,
+                        json_mode: bool = False, max_tokens: int = 2500,
+                        temperature: float = 0.2) -> str:
+        out = self._reply(prompt, system)
+        tokens = len(out) / _CHARS_PER_TOKEN
+        await asyncio.sleep((FIRST_TOKEN_MS + TOKEN_MS * tokens) / 1000.0)
+        return out
+
+    def stream(self, prompt: str, system: str | None = None,
+               max_tokens: int = 2500, temperature: float = 0.2):
+        out = self._reply(prompt, system)
+        time.sleep(FIRST_TOKEN_MS / 1000.0)
+        for i in range(0, len(out), _CHARS_PER_TOKEN):
+            if i:
+                time.sleep(TOKEN_MS / 1000.0)
+            yield out[i:i + _CHARS_PER_TOKEN]
+
+    def _reply(self, prompt: str, system: str | None = None) -> str:
+        # the generate contract may sit in the system message (prefix layout)
+        prompt = f"{system or ''}\n{prompt}"
         want_outputs = any(k in prompt for k in [
             '"summary"', '"tasks"', '"open_questions"', 'PROJECT SUMMARY', 'PROJECT TASKS'
         ])
@@ -23,6 +62,13 @@ class AIClient:
                     "Out-of-hours constraints?"
                 ],
             }
+            only = _SINGLE_KEY_RE.search(prompt)
+            if only:
+                key = only.group(1)
+                out = {key: payload.get(key, payload["tasks"])}
+                if key == "tasks":
+                    out["open_questions"] = payload["open_questions"]
+                payload = out
         else:
             # schema for /ingest
             payload = {
@@ -51,3 +97,6 @@ class AIClient:
                 "deliverables": []
             }
         return json.dumps(payload)
+
+    def stats(self) -> dict:
+        return {}
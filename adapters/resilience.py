@@ -0,0 +1,389 @@
+# adapters/resilience.py
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, TypeVar
+
+import requests
+
+try:  # only needed by the asyncio client (adapters/async_client.py)
+    import httpx
+except ImportError:
+    httpx = None
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+# --- config ----------------------------------------------------------------
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+
+RETRY_MAX_ATTEMPTS = int(_env_float("AI_RETRY_MAX_ATTEMPTS", 3))
+RETRY_BASE_DELAY   = _env_float("AI_RETRY_BASE_DELAY", 0.5)
+RETRY_MAX_DELAY    = _env_float("AI_RETRY_MAX_DELAY", 8.0)
+# No new attempt is started once this many seconds have passed in total.
+RETRY_DEADLINE     = _env_float("AI_RETRY_DEADLINE", 90.0)
+
+HEDGE_ENABLED      = os.getenv("AI_HEDGE_ENABLED", "0").lower() in {"1", "true", "yes"}
+# Fixed hedge delay until enough samples exist to use the observed p95.
+HEDGE_DELAY        = _env_float("AI_HEDGE_DELAY", 20.0)
+HEDGE_MIN_DELAY    = _env_float("AI_HEDGE_MIN_DELAY", 2.0)
+HEDGE_MIN_SAMPLES  = int(_env_float("AI_HEDGE_MIN_SAMPLES", 20))
+
+BREAKER_THRESHOLD  = int(_env_float("AI_BREAKER_THRESHOLD", 5))
+BREAKER_RESET      = _env_float("AI_BREAKER_RESET", 30.0)
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+# --- errors ----------------------------------------------------------------
+
+class AIHTTPError(RuntimeError):
+    """Non-2xx reply from the gateway; message starts "AI API error <status> at <url>"."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After as seconds (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, AIHTTPError):
+        return exc.status_code in RETRY_STATUSES
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+# --- building blocks -------------------------------------------------------
+
+class RetryPolicy:
+    """Full-jitter exponential backoff, overridden by a server Retry-After."""
+
+    def __init__(self, max_attempts: int = RETRY_MAX_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, deadline: float = RETRY_DEADLINE):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open fails fast for
+    `reset_timeout` seconds, then half-open lets one trial call through.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET):
+        self.threshold = max(int(threshold), 1)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self.opens = 0
+        self.short_circuits = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self._state()
+            if st == "closed":
+                return True
+            if st == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def abandon(self) -> None:
+        """A call let through was cancelled before it finished; free the half-open slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.threshold:
+                if self._opened_at is None:
+                    self.opens += 1
+                    logger.warning("circuit opened", extra={"failures": self._failures,
+                                                            "reset_s": self.reset_timeout})
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of call durations (seconds) with percentile lookups."""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> float | None:
+        with self._lock:
+            data = sorted(self._samples)
+        if not data:
+            return None
+        idx = min(int(round(p / 100.0 * (len(data) - 1))), len(data) - 1)
+        return data[idx]
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self),
+            "p50_ms": _ms(self.percentile(50)),
+            "p95_ms": _ms(self.percentile(95)),
+            "p99_ms": _ms(self.percentile(99)),
+        }
+
+
+def _log_retry(attempt: int, delay: float, e: BaseException) -> None:
+    logger.warning("retrying LLM call", extra={
+        "attempt": attempt,
+        "delay_s": round(delay, 3),
+        "error": getattr(e, "status_code", None) or type(e).__name__,
+    })
+
+
+def _ms(x: float | None) -> float | None:
+    return round(x * 1000, 1) if x is not None else None
+
+
+# --- policy ----------------------------------------------------------------
+
+class Resilience:
+    """
+    Wrap one upstream call with retries, an optional hedged duplicate and
+    (optionally) a circuit breaker, and record its latency. BackendPool
+    keeps one breaker per endpoint instead, so it passes none here.
+
+    Hedging: if the first attempt hasn't finished after the observed p95
+    (or AI_HEDGE_DELAY until enough samples exist), a duplicate is sent and
+    whichever succeeds first wins. A loser still queued is cancelled; one
+    already in flight can't be interrupted mid-read by requests, so it runs
+    to completion and its result is dropped. Hedged calls return fully read
+    bodies (streams are never hedged), so nothing is left open.
+    """
+
+    def __init__(
+        self,
+        retry: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
+        hedge: bool = HEDGE_ENABLED,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker
+        self.latency = LatencyTracker()
+        self.hedge = hedge
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "failures": 0, "hedges_sent": 0, "hedges_won": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai-hedge")
+        return self._executor
+
+    def hedge_delay(self) -> float:
+        if len(self.latency) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DELAY
+        return max(self.latency.percentile(95) or HEDGE_DELAY, HEDGE_MIN_DELAY)
+
+    def _hedged(self, fn: Callable[[], T]) -> T:
+        pool = self._pool()
+        first = pool.submit(contextvars.copy_context().run, fn)
+        done, _ = wait([first], timeout=self.hedge_delay())
+        if done:
+            return first.result()
+
+        self._count("hedges_sent")
+        second = pool.submit(contextvars.copy_context().run, fn)
+        pending = {first, second}
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is second:
+                        self._count("hedges_won")
+                    for loser in pending:
+                        loser.cancel()  # no-op once it's running; its result is dropped
+                    return f.result()
+                error = f.exception()
+        raise error  # both attempts failed
+
+    def call(self, fn: Callable[[], T], hedge: bool | None = None) -> T:
+        use_hedge = self.hedge if hedge is None else hedge
+        self._count("calls")
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker and not self.breaker.allow():
+                raise CircuitOpenError("AI backend circuit open; failing fast")
+            t0 = time.monotonic()
+            try:
+                out = self._hedged(fn) if use_hedge else fn()
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.breaker and retryable:
+                    self.breaker.record_failure()
+                elif self.breaker:
+                    self.breaker.record_success()  # the backend answered; the request was bad
+                delay = self.retry.delay(attempt, getattr(e, "retry_after", None))
+                out_of_time = time.monotonic() - started + delay >= self.retry.deadline
+                if not retryable or attempt >= self.retry.max_attempts or out_of_time:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                _log_retry(attempt, delay, e)
+                time.sleep(delay)
+                continue
+            self.latency.observe(time.monotonic() - t0)
+            if self.breaker:
+                self.breaker.record_success()
+            return out
+
+    # --- asyncio ---
+
+    async def _ahedged(self, afn: Callable[[], Awaitable[T]]) -> T:
+        first = asyncio.ensure_future(afn())
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay())
+        if done:
+            return first.result()
+
+        self._count("hedges_sent")
+        second = asyncio.ensure_future(afn())
+        pending = {first, second}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is second:
+                            self._count("hedges_won")
+                        return t.result()
+                    error = t.exception()
+            raise error  # both attempts failed
+        finally:
+            for t in pending:
+                t.cancel()  # unlike a blocking read, the loser really stops here
+
+    async def acall(self, afn: Callable[[], Awaitable[T]], hedge: bool | None = None) -> T:
+        """Coroutine twin of call(): same retry/hedge/breaker policy and counters."""
+        use_hedge = self.hedge if hedge is None else hedge
+        self._count("calls")
+        started = time.monotonic()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.breaker and not self.breaker.allow():
+                raise CircuitOpenError("AI backend circuit open; failing fast")
+            t0 = time.monotonic()
+            try:
+                out = await (self._ahedged(afn) if use_hedge else afn())
+            except Exception as e:
+                retryable = is_retryable(e)
+                if self.breaker and retryable:
+                    self.breaker.record_failure()
+                elif self.breaker:
+                    self.breaker.record_success()
+                delay = self.retry.delay(attempt, getattr(e, "retry_after", None))
+                out_of_time = time.monotonic() - started + delay >= self.retry.deadline
+                if not retryable or attempt >= self.retry.max_attempts or out_of_time:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                _log_retry(attempt, delay, e)
+                await asyncio.sleep(delay)
+                continue
+            self.latency.observe(time.monotonic() - t0)
+            if self.breaker:
+                self.breaker.record_success()
+            return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+        out["latency"] = self.latency.stats()
+        if self.breaker:
+            out["breaker"] = {
+                "state": self.breaker.state,
+                "opens": self.breaker.opens,
+                "short_circuits": self.breaker.short_circuits,
+            }
+        out["hedge_enabled"] = self.hedge
+        return out
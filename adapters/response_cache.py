@@ -0,0 +1,261 @@
+# adapters/response_cache.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator
+
+# --- config ----------------------------------------------------------------
+
+CACHE_ENABLED    = os.getenv("AI_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+# SQLite file shared by every gunicorn worker on the host ("" = memory only)
+CACHE_PATH       = os.getenv("AI_CACHE_PATH", os.path.join(tempfile.gettempdir(), "loe-ai-cache.sqlite3"))
+CACHE_TTL        = float(os.getenv("AI_CACHE_TTL") or 86400)
+CACHE_MAX_ITEMS  = int(os.getenv("AI_CACHE_MAX_ENTRIES") or 2000)
+CACHE_MAX_BYTES  = int(os.getenv("AI_CACHE_MAX_BYTES") or 64 * 1024 * 1024)
+CACHE_MEM_ITEMS  = int(os.getenv("AI_CACHE_MEMORY_ENTRIES") or 256)
+
+
+# --- bypass ----------------------------------------------------------------
+
+_BYPASS: contextvars.ContextVar[bool] = contextvars.ContextVar("ai_cache_bypass", default=False)
+
+
+@contextlib.contextmanager
+def bypass(enabled: bool = True):
+    """Skip cache reads (results are still stored) for calls made inside."""
+    token = _BYPASS.set(bool(enabled))
+    try:
+        yield
+    finally:
+        _BYPASS.reset(token)
+
+
+def cache_key(model: str, system: str | None, prompt: str,
+              max_tokens: int, temperature: float, json_mode: bool) -> str:
+    blob = json.dumps(
+        [model or "", system or "", prompt or "", int(max_tokens), float(temperature), bool(json_mode)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+# --- store -----------------------------------------------------------------
+
+class ResponseCache:
+    """
+    Two-level cache of model replies: an in-process LRU in front of a SQLite
+    file shared between workers. Entries expire after `ttl` seconds; the
+    SQLite tier is trimmed to `max_entries` / `max_bytes` by last access.
+    """
+
+    def __init__(
+        self,
+        path: str = CACHE_PATH,
+        ttl: float = CACHE_TTL,
+        max_entries: int = CACHE_MAX_ITEMS,
+        max_bytes: int = CACHE_MAX_BYTES,
+        memory_entries: int = CACHE_MEM_ITEMS,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._mem: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counters = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "stores": 0, "evictions": 0, "bypassed": 0,
+        }
+        if self.path:
+            try:
+                self._db().execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                    " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+                )
+                self._db().execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            except sqlite3.Error:
+                self.path = ""  # unwritable location -> memory-only cache
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        with self._lock:
+            self._mem[key] = (value, created)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.memory_entries:
+                self._mem.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and now - hit[1] < self.ttl:
+                self._mem.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return hit[0]
+            if hit:
+                self._mem.pop(key, None)
+
+        if self.path:
+            try:
+                row = self._db().execute(
+                    "SELECT value, created FROM responses WHERE key = ? AND created > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row:
+                    self._db().execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[0], row[1])
+                    self._count("disk_hits")
+                    return row[0]
+            except sqlite3.Error:
+                pass
+
+        self._count("misses")
+        return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        self._remember(key, value, now)
+        self._count("stores")
+        if not self.path:
+            return
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses(key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, len(value.encode("utf-8"))),
+            )
+            self._evict(db, now)
+        except sqlite3.Error:
+            pass  # cache is best-effort
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        removed = db.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,)).rowcount
+        count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count > self.max_entries or size > self.max_bytes:
+            # Drop least-recently-used rows until both limits hold.
+            victims, drop_n, drop_b = [], count - self.max_entries, size - self.max_bytes
+            for key, sz in db.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+                if drop_n <= 0 and drop_b <= 0:
+                    break
+                victims.append((key,))
+                drop_n -= 1
+                drop_b -= sz
+            db.executemany("DELETE FROM responses WHERE key = ?", victims)
+            removed += len(victims)
+        if removed:
+            self._count("evictions", removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters, memory_entries=len(self._mem))
+        hits = out["memory_hits"] + out["disk_hits"]
+        total = hits + out["misses"]
+        out["hit_ratio"] = round(hits / total, 4) if total else None
+        return out
+
+
+# --- client wrapper --------------------------------------------------------
+
+class CachedClient:
+    """
+    Wrap an AI client so identical (model, system, prompt, max_tokens,
+    temperature, json_mode) calls are served from ResponseCache.
+    """
+
+    def __init__(self, inner, cache: ResponseCache):
+        self.inner = inner
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _key(self, prompt, system, json_mode, max_tokens, temperature) -> str:
+        model = getattr(self.inner, "model", type(self.inner).__module__)
+        return cache_key(model, system, prompt, max_tokens, temperature, json_mode)
+
+    def _lookup(self, key: str) -> str | None:
+        if _BYPASS.get():
+            self.cache._count("bypassed")
+            return None
+        return self.cache.get(key)
+
+    def complete(self, prompt: str, system: str | None = None, json_mode: bool = False,
+                 max_tokens: int = 2500, temperature: float = 0.2) -> str:
+        key = self._key(prompt, system, json_mode, max_tokens, temperature)
+        hit = self._lookup(key)
+        if hit is not None:
+            return hit
+        out = self.inner.complete(prompt, system=system, json_mode=json_mode,
+                                  max_tokens=max_tokens, temperature=temperature)
+        self.cache.put(key, out)
+        return out
+
+    async def acomplete(self, prompt: str, system: str | None = None, json_mode: bool = False,
+                        max_tokens: int = 2500, temperature: float = 0.2) -> str:
+        key = self._key(prompt, system, json_mode, max_tokens, temperature)
+        hit = await asyncio.to_thread(self._lookup, key)  # SQLite tier; the bypass flag rides along
+        if hit is not None:
+            return hit
+        out = await self.inner.acomplete(prompt, system=system, json_mode=json_mode,
+                                         max_tokens=max_tokens, temperature=temperature)
+        await asyncio.to_thread(self.cache.put, key, out)
+        return out
+
+    def stream(self, prompt: str, system: str | None = None, max_tokens: int = 2500,
+               temperature: float = 0.2) -> Iterator[str]:
+        # A streamed reply is the raw (non-JSON-enforced) text, so it shares
+        # entries with complete(json_mode=False).
+        key = self._key(prompt, system, False, max_tokens, temperature)
+        hit = self._lookup(key)
+        if hit is not None:
+            yield hit
+            return
+        parts = []
+        for chunk in self.inner.stream(prompt, system=system, max_tokens=max_tokens,
+                                       temperature=temperature):
+            parts.append(chunk)
+            yield chunk
+        self.cache.put(key, "".join(parts))
+
+    def stats(self) -> dict:
+        out = dict(self.inner.stats()) if hasattr(self.inner, "stats") else {}
+        out["cache"] = self.cache.stats()
+        return out
+
+
+_CACHE: ResponseCache | None = None
+_CACHE_LOCK = threading.Lock()
+
+
+def shared_cache() -> ResponseCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = ResponseCache()
+    return _CACHE
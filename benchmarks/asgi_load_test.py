@@ -0,0 +1,106 @@
+"""
+Load test: threaded gunicorn app (services/app.py) vs. the asyncio app
+(services/asgi_app.py), both against the mock client's latency model.
+
+Each server is started in a subprocess with USE_MOCK=1 and
+AI_MOCK_FIRST_TOKEN_MS=MOCK_MS (so every /generate waits like a real LLM
+call, without burning tokens), the response cache and single-flight off,
+and hit with CONCURRENCY simultaneous /generate requests with distinct
+schemas. Reported: wall time, throughput, p50/p95 latency and errors.
+
+  sync:  gunicorn -c services/gunicorn.conf.py  (2 workers x GUNICORN_THREADS)
+  asgi:  uvicorn services.asgi_app:app           (1 worker)
+
+The sync deployment can only have workers x threads calls in flight, so
+latency grows with the queue; the asyncio worker holds them all at once.
+
+    python -m benchmarks.asgi_load_test
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+MOCK_MS = 1000
+CONCURRENCY = [8, 64, 256]
+REQUEST_TIMEOUT = 120.0
+
+SERVERS = {
+    "sync (gunicorn)": ["gunicorn", "-c", "services/gunicorn.conf.py", "--bind", "127.0.0.1:{port}",
+                        "services.app:app"],
+    "asgi (uvicorn)":  [sys.executable, "-m", "uvicorn", "services.asgi_app:app",
+                        "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start(cmd: list[str]) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    env = dict(os.environ, USE_MOCK="1", AI_MOCK_FIRST_TOKEN_MS=str(MOCK_MS),
+               AI_CACHE_ENABLED="0", LOE_SINGLEFLIGHT="0", PYTHONPATH=os.getcwd())
+    proc = subprocess.Popen([c.format(port=port) for c in cmd], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base}/health", timeout=1).status_code == 200:
+                return proc, base
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"server did not start: {' '.join(cmd)}")
+
+
+async def _burst(base: str, n: int) -> tuple[float, list[float], int]:
+    limits = httpx.Limits(max_connections=n, max_keepalive_connections=n)
+    async with httpx.AsyncClient(base_url=base, timeout=REQUEST_TIMEOUT, limits=limits) as c:
+        async def one(i: int):
+            t0 = time.perf_counter()
+            try:
+                r = await c.post("/generate", json={"schema": {"client": f"Load {i}", "loe_type": "default"}})
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            return time.perf_counter() - t0, ok
+
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+    return wall, sorted(d for d, ok in results if ok), sum(not ok for _, ok in results)
+
+
+def _pct(data: list[float], p: float) -> float:
+    if not data:
+        return float("nan")
+    return data[min(int(round(p / 100 * (len(data) - 1))), len(data) - 1)]
+
+
+def main() -> None:
+    print(f"mock LLM latency {MOCK_MS} ms per call")
+    print(f"{'server':18} {'conc':>5} {'wall s':>7} {'req/s':>7} {'p50 s':>6} {'p95 s':>6} {'errors':>6}")
+    for name, cmd in SERVERS.items():
+        proc, base = _start(cmd)
+        try:
+            for n in CONCURRENCY:
+                wall, lat, errors = asyncio.run(_burst(base, n))
+                print(f"{name:18} {n:>5} {wall:>7.2f} {len(lat) / wall:>7.1f} "
+                      f"{_pct(lat, 50):>6.2f} {_pct(lat, 95):>6.2f} {errors:>6}")
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: re-generating a rack_stack LoE after a small edit, in full vs.
+incrementally (generate with previous_result_id), against the mock
+client's latency model: AI_MOCK_FIRST_TOKEN_MS + AI_MOCK_TOKEN_MS per
+output token.
+
+Replies are sized like real output, as in sharded_generate_bench: one
+site card of CARD_CHARS per site the prompt lists, the cross-site
+sections and the summary as long as the golden example's.
+
+Edits, each applied to the SITES-site schema the previous result came from:
+  one site's BOM  -> that site's card (+ the summary: the device total moved)
+  one site's notes -> that site's card only
+  add a prerequisite -> the Client Prerequisites section only
+
+Reported per edit: median wall time, LLM calls and output tokens of each.
+
+    python -m benchmarks.incremental_generate_bench
+"""
+from __future__ import annotations
+
+import copy
+import os
+import statistics
+import time
+
+# the latency model is read when the mock client is imported
+os.environ.setdefault("AI_MOCK_FIRST_TOKEN_MS", "400")
+os.environ.setdefault("AI_MOCK_TOKEN_MS", "2")
+
+from benchmarks.sharded_generate_bench import CHARS_PER_TOKEN, _SizedMock  # noqa: E402
+from adapters import mock_client  # noqa: E402
+from services.generator import orchestrator  # noqa: E402
+
+SITES = 20
+REPS = 3
+
+
+class _CountingMock(_SizedMock):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.tokens = 0
+
+    def complete(self, prompt: str, system: str | None = None, **kw) -> str:
+        out = super().complete(prompt, system=system, **kw)
+        self.calls += 1
+        self.tokens += len(out) // CHARS_PER_TOKEN
+        return out
+
+
+def _schema() -> dict:
+    return {
+        "client": "ACME",
+        "sites": [{"name": f"DC{i}", "address": f"{i} Example Way", "role": "Data centre",
+                   "install_in_scope": True, "bom": [{"qty": 2, "model": "C9300-48P"}]}
+                  for i in range(SITES)],
+        "bom": [{"qty": 2 * SITES, "model": "C9300-48P"}],
+        "prerequisites": ["Rack space confirmed"],
+    }
+
+
+def _bom(s: dict) -> None:
+    s["sites"][3]["bom"][0]["qty"] = 4
+
+
+def _notes(s: dict) -> None:
+    s["sites"][3]["notes"] = "Loading bay closes at 16:00."
+
+
+def _prereq(s: dict) -> None:
+    s["prerequisites"].append("Power circuits live")
+
+
+EDITS = {"one site's BOM": _bom, "one site's notes": _notes, "add a prerequisite": _prereq}
+
+
+def _run(client: _CountingMock, edit, incremental: bool) -> tuple[float, int, int]:
+    base = orchestrator.generate_outputs(_schema(), "rack_stack")
+    edited = _schema()
+    edit(edited)
+    times = []
+    client.calls = client.tokens = 0
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        orchestrator.generate_outputs(copy.deepcopy(edited), "rack_stack",
+                                      previous_result_id=base["result_id"] if incremental else None)
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times), client.calls // REPS, client.tokens // REPS
+
+
+def main() -> None:
+    client = _CountingMock()
+    orchestrator.get_client = lambda: client  # bypass the response cache
+
+    print(f"mock: first token {mock_client.FIRST_TOKEN_MS:.0f} ms, {mock_client.TOKEN_MS:.0f} ms/token; "
+          f"{SITES} sites")
+    print(f"{'edit':20} {'full ms':>8} {'calls':>6} {'tokens':>7} {'incr ms':>8} {'calls':>6} {'tokens':>7}")
+    for label, edit in EDITS.items():
+        a, a_calls, a_tok = _run(client, edit, incremental=False)
+        b, b_calls, b_tok = _run(client, edit, incremental=True)
+        print(f"{label:20} {a:>8.0f} {a_calls:>6} {a_tok:>7} {b:>8.0f} {b_calls:>6} {b_tok:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark: single-pass JSON extraction vs. the previous regex paths.
+
+Builds model-like replies from 10 KB to 1 MB (prose + JSON object, and a
+truncated variant with no closing brace) and times:
+  - legacy client path:  greedy  \\{(?:.|\\n|\\r)*\\}\\s*$   + json.loads retries
+  - legacy coerce path:  \\{.*\\} (DOTALL)                  + json.loads retries
+  - adapters.json_extract.extract_json (one scan, one parse per candidate)
+
+The legacy client regex is skipped above LEGACY_MAX bytes: whenever any
+text follows the last '}' (trailing prose, truncation) it backtracks
+quadratically and a 1 MB reply takes minutes.
+
+    python -m benchmarks.json_extract_bench
+"""
+from __future__ import annotations
+
+import json
+import re
+import time
+
+from adapters.json_extract import extract_json
+
+SIZES = [10_000, 100_000, 1_000_000]
+LEGACY_MAX = 110_000
+
+
+def _legacy_client(text: str):
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    m = re.search(r"\{(?:.|\n|\r)*\}\s*$", text)
+    if m:
+        try:
+            return json.loads(m.group(0))
+        except Exception:
+            pass
+    return None
+
+
+def _legacy_coerce(text: str):
+    try:
+        return json.loads(text)
+    except Exception:
+        pass
+    m = re.search(r"\{.*\}", text, flags=re.S)
+    if m:
+        try:
+            return json.loads(m.group(0))
+        except Exception:
+            pass
+    return None
+
+
+def _reply(size: int, truncated: bool) -> str:
+    row = "| AP64 | Access point {rev} | 4 | AP |\\n"
+    body = []
+    while sum(map(len, body)) < size:
+        body.append(row)
+    obj = json.dumps({"summary": "".join(body), "tasks": "- {BOM_TABLE}", "open_questions": []})
+    text = "Here is the LoE you asked for {as JSON}:\n" + obj + "\nHope this helps."
+    return text[: len(text) // 2] if truncated else text
+
+
+def _time(fn, text: str, reps: int) -> str:
+    """Mean ms per call, plus whether the call found the object at all."""
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        found = fn(text)
+    ms = (time.perf_counter() - t0) / reps * 1000
+    return f"{ms:.2f} {'ok' if found else 'miss'}"
+
+
+def main() -> None:
+    # "miss" = no object recovered (truncated inputs are expected to miss;
+    # they go on to the repair engine).
+    print(f"{'input':24} {'legacy client ms':>17} {'legacy coerce ms':>17} {'extract_json ms':>16}")
+    for size in SIZES:
+        for truncated in (False, True):
+            text = _reply(size, truncated)
+            reps = max(1, 200_000 // size)
+            label = f"{len(text) // 1000} KB{' truncated' if truncated else ''}"
+            lc = "skipped" if len(text) > LEGACY_MAX else _time(_legacy_client, text, reps)
+            lo = _time(_legacy_coerce, text, reps)
+            ne = _time(extract_json, text, reps)
+            print(f"{label:24} {lc:>17} {lo:>17} {ne:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Corpus of malformed model outputs vs. the local JSON repair engine.
+
+For every sample, shows whether the client's cheap path (the single-pass
+extractor in adapters/json_extract.py) already parsed it, whether the local repair
+engine fixes it, and therefore how many "please re-emit strict JSON" LLM
+round trips are avoided.
+
+    python -m benchmarks.json_repair_corpus
+"""
+from __future__ import annotations
+
+import json
+import time
+
+from adapters.json_extract import extract_json
+from adapters.json_repair import repair_json, repair_stats
+
+CORPUS: list[tuple[str, str]] = [
+    ("valid",
+     '{"summary": "ok", "tasks": "- a", "open_questions": []}'),
+    ("code fence",
+     '```json\n{"summary": "ok", "tasks": "- a"}\n```'),
+    ("prose before/after",
+     'Sure! Here is the LoE:\n{"summary": "ok", "tasks": "- a"}\nLet me know if you need changes.'),
+    ("trailing comma object",
+     '{"summary": "ok", "tasks": "- a",}'),
+    ("trailing comma array",
+     '{"summary": "ok", "open_questions": ["a", "b",]}'),
+    ("single quotes",
+     "{'summary': 'ok', 'tasks': '- a'}"),
+    ("apostrophe in single-quoted string",
+     "{'summary': 'the client's site', 'tasks': '- a'}"),
+    ("raw newlines in string",
+     '{"summary": "### Project Summary\n\nLine two", "tasks": "- a\n- b"}'),
+    ("unescaped inner quotes",
+     '{"summary": "The "Core & User" phase covers floors 1-3", "tasks": "- a"}'),
+    ("unescaped quotes before comma",
+     '{"summary": "Label as "AP-01", then mount", "tasks": "- a"}'),
+    ("invalid escape",
+     '{"summary": "path C:\\data\\new and it\\\'s fine", "tasks": "- a"}'),
+    ("python literals",
+     '{"summary": "ok", "include": True, "days": None}'),
+    ("unquoted keys",
+     '{summary: "ok", tasks: "- a"}'),
+    ("truncated mid-string",
+     '{"summary": "### Project Summary\\n\\nWWT will install 24 APs across', ),
+    ("truncated after comma",
+     '{"summary": "ok", "tasks": "- a", '),
+    ("truncated after key",
+     '{"summary": "ok", "tasks"'),
+    ("truncated after colon",
+     '{"summary": "ok", "tasks": '),
+    ("truncated in nested array",
+     '{"summary": "ok", "open_questions": ["Any change approvals', ),
+    ("mixed: fence + trailing comma + newline",
+     '```json\n{"summary": "a\nb", "tasks": "- a",}\n```'),
+    ("not json at all",
+     "I'm sorry, I can't help with that."),
+]
+
+
+def _old_path_ok(text: str) -> bool:
+    return extract_json(text) is not None
+
+
+def main() -> None:
+    needed_llm_before = needed_llm_after = 0
+    print(f"{'sample':42} {'extract':>7} {'local':>6} {'us':>8}")
+    for name, text in CORPUS:
+        old_ok = _old_path_ok(text)
+        t0 = time.perf_counter()
+        fixed = repair_json(text)
+        dt = (time.perf_counter() - t0) * 1e6
+        needed_llm_before += not old_ok
+        needed_llm_after += (not old_ok) and fixed is None
+        print(f"{name:42} {'ok' if old_ok else 'FAIL':>7} {'ok' if fixed else 'FAIL':>6} {dt:8.1f}")
+
+    print()
+    print(f"LLM repair round trips before: {needed_llm_before}/{len(CORPUS)}")
+    print(f"LLM repair round trips after:  {needed_llm_after}/{len(CORPUS)}")
+    print(f"removed: {needed_llm_before - needed_llm_after}")
+    print("repair counters:", json.dumps(repair_stats(), sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Benchmark: time to first token for /generate prompts in the legacy layout
+vs. the prefix-cache layout (orchestrator.assemble_prompt), against a
+local stand-in gateway that simulates provider-side prefix caching.
+
+  legacy:  system | user = intro, schema context, golden example, contract
+  prefix:  system = system prompt, intro, golden example, contract | user = schema context
+
+The stand-in (an OpenAI-compatible /chat/completions on localhost) keeps
+every prompt it has seen; a new prompt's longest shared prefix, rounded
+down to CACHE_BLOCK tokens and counted only from CACHE_MIN tokens up, is
+"cached". Prefill costs PREFILL_MS per uncached token and
+PREFILL_MS * CACHED_COST per cached one (the ~90% discount providers
+advertise); the server sleeps for that long before replying, and reports
+cached tokens in usage like OpenAI does. Tokens are approximated as
+chars / 4.
+
+Each layout gets a fresh stand-in and SCHEMAS distinct rack_stack schemas
+sent through AIClient.complete(), so cache hints (cache_control) are sent
+exactly as in production for an Anthropic-style model name.
+
+    python -m benchmarks.prefix_cache_bench
+"""
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from adapters import hooks
+from adapters.ai_client import AIClient
+from adapters.backends import BackendPool, Endpoint
+from adapters.capabilities import CapabilityCache
+from services.generator import orchestrator
+from services.generator.registry import get_mode
+from services.prompt_loader import load_prompt_file
+
+SCHEMAS = 20
+MODEL = "claude-standin"      # matches AI_CACHE_HINT_MODELS, so hints are sent
+CHARS_PER_TOKEN = 4
+PREFILL_MS = 0.1              # per uncached prompt token
+CACHED_COST = 0.1             # cached tokens cost 10% of a fresh one
+CACHE_BLOCK = 128             # tokens; prefixes are cached in whole blocks
+CACHE_MIN = 1024              # tokens; shorter prefixes aren't cached
+BASE_MS = 20.0                # queueing + network, paid by every request
+
+_UPSTREAM: list[dict] = []
+hooks.subscribe(lambda event, f: _UPSTREAM.append(f) if event == "upstream" else None)
+
+
+class _StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.seen: list[str] = []
+        self.hinted = 0
+        self.lock = threading.Lock()
+
+    def prefill(self, prompt: str) -> tuple[int, int]:
+        """(prompt tokens, cached tokens) for `prompt`; remembers it."""
+        with self.lock:
+            shared = max((len(os.path.commonprefix([prompt, p])) for p in self.seen), default=0)
+            self.seen.append(prompt)
+        total = len(prompt) // CHARS_PER_TOKEN
+        cached = shared // CHARS_PER_TOKEN // CACHE_BLOCK * CACHE_BLOCK
+        return total, cached if cached >= CACHE_MIN else 0
+
+
+def _text(content) -> str:
+    if isinstance(content, list):  # content parts (how cache_control is attached)
+        return "".join(part.get("text") or "" for part in content)
+    return content or ""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):  # /models, for warm-up
+        self._reply({"data": [{"id": MODEL}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        msgs = body.get("messages") or []
+        if any(isinstance(m.get("content"), list) for m in msgs):
+            self.server.hinted += 1
+        prompt = "".join(f"<{m['role']}>{_text(m.get('content'))}" for m in msgs)
+        total, cached = self.server.prefill(prompt)
+        ttft_ms = BASE_MS + (total - cached) * PREFILL_MS + cached * PREFILL_MS * CACHED_COST
+        time.sleep(ttft_ms / 1000)
+        self._reply({
+            "choices": [{"message": {"role": "assistant", "content": "## Scope\n- ok"}}],
+            "usage": {"prompt_tokens": total, "completion_tokens": 4,
+                      "prompt_tokens_details": {"cached_tokens": cached}},
+        })
+
+    def _reply(self, payload: dict) -> None:
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def _schema(i: int) -> dict:
+    n_sites = 1 + i % 5
+    return {
+        "client": f"Client {i}",
+        "counts": {"aps_ordered": 10 + i, "aps_to_mount": 8 + i},
+        "notes_raw": f"Rack and stack {n_sites} site(s); customer ref {1000 + i}.",
+        "sites": [{"name": f"Site {i}-{j}", "address": f"{j} High Street, Town {i}",
+                   "role": "Branch", "install_in_scope": True} for j in range(n_sites)],
+        "bom": [{"qty": 2 + j, "model": "C9300-48P"} for j in range(n_sites)],
+        "prerequisites": ["Rack space confirmed", f"Site contact {i}"],
+        "out_of_scope": ["Cabling"],
+    }
+
+
+def _run(layout: str) -> dict:
+    server = _StandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    client = AIClient(pool=BackendPool([Endpoint(base, "bench", MODEL)]),
+                      capabilities=CapabilityCache(path=""))
+    mode = get_mode("rack_stack")
+    system = load_prompt_file(mode.prompt_dir, "system.txt") or \
+        load_prompt_file(orchestrator.DEFAULT_PROMPT_DIR, "system.txt")
+
+    latencies = []
+    _UPSTREAM.clear()
+    try:
+        for i in range(SCHEMAS):
+            sys_msg, user_msg = orchestrator.assemble_prompt(mode, _schema(i), system, layout=layout)
+            t0 = time.perf_counter()
+            client.complete(user_msg, system=sys_msg, max_tokens=32)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    finally:
+        server.shutdown()
+    total = sum(f["prompt_tokens"] or 0 for f in _UPSTREAM)
+    cached = sum(f["cached_tokens"] or 0 for f in _UPSTREAM)
+    return {
+        "mean": statistics.fmean(latencies),
+        "p50": statistics.median(latencies),
+        "warm_mean": statistics.fmean(latencies[1:]),
+        "cached_pct": 100.0 * cached / total if total else 0.0,
+        "hinted": server.hinted,
+    }
+
+
+def main() -> None:
+    print(f"{SCHEMAS} rack_stack prompts; prefill {PREFILL_MS} ms/token, cached tokens at "
+          f"{CACHED_COST:.0%}, cache from {CACHE_MIN} tokens in {CACHE_BLOCK}-token blocks")
+    print(f"{'layout':8} {'mean ms':>8} {'p50 ms':>8} {'warm mean':>10} {'cached %':>9} {'hinted':>7}")
+    rows = {layout: _run(layout) for layout in ("legacy", "prefix")}
+    for layout, r in rows.items():
+        print(f"{layout:8} {r['mean']:>8.1f} {r['p50']:>8.1f} {r['warm_mean']:>10.1f} "
+              f"{r['cached_pct']:>8.1f}% {r['hinted']:>7}")
+    a, b = rows["legacy"]["warm_mean"], rows["prefix"]["warm_mean"]
+    print(f"\nwarm time-to-first-token: {a:.1f} -> {b:.1f} ms ({a / b:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Micro-benchmark: per-request prompt construction, before and after the
+compiled template layer (services/prompt_template.py).
+
+  rack_stack build_prompt
+    legacy:    os.path.exists + read golden.md, interpolate an indented
+               ~6 KB f-string, textwrap.dedent() over the whole result
+               (reconstructed from the block files, indented as it was in prompt.py)
+    compiled:  services.generator.modes.rack_stack.prompt.build_prompt
+  ingest content.txt
+    legacy:    os.path.exists + read content.txt, .replace("{{EMAIL_TEXT}}")
+    compiled:  load_template(...).render(EMAIL_TEXT=...)
+
+Schemas with 1 and 50 sites; ingest with a 2 KB and a 20 KB email.
+
+    python -m benchmarks.prompt_build_bench
+"""
+from __future__ import annotations
+
+import os
+import textwrap
+import time
+
+from services.generator.modes.rack_stack import prompt as rs_prompt
+from services.generator.shared.derive import derive_mounting_qty_from_notes, sum_bom_qty
+from services.generator.shared.text import bullet_block
+from services.prompt_loader import ROOT, load_template
+
+REPS = 2000
+
+_RS_DIR = os.path.join(ROOT, rs_prompt.PROMPT_DIR)
+_INGEST_DIR = os.path.join(ROOT, "services/ingest/prompts")
+
+_LEGACY_BLOCKS = []
+for _name in ("intro.txt", "context.txt", "example.txt", "contract.txt"):
+    with open(os.path.join(_RS_DIR, _name), encoding="utf-8") as _f:
+        _LEGACY_BLOCKS.append(_f.read().strip())
+_LEGACY_BODY = textwrap.indent("\n\n".join(_LEGACY_BLOCKS), "    ")
+
+
+def _read(path: str) -> str:
+    # the pre-cache load_prompt_file
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    return ""
+
+
+def _legacy_build_prompt(schema: dict) -> str:
+    golden = _read(os.path.join(_RS_DIR, "golden.md"))
+    counts = schema.get("counts") or {}
+    sites = schema.get("sites") or []
+    values = {
+        "client": schema.get("client", "") or "(Client)",
+        "primary_site": rs_prompt._primary_site(schema),
+        "device_totals_line": f"**Device totals:** {counts.get('aps_ordered') or 'TBD'} APs ordered",
+        "total_ordered": sum_bom_qty(schema) or "TBD",
+        "mounting_qty": derive_mounting_qty_from_notes(schema.get("notes_raw", "")) or "TBD",
+        "sites_block": bullet_block([f"{s['name']} — {s['address']}" for s in sites]),
+        "prerequisites": bullet_block(schema.get("prerequisites")) or "- (none provided)",
+        "out_of_scope": bullet_block(schema.get("out_of_scope")) or "- (none provided)",
+        "golden": golden,
+    }
+    text = _LEGACY_BODY
+    for k, v in values.items():  # stands in for the f-string interpolation
+        text = text.replace("{{" + k + "}}", str(v))
+    return textwrap.dedent(text).strip()
+
+
+def _legacy_ingest(email: str) -> str:
+    return _read(os.path.join(_INGEST_DIR, "content.txt")).replace("{{EMAIL_TEXT}}", email)
+
+
+def _compiled_ingest(email: str) -> str:
+    return load_template("services/ingest/prompts", "content.txt").render(EMAIL_TEXT=email)
+
+
+def _schema(n_sites: int) -> dict:
+    return {
+        "client": "ACME",
+        "counts": {"aps_ordered": 40, "aps_to_mount": 38},
+        "notes_raw": "All APs require mounting 38 units.\n" * 5,
+        "sites": [{"name": f"Site {i}", "address": f"{i} High Street, Town",
+                   "role": "Branch", "install_in_scope": True} for i in range(n_sites)],
+        "bom": [{"qty": 4, "model": "AP45"} for _ in range(n_sites)],
+        "prerequisites": ["Power at each AP location", "Lift access"],
+        "out_of_scope": ["Cabling"],
+    }
+
+
+def _time(fn, arg) -> float:
+    fn(arg)  # warm the prompt cache
+    t0 = time.perf_counter()
+    for _ in range(REPS):
+        fn(arg)
+    return (time.perf_counter() - t0) / REPS * 1e6
+
+
+def main() -> None:
+    print(f"{'case':28} {'legacy us':>10} {'compiled us':>12} {'speed-up':>9}")
+    rows = [
+        (f"rack_stack, {n} site(s)", _legacy_build_prompt, rs_prompt.build_prompt, _schema(n))
+        for n in (1, 50)
+    ] + [
+        (f"ingest, {kb} KB email", _legacy_ingest, _compiled_ingest, "x" * (kb * 1000))
+        for kb in (2, 20)
+    ]
+    for label, legacy, compiled, arg in rows:
+        a, b = _time(legacy, arg), _time(compiled, arg)
+        print(f"{label:28} {a:>10.1f} {b:>12.1f} {a / b:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: /generate wall-clock time with the "single" strategy (one JSON
+completion carrying summary and tasks) vs. "sections" (one smaller
+completion per section, run concurrently), against the mock client's
+latency model: AI_MOCK_FIRST_TOKEN_MS + AI_MOCK_TOKEN_MS per output token.
+
+The stock mock replies are a few dozen tokens, far shorter than a real
+LOE, so the replies here are sized like the golden example: its summary
+(up to "### Site Work Packages by Location") and its tasks (the rest).
+Everything else -- prompts, fan-out, merge, post_process -- is the real
+generate path (orchestrator.generate_outputs / agenerate_outputs).
+
+    python -m benchmarks.section_parallel_bench
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import statistics
+import time
+
+# the latency model is read when the mock client is imported
+os.environ.setdefault("AI_MOCK_FIRST_TOKEN_MS", "400")
+os.environ.setdefault("AI_MOCK_TOKEN_MS", "5")
+
+from adapters import mock_client  # noqa: E402
+from services.generator import orchestrator  # noqa: E402
+from services.prompt_loader import load_prompt_file  # noqa: E402
+
+REPS = 3
+
+_GOLDEN = load_prompt_file("services/generator/modes/rack_stack", "golden.md")
+_SPLIT = _GOLDEN.index("### Site Work Packages by Location")
+_SECTIONS = {"summary": _GOLDEN[:_SPLIT], "tasks": _GOLDEN[_SPLIT:]}
+
+
+class _SizedMock(mock_client.AIClient):
+    """The mock client, replying with golden-example-sized sections."""
+
+    def _reply(self, prompt: str, system: str | None = None) -> str:
+        keys = json.loads(super()._reply(prompt, system))
+        return json.dumps({k: _SECTIONS.get(k, v) for k, v in keys.items()})
+
+
+def _schema() -> dict:
+    return {
+        "client": "ACME",
+        "counts": {"aps_ordered": 12, "aps_to_mount": 10},
+        "sites": [{"name": f"DC{i}", "address": f"{i} Example Way, London",
+                   "role": "Data centre", "install_in_scope": True} for i in range(1, 3)],
+        "bom": [{"qty": 6, "model": "C9300-48P"}],
+    }
+
+
+def _time_sync(strategy: str) -> list[float]:
+    out = []
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        orchestrator.generate_outputs(_schema(), "rack_stack", strategy=strategy)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def _time_async(strategy: str) -> list[float]:
+    async def run() -> list[float]:
+        out = []
+        for _ in range(REPS):
+            t0 = time.perf_counter()
+            await orchestrator.agenerate_outputs(_schema(), "rack_stack", strategy=strategy)
+            out.append((time.perf_counter() - t0) * 1000)
+        return out
+    return asyncio.run(run())
+
+
+def main() -> None:
+    client = _SizedMock()
+    orchestrator.get_client = lambda: client        # bypass the response cache
+    orchestrator.get_async_client = lambda: client
+
+    tokens = {k: len(v) // 4 for k, v in _SECTIONS.items()}
+    print(f"mock: first token {mock_client.FIRST_TOKEN_MS:.0f} ms, {mock_client.TOKEN_MS:.0f} ms/token; "
+          f"summary ~{tokens['summary']} tokens, tasks ~{tokens['tasks']} tokens")
+    print(f"{'path':22} {'single ms':>10} {'sections ms':>12} {'speed-up':>9}")
+    for label, timer in (("generate (threads)", _time_sync), ("agenerate (asyncio)", _time_async)):
+        a = statistics.median(timer("single"))
+        b = statistics.median(timer("sections"))
+        print(f"{label:22} {a:>10.0f} {b:>12.0f} {a / b:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: rack_stack /generate for growing site counts, one JSON call
+("single") vs. sharded site cards ("sharded"), against the mock client's
+latency model: AI_MOCK_FIRST_TOKEN_MS + AI_MOCK_TOKEN_MS per output token.
+
+The stand-in replies are sized like real output: one site card of
+CARD_CHARS per site the prompt lists, the cross-site sections and the
+summary as long as the golden example's. A reply longer than the call's
+max_tokens is cut off there, as a gateway would (the single call's
+3000-token cap); cards lost that way are backfilled by post_process.
+
+Reported per site count: median wall time of each strategy, and how many
+of the final site cards were written by the model (not backfilled); the
+"template" strategy (no model call, every card from the schema) is the
+floor both are measured against.
+
+    python -m benchmarks.sharded_generate_bench
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import statistics
+import time
+
+# the latency model is read when the mock client is imported
+os.environ.setdefault("AI_MOCK_FIRST_TOKEN_MS", "400")
+os.environ.setdefault("AI_MOCK_TOKEN_MS", "2")
+
+from adapters import mock_client  # noqa: E402
+from services.generator import orchestrator  # noqa: E402
+from services.generator.modes.rack_stack import prompt as rs_prompt  # noqa: E402
+from services.prompt_loader import load_prompt_file  # noqa: E402
+
+SITE_COUNTS = [1, 5, 10, 20, 40]
+REPS = 3
+CHARS_PER_TOKEN = 4
+CARD_CHARS = 600
+
+_GOLDEN = load_prompt_file("services/generator/modes/rack_stack", "golden.md")
+_SUMMARY = _GOLDEN[:_GOLDEN.index("### Site Work Packages by Location")]
+_SHARED = _GOLDEN[_GOLDEN.index("### Site Survey"):]
+# context.txt lists each site as "- {name} — {address} (Role: ..., Phases: ...)"
+_SITE_LINE_RE = re.compile(r"(?m)^- (.+?) — .*\(Role:")
+_KEY_RE = re.compile(r'with the single key "(\w+)"')
+
+
+def _cards(prompt: str) -> str:
+    out = []
+    for name in _SITE_LINE_RE.findall(prompt):
+        body = f"- Model-written task for {name}.\n"
+        out.append(f"#### 📍 {name} — Address\n" + body + "- Detail.\n" * ((CARD_CHARS - len(body)) // 10))
+    return "\n".join(out)
+
+
+class _SizedMock(mock_client.AIClient):
+    """The mock latency model, with replies sized to the sites asked for."""
+
+    def complete(self, prompt: str, system: str | None = None, json_mode: bool = False,
+                 max_tokens: int = 2500, temperature: float = 0.2) -> str:
+        key = _KEY_RE.search(system or "")
+        if key is None:
+            reply = {"summary": _SUMMARY, "tasks": "### Site Work Packages by Location\n"
+                     + _cards(prompt) + "\n" + _SHARED}
+        else:
+            key = key.group(1)
+            reply = {key: {"summary": _SUMMARY, "shared_tasks": _SHARED}.get(key) or _cards(prompt)}
+        out = json.dumps(reply, ensure_ascii=False)[:max_tokens * CHARS_PER_TOKEN]  # truncated at the cap
+        time.sleep((mock_client.FIRST_TOKEN_MS
+                    + mock_client.TOKEN_MS * len(out) / CHARS_PER_TOKEN) / 1000.0)
+        return out
+
+
+def _schema(n_sites: int) -> dict:
+    return {
+        "client": "ACME",
+        "sites": [{"name": f"DC{i}", "address": f"{i} Example Way", "role": "Data centre",
+                   "install_in_scope": True} for i in range(n_sites)],
+        "bom": [{"qty": 2, "model": "C9300-48P"}],
+    }
+
+
+def _run(n_sites: int, strategy: str) -> tuple[float, int]:
+    times, written = [], 0
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        result = orchestrator.generate_outputs(_schema(n_sites), "rack_stack", strategy=strategy)
+        times.append((time.perf_counter() - t0) * 1000)
+        written = result["tasks"].count("Model-written task")
+    return statistics.median(times), written
+
+
+def _template_ms(n_sites: int) -> float:
+    times = []
+    for _ in range(REPS):
+        t0 = time.perf_counter()
+        orchestrator.generate_outputs(_schema(n_sites), "rack_stack", strategy="template")
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main() -> None:
+    client = _SizedMock()
+    orchestrator.get_client = lambda: client  # bypass the response cache
+
+    print(f"mock: first token {mock_client.FIRST_TOKEN_MS:.0f} ms, {mock_client.TOKEN_MS:.0f} ms/token; "
+          f"{rs_prompt.SITES_PER_SHARD} sites/shard from {rs_prompt.SHARD_MIN_SITES} sites, "
+          f"{orchestrator.SECTION_CONCURRENCY} calls in flight")
+    print(f"{'sites':>5} {'single ms':>10} {'cards':>6} {'sharded ms':>11} {'cards':>6} {'template ms':>12}")
+    for n in SITE_COUNTS:
+        a, a_cards = _run(n, "single")
+        b, b_cards = _run(n, "sharded")
+        t = _template_ms(n)
+        print(f"{n:>5} {a:>10.0f} {a_cards:>3}/{n:<2} {b:>11.0f} {b_cards:>3}/{n:<2} {t:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
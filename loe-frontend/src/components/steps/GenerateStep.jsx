@@ -14,7 +14,7 @@ function buildMarkdown(summary, tasks = "") {
 }
 
 
-export default function GenerateStep({ schema, onBack }) {
+export default function GenerateStep({ schema, resultId, onResult, onBack }) {
   const [out, setOut] = useState(null);
   const [loading, setLoading] = useState(false);
   const [err, setErr] = useState("");
@@ -29,7 +29,8 @@ export default function GenerateStep({ schema, onBack }) {
         try {
           if (done) return;
           done = true; // guard inside the effect
-          const resp = await generateLoE(schema);
+          const resp = await generateLoE(schema, undefined, resultId);
+          if (resp?.result_id) onResult?.(resp.result_id);
           if (!cancelled) setOut(resp);
         } catch (e) {
           if (!cancelled) setErr(e.message || "Generate failed");
@@ -71,6 +72,16 @@ export default function GenerateStep({ schema, onBack }) {
           </div>
         )}
 
+        {out?.degraded && (
+          <div className="p-4 rounded-xl border border-amber-200 bg-amber-50 text-amber-800">
+            <strong className="block mb-1">Template draft</strong>
+            <div className="text-sm">
+              The AI service is unavailable ({out.degraded}), so this LoE was built from the standard
+              templates only. Generate again later for the full write-up.
+            </div>
+          </div>
+        )}
+
         {loading && !out && !err && (
           <div className="rounded-2xl border bg-white p-6">
             <div className="h-4 w-32 mb-4 bg-slate-200 rounded" />
@@ -6,6 +6,11 @@ const API_BASE =
   (isLocal ? "http://localhost:5050" : "/api");
 
 async function _json(res) {
+  if (res.status === 429) {
+    // admission control: the backend says how long its queue needs to drain
+    const wait = res.headers.get("Retry-After");
+    throw new Error(`Server is busy — please try again in ${wait ? `${wait}s` : "a moment"}.`);
+  }
   if (!res.ok) {
     const text = await res.text().catch(() => "");
     throw new Error(`HTTP ${res.status} ${res.statusText} — ${text || "no body"}`);
@@ -14,11 +19,26 @@ async function _json(res) {
 }
 
 const inflight = new Map();
+// Last ETag + body per request, so re-posting an unchanged schema is a 304.
+const lastSeen = new Map();
+
+async function _conditionalFetch(key, url, options) {
+  const seen = lastSeen.get(key);
+  const headers = { ...(options?.headers || {}) };
+  if (seen) headers["If-None-Match"] = seen.etag;
+  const res = await fetch(url, { ...options, headers });
+  if (res.status === 304 && seen) return seen.data;
+  const data = await _json(res);
+  const etag = res.headers.get("ETag");
+  if (etag) lastSeen.set(key, { etag, data });
+  return data;
+}
 
-function singleFlightFetch(url, options) {
-  const key = JSON.stringify({ url, body: options?.body || "" });
+// `keyBody`: what identifies the request, when the body carries more than that.
+function singleFlightFetch(url, options, keyBody) {
+  const key = JSON.stringify({ url, body: keyBody ?? (options?.body || "") });
   if (inflight.has(key)) return inflight.get(key);
-  const p = fetch(url, options).then(_json).finally(() => inflight.delete(key));
+  const p = _conditionalFetch(key, url, options).finally(() => inflight.delete(key));
   inflight.set(key, p);
   return p;
 }
@@ -31,10 +51,14 @@ export async function ingestText(text, loeType) {
   });
 }
 
-export async function generateLoE(schema, loeType) {
+// previousResultId: result_id of this LoE's last generate, so re-generating
+// after an edit only rewrites what the edit touched. Only pass it for the
+// same LoE (the caller keeps it with the schema it came from).
+export async function generateLoE(schema, loeType, previousResultId) {
+  const request = { schema, loe_type: loeType || schema?.loe_type };
   return singleFlightFetch(`${API_BASE}/generate`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ schema, loe_type: loeType || schema?.loe_type }),
-  });
+    body: JSON.stringify({ ...request, previous_result_id: previousResultId || null }),
+  }, JSON.stringify(request));
 }
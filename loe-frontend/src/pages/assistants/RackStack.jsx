@@ -13,13 +13,16 @@ export default function RackStack() {
   const navigate = useNavigate();
   const step = Math.max(1, Math.min(3, parseInt(stepParam) || 1));
   const [schema, setSchema] = useSessionState("rack_stack_schema", null);
+  // result_id of this LoE's last generate (re-generating after an edit revises it)
+  const [resultId, setResultId] = useSessionState("rack_stack_result_id", null);
 
   const goTo = (n) => navigate(`/assistants/rack-stack/${n}`);
 
   //Reset helper
   const startOver = () => {
-    clearSessionKeys(["rack_stack_schema"]);
+    clearSessionKeys("rack_stack_schema", "rack_stack_result_id");
     setSchema(null);
+    setResultId(null);
     goTo(1);
   };
 
@@ -76,7 +79,7 @@ export default function RackStack() {
 
       {step === 1 && (
         <PasteStep
-          onIngested={(sc) => { setSchema(sc); goTo(2); }}
+          onIngested={(sc) => { setSchema(sc); setResultId(null); goTo(2); }}
           defaultLoeType="rack_stack"
         />
       )}
@@ -96,6 +99,8 @@ export default function RackStack() {
       {step === 3 && schema && (
         <GenerateStep
           schema={schema}
+          resultId={resultId}
+          onResult={setResultId}
           onBack={() => goTo(2)}
         />
       )}
@@ -0,0 +1,335 @@
+# services/admission.py
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from services import metrics
+
+# Per gate (endpoint) and per worker process. LOE_ADMIT_<GATE>_<SETTING>
+# overrides LOE_ADMIT_<SETTING>, e.g. LOE_ADMIT_GENERATE_MAX_IN_FLIGHT=2.
+# The ASGI app's gates are sized from LOE_ADMIT_ASYNC_<SETTING> instead.
+ADMIT_ENABLED = os.getenv("LOE_ADMIT", "1").lower() in {"1", "true", "yes"}
+# Under gunicorn a request queued at a gate still holds a gthread thread,
+# and anything beyond the threads waits in gthread's own queue where no gate
+# sees it. So every threaded gate of a worker together holds (runs + queues)
+# at most THREAD_BUDGET requests -- the thread count less one kept free for
+# /health, /ready and /jobs polls -- and by default each gate runs one fewer
+# than that and queues the rest. The ASGI app runs and queues coroutines,
+# not threads, so its gates have no shared cap and are sized to the async
+# client's connection pool (AI_ASYNC_POOL_SIZE), with one more pool's worth
+# queued behind it.
+_THREADS           = int(os.getenv("GUNICORN_THREADS") or 4)
+THREAD_BUDGET      = max(_THREADS - 1, 1)
+_DEFAULT_IN_FLIGHT = max(THREAD_BUDGET - 1, 1)
+_DEFAULT_QUEUE_MAX = THREAD_BUDGET - _DEFAULT_IN_FLIGHT
+_ASYNC_IN_FLIGHT   = int(os.getenv("AI_ASYNC_POOL_SIZE") or 200)
+_ASYNC_QUEUE_MAX   = _ASYNC_IN_FLIGHT
+# Admitted requests must be able to finish inside this (gunicorn timeout is 60 s).
+_DEFAULT_DEADLINE  = 50.0
+# Weight of the newest sample in the per-gate service-time average.
+EWMA_ALPHA = 0.3
+
+
+def _setting(gate: str, key: str, default: float, prefix: str = "LOE_ADMIT") -> float:
+    raw = os.getenv(f"LOE_ADMIT_{gate.upper()}_{key}") or os.getenv(f"{prefix}_{key}")
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+class Overloaded(RuntimeError):
+    """Refused at the door; the app turns this into 429 + Retry-After."""
+
+    def __init__(self, gate: str, reason: str, retry_after: int):
+        super().__init__(f"{gate} is at capacity ({reason}); retry in {retry_after}s")
+        self.gate = gate
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _ThreadBudget:
+    """Requests (running or queued) all threaded gates of this worker hold together."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.held = 0
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.held >= self.limit:
+                return False
+            self.held += 1
+            return True
+
+    def give(self) -> None:
+        with self._lock:
+            self.held -= 1
+
+
+_BUDGET = _ThreadBudget(THREAD_BUDGET)
+
+
+class Gate:
+    """
+    Bounded admission for one endpoint: at most `max_in_flight` requests run,
+    at most `queue_max` wait, and a request whose estimated queue wait plus
+    its own run time would blow `deadline` is refused immediately instead of
+    timing out later. Waits are estimated from an EWMA of recent run times.
+    Threaded gates also share the worker's THREAD_BUDGET.
+
+    Background work (async jobs, /ingest/batch items) holds no request
+    thread: it skips the budget, queue cap and deadline and simply waits
+    for a run slot, so it counts against max_in_flight without being
+    refused. A request arriving at a free slot starts ahead of it.
+    """
+    _defaults = (_DEFAULT_IN_FLIGHT, _DEFAULT_QUEUE_MAX)
+    _env = "LOE_ADMIT"  # fallback prefix for MAX_IN_FLIGHT / QUEUE_MAX
+
+    def __init__(self, name: str, max_in_flight: int | None = None,
+                 queue_max: int | None = None, deadline: float | None = None,
+                 budget: _ThreadBudget | None = None):
+        self.name = name
+        in_flight, queued = self._defaults
+        self.max_in_flight = max(int(max_in_flight or _setting(name, "MAX_IN_FLIGHT", in_flight, self._env)), 1)
+        self.queue_max = max(int(queue_max if queue_max is not None
+                                 else _setting(name, "QUEUE_MAX", queued, self._env)), 0)
+        self.budget = budget if budget is not None else (_BUDGET if type(self) is Gate else None)
+        self.deadline = float(deadline or _setting(name, "DEADLINE", _DEFAULT_DEADLINE))
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self.in_flight = 0
+        self.waiting = 0
+        self.ewma: float | None = None
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "timeout": 0, "worker_full": 0}
+
+    # --- estimates (call with the lock held) ---
+
+    def _estimated_wait(self) -> float:
+        """Seconds until a new arrival would start: one run time per 'wave' ahead of it."""
+        if self.ewma is None or self.in_flight < self.max_in_flight:
+            return 0.0
+        return math.ceil((self.waiting + 1) / self.max_in_flight) * self.ewma
+
+    def _retry_after(self) -> int:
+        """Seconds until everything queued or running now should have drained."""
+        if self.ewma is None:
+            return 1
+        return max(math.ceil((self.waiting + self.in_flight) / self.max_in_flight * self.ewma), 1)
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.labels(self.name, reason).inc()
+        return Overloaded(self.name, reason, self._retry_after())
+
+    def _arrive(self) -> float | None:
+        """
+        Admit now (None), refuse (raises), or join the queue and return the
+        monotonic time by which a slot must free up.
+        """
+        if self.in_flight < self.max_in_flight and self.waiting == 0:
+            self._start(0.0)
+            return None
+        if self.waiting >= self.queue_max:
+            raise self._reject("queue_full")
+        run = self.ewma or 0.0
+        if self._estimated_wait() + run > self.deadline:
+            raise self._reject("deadline")
+        self.waiting += 1
+        metrics.ADMISSION_QUEUE_DEPTH.labels(self.name).inc()
+        return time.monotonic() + self.deadline - run
+
+    def _leave_queue(self) -> None:
+        self.waiting -= 1
+        metrics.ADMISSION_QUEUE_DEPTH.labels(self.name).dec()
+
+    def _start(self, waited: float) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        metrics.ADMISSION_IN_FLIGHT.labels(self.name).inc()
+        metrics.ADMISSION_WAIT_SECONDS.labels(self.name).observe(waited)
+
+    def _done(self, seconds: float) -> None:
+        self.in_flight -= 1
+        self.ewma = seconds if self.ewma is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * self.ewma
+        metrics.ADMISSION_IN_FLIGHT.labels(self.name).dec()
+
+    # --- threaded API ---
+
+    def acquire(self, background: bool = False) -> float:
+        """Block until admitted (returns the start time) or raise Overloaded."""
+        t0 = time.monotonic()
+        with self._cond:
+            if background:
+                while self.in_flight >= self.max_in_flight:
+                    self._cond.wait()
+                self._start(time.monotonic() - t0)
+                return time.monotonic()
+            if self.budget is not None and not self.budget.take():
+                raise self._reject("worker_full")
+            try:
+                give_up_at = self._arrive()
+                if give_up_at is not None:
+                    try:
+                        while self.in_flight >= self.max_in_flight:
+                            remaining = give_up_at - time.monotonic()
+                            if remaining <= 0:
+                                raise self._reject("timeout")
+                            self._cond.wait(remaining)
+                    finally:
+                        self._leave_queue()
+                    self._start(time.monotonic() - t0)
+            except BaseException:
+                if self.budget is not None:
+                    self.budget.give()
+                raise
+        return time.monotonic()
+
+    def release(self, started: float, background: bool = False) -> None:
+        with self._cond:
+            self._done(time.monotonic() - started)
+            self._cond.notify()
+        if self.budget is not None and not background:
+            self.budget.give()
+
+    @contextmanager
+    def slot(self, background: bool = False):
+        started = self.acquire(background)
+        try:
+            yield
+        finally:
+            self.release(started, background)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "queue_max": self.queue_max,
+                "deadline": self.deadline,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+                "estimated_wait_s": round(self._estimated_wait(), 1),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+            }
+
+
+class AsyncGate(Gate):
+    """Gate for the asyncio app: queued requests wait as coroutines, not threads."""
+    _defaults = (_ASYNC_IN_FLIGHT, _ASYNC_QUEUE_MAX)
+    _env = "LOE_ADMIT_ASYNC"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._freed: asyncio.Condition | None = None
+
+    async def aacquire(self) -> float:
+        if self._freed is None:
+            self._freed = asyncio.Condition()  # bound to the server's loop
+        t0 = time.monotonic()
+        async with self._freed:
+            with self._lock:
+                give_up_at = self._arrive()
+            if give_up_at is not None:
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = give_up_at - time.monotonic()
+                        if remaining <= 0:
+                            with self._lock:
+                                raise self._reject("timeout")
+                        try:
+                            await asyncio.wait_for(self._freed.wait(), remaining)
+                        except asyncio.TimeoutError:
+                            pass
+                finally:
+                    with self._lock:
+                        self._leave_queue()
+                with self._lock:
+                    self._start(time.monotonic() - t0)
+        return time.monotonic()
+
+    async def arelease(self, started: float) -> None:
+        with self._lock:
+            self._done(time.monotonic() - started)
+        async with self._freed:
+            self._freed.notify()
+
+    @asynccontextmanager
+    async def aslot(self):
+        started = await self.aacquire()
+        try:
+            yield
+        finally:
+            await self.arelease(started)
+
+
+_GATES: dict[str, Gate] = {}
+_GATES_LOCK = threading.Lock()
+
+
+def _shared(name: str, cls: type) -> Gate:
+    gate = _GATES.get(name)
+    if gate is None:
+        with _GATES_LOCK:
+            gate = _GATES.get(name)
+            if gate is None:
+                gate = _GATES[name] = cls(name)
+    return gate
+
+
+def shared_gate(name: str) -> Gate:
+    """Process-wide gate for one endpoint ("ingest", "generate")."""
+    return _shared(name, Gate)
+
+
+def shared_async_gate(name: str) -> AsyncGate:
+    return _shared(name, AsyncGate)
+
+
+def stats() -> dict:
+    return {name: gate.stats() for name, gate in list(_GATES.items())}
+
+
+@contextmanager
+def admitted(name: str, background: bool = False):
+    """`with admitted("generate"): ...` -- no-op when LOE_ADMIT=0."""
+    if not ADMIT_ENABLED:
+        yield
+        return
+    with shared_gate(name).slot(background):
+        yield
+
+
+@asynccontextmanager
+async def aadmitted(name: str):
+    if not ADMIT_ENABLED:
+        yield
+        return
+    async with shared_async_gate(name).aslot():
+        yield
+
+
+def hold(name: str):
+    """
+    Acquire a slot that outlives the view (streamed responses): returns the
+    release callable, e.g. for `resp.call_on_close`. Safe to call twice.
+    """
+    if not ADMIT_ENABLED:
+        return lambda: None
+    gate = shared_gate(name)
+    started = gate.acquire()
+    done = threading.Event()
+
+    def _release() -> None:
+        if not done.is_set():
+            done.set()
+            gate.release(started)
+    return _release
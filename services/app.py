@@ -2,39 +2,186 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-from flask import Flask, request, jsonify, make_response
+import json
+import logging
+import time
+from flask import Flask, Response, g, request, jsonify, make_response, stream_with_context
 
-from services.ingest.extract import extract_fields
-from services.generator.orchestrator import generate_outputs
+from services.ingest.extract import extract_fields, ingest_prompt_version
+from services.ingest.batch import ingest_batch, normalise_items
+from services.generator.orchestrator import generate_outputs, generate_outputs_stream, generate_prompt_version
+from services.generator.registry import get_mode
+from adapters import client_stats
+from adapters import response_cache
+from services.jobs import QueueFullError, shared_jobs
+from services.singleflight import canonical_key, coalesce, shared_singleflight
+from services.http_cache import shared_compressor
+from services import admission, http_common, log, metrics, prompt_loader, tracing, warmup
+from services.admission import Overloaded
 
 app = Flask(__name__)
+# Under gunicorn's preload_app the master imports this and forks: a log
+# writer thread (and its queue lock) must not be inherited, so workers call
+# log.configure() in post_worker_init (warmup.start) instead.
+if os.getenv("LOE_PRELOADED") != "1":
+    log.configure()
+warmup.preload()
+logger = logging.getLogger("loe.access")
 
 
 def _cors_ok():
     """Return a minimal 204 for preflight with permissive CORS headers."""
-    resp = make_response("", 204)
-    origin = request.headers.get("Origin", "*")
-    resp.headers["Access-Control-Allow-Origin"]  = origin
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-    resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    resp.headers["Vary"] = "Origin"
+    return http_common.preflight(make_response("", 204), request.headers)
+
+def _cache_bypass_requested() -> bool:
+    return http_common.cache_bypass_requested(request.headers)
+
+@app.before_request
+def _start_timer():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_t0 = time.perf_counter()
+    g.trace_token = tracing.start(f"{request.method} {g.metrics_endpoint}")
+    # correlation id: the caller's X-Request-ID if sane, else the trace id
+    g.request_id = http_common.request_id(request.headers, tracing.current().trace_id)
+    g.request_id_token = log.bind_request_id(g.request_id)
+    metrics.REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def _observe_request(resp):
+    # Streamed bodies (SSE/NDJSON) are timed to their first byte here.
+    if "metrics_t0" in g:
+        metrics.REQUEST_SECONDS.labels(g.metrics_endpoint, request.method, str(resp.status_code)).observe(
+            time.perf_counter() - g.metrics_t0)
+    trace = tracing.current()
+    if trace is not None:
+        g.status_code = resp.status_code
+        resp.headers["Server-Timing"] = trace.server_timing()
+        resp.headers["Timing-Allow-Origin"] = request.headers.get("Origin", "*")
+    if "request_id" in g:
+        resp.headers["X-Request-ID"] = g.request_id
     return resp
 
+@app.teardown_request
+def _end_request(_exc):
+    # stream_with_context runs teardown again when the body finishes; count once.
+    if g.get("request_done"):
+        return
+    g.request_done = True
+    if "metrics_endpoint" in g:
+        metrics.REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).dec()
+    if "request_id_token" in g:
+        logger.info("request", extra={
+            "method": request.method,
+            "route": g.metrics_endpoint,
+            "status": g.get("status_code", 500),
+            "ms": log.elapsed_ms(g.metrics_t0),
+        })
+        log.reset_request_id(g.request_id_token)
+    if "trace_token" in g:
+        tracing.finish(g.trace_token, **{
+            "http.method": request.method,
+            "http.route": g.metrics_endpoint,
+            "http.status_code": g.get("status_code", 500),
+        })
+
 @app.after_request
 def _add_cors(resp):
-    origin = request.headers.get("Origin")
-    if origin:
-        resp.headers["Access-Control-Allow-Origin"] = origin
-        resp.headers["Vary"] = "Origin"
+    return http_common.add_cors(resp, request.headers)
+
+@app.after_request
+def _compress(resp):
+    """gzip/br JSON bodies above LOE_COMPRESS_MIN_BYTES; streamed responses pass through."""
+    if resp.direct_passthrough or resp.is_streamed:
+        return resp
+    enc = http_common.compress_encoding(resp, request.headers)
+    return http_common.compress(resp, resp.get_data(), enc) if enc else resp
+
+def _not_modified(request_key: str):
+    """304 if the client's If-None-Match is still what we'd serve for this request."""
+    etag = http_common.not_modified_etag(request_key, request.headers)
+    if etag is None:
+        return None
+    resp = make_response("", 304)
+    resp.set_etag(etag)
     return resp
 
+def _with_etag(request_key: str, result: dict):
+    resp = jsonify(result)
+    return http_common.remember_etag(resp, request_key, result, resp.get_data())
+
 @app.get("/health")
 def health():
     return jsonify({
         "ok": True,
-        "mode": "mock" if os.getenv("USE_MOCK", "0") == "1" else "real"
+        "mode": "mock" if os.getenv("USE_MOCK", "0") == "1" else "real",
+        "ai_clients": client_stats(),
+        "jobs": shared_jobs().stats(),
+        "singleflight": shared_singleflight().stats(),
+        "compression": shared_compressor().stats(),
+        "prompts": prompt_loader.stats(),
+        "admission": admission.stats(),
     })
 
+@app.get("/ready")
+def ready():
+    """Readiness (vs /health liveness): 503 until this worker has warmed up."""
+    return jsonify(warmup.status()), 200 if warmup.is_ready() else 503
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition, merged across gunicorn workers."""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+def _wants_async() -> bool:
+    """`?async=1` or `Prefer: respond-async` -> 202 + job id instead of waiting."""
+    if (request.args.get("async") or "").lower() in {"1", "true", "yes"}:
+        return True
+    return "respond-async" in (request.headers.get("Prefer") or "").lower()
+
+def _ingest_text(text: str, loe_type: str | None) -> dict:
+    """extract_fields, coalesced with any identical ingest already in flight."""
+    def _extract():
+        schema = extract_fields(text)
+        if loe_type:
+            schema["loe_type"] = loe_type
+        schema["notes_raw"] = text
+        return schema
+    return coalesce("ingest", {"text": text, "loe_type": loe_type}, _extract)
+
+def _run_ingest(text: str, loe_type: str | None, no_cache: bool) -> dict:
+    with response_cache.bypass(no_cache):
+        return {"schema": _ingest_text(text, loe_type)}
+
+def _run_generate(schema: dict, loe_type: str | None, no_cache: bool,
+                  previous_result_id: str | None = None) -> dict:
+    with response_cache.bypass(no_cache):
+        return coalesce("generate", {"schema": schema, "loe_type": loe_type},
+                        lambda: generate_outputs(schema, loe_type, previous_result_id=previous_result_id))
+
+@app.errorhandler(Overloaded)
+def _overloaded(e: Overloaded):
+    resp = jsonify({"error": str(e), "retry_after": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+def _admit(gate: str, fn, background: bool = False):
+    """Run fn() inside the endpoint's admission gate (429 when it's full; background work waits)."""
+    with admission.admitted(gate, background):
+        return fn()
+
+def _accepted(kind: str, fn):
+    try:
+        # the job thread waits for a gate slot: its LLM calls count like sync ones
+        job = shared_jobs().submit(kind, lambda: _admit(kind, fn, background=True))
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    resp = jsonify({"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"})
+    resp.status_code = 202
+    resp.headers["Location"] = f"/jobs/{job['id']}"
+    return resp
+
 @app.route("/ingest", methods=["POST", "OPTIONS"])
 def ingest():
     if request.method == "OPTIONS":
@@ -46,11 +193,54 @@ def ingest():
     if not text:
         return jsonify({"error": "Missing 'text'"}), 400
 
-    schema = extract_fields(text)
-    if loe_type:
-        schema["loe_type"] = loe_type
-    schema["notes_raw"] = text
-    return jsonify({"schema": schema})
+    no_cache = _cache_bypass_requested()
+    if _wants_async():
+        return _accepted("ingest", lambda: _run_ingest(text, loe_type, no_cache))
+    key = canonical_key("ingest", {"text": text, "loe_type": loe_type,
+                                   "prompts": ingest_prompt_version()})
+    return _not_modified(key) or _with_etag(
+        key, _admit("ingest", lambda: _run_ingest(text, loe_type, no_cache)))
+
+def _ingest_batch_item(item: dict) -> dict:
+    if not item["text"]:
+        raise ValueError("Missing 'text'")
+    return _admit("ingest", lambda: _ingest_text(item["text"], item["loe_type"]), background=True)
+
+@app.route("/ingest/batch", methods=["POST", "OPTIONS"])
+def ingest_batch_route():
+    """
+    Body: {"items": ["email", ...] | [{"text", "loe_type"?}, ...],
+           "loe_type"?: default for every item, "concurrency"?: int}
+    Streams NDJSON, one line per item as it finishes (completion order):
+      {"index": 3, "ok": true,  "schema": {...}}
+      {"index": 0, "ok": false, "error": "..."}
+    then a final {"done": true, "count": N, "errors": E}.
+    """
+    if request.method == "OPTIONS":
+        return _cors_ok()
+
+    p = request.get_json(force=True) or {}
+    loe_type = (p.get("loe_type") or "").strip() or None
+    try:
+        items = normalise_items(p.get("items"), loe_type)
+        concurrency = int(p["concurrency"]) if p.get("concurrency") else None
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    no_cache = _cache_bypass_requested()
+
+    def _ndjson():
+        errors = 0
+        with response_cache.bypass(no_cache):
+            for rec in ingest_batch(items, concurrency, ingest=_ingest_batch_item):
+                errors += not rec["ok"]
+                yield json.dumps(rec) + "\n"
+        yield json.dumps({"done": True, "count": len(items), "errors": errors}) + "\n"
+
+    resp = Response(stream_with_context(_ndjson()), mimetype="application/x-ndjson")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 @app.route("/generate", methods=["POST", "OPTIONS"])
 def generate():
@@ -60,8 +250,72 @@ def generate():
     p = request.get_json(force=True) or {}
     schema   = p.get("schema") or {}
     loe_type = (p.get("loe_type") or schema.get("loe_type") or "").strip() or None
-    out = generate_outputs(schema, loe_type)
-    return jsonify(out)
+    # result_id of the result this edit revises: only what changed is regenerated
+    previous = p.get("previous_result_id") or None
+
+    if p.get("draft"):
+        # rendered from the schema by templates, no model call: no queue either
+        if get_mode(loe_type).render_template is None:
+            return jsonify({"error": f"No draft render for loe_type '{loe_type or 'default'}'"}), 400
+        key = canonical_key("generate", {"schema": schema, "loe_type": loe_type, "strategy": "template",
+                                         "prompts": generate_prompt_version(loe_type)})
+        return _not_modified(key) or _with_etag(key, generate_outputs(schema, loe_type, strategy="template"))
+
+    no_cache = _cache_bypass_requested()
+    if _wants_async():
+        return _accepted("generate", lambda: _run_generate(schema, loe_type, no_cache, previous))
+    key = canonical_key("generate", {"schema": schema, "loe_type": loe_type,
+                                     "prompts": generate_prompt_version(loe_type)})
+    return _not_modified(key) or _with_etag(
+        key, _admit("generate", lambda: _run_generate(schema, loe_type, no_cache, previous)))
+
+@app.get("/jobs/<job_id>")
+def job_status(job_id):
+    """
+    Poll an async job. `?wait=<seconds>` long-polls until it finishes (capped
+    by LOE_JOB_MAX_WAIT). `result` holds the same body the sync endpoint returns.
+    """
+    try:
+        wait = float(request.args.get("wait") or 0)
+    except ValueError:
+        wait = 0.0
+    job = shared_jobs().get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+@app.route("/generate/stream", methods=["POST", "OPTIONS"])
+def generate_stream():
+    """
+    Server-sent events version of /generate:
+      event: delta   data: {"field": "summary"|"tasks", "text": "..."}
+      event: result  data: {"summary": ..., "tasks": ..., "open_questions": [...]}
+      event: error   data: {"error": "..."}
+    """
+    if request.method == "OPTIONS":
+        return _cors_ok()
+
+    p = request.get_json(force=True) or {}
+    schema   = p.get("schema") or {}
+    loe_type = (p.get("loe_type") or schema.get("loe_type") or "").strip() or None
+
+    no_cache = _cache_bypass_requested()
+    release = admission.hold("generate")  # until the stream closes
+
+    def _sse():
+        try:
+            with response_cache.bypass(no_cache):
+                for ev in generate_outputs_stream(schema, loe_type):
+                    yield f"event: {ev['event']}\ndata: {json.dumps(ev['data'])}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    resp = Response(stream_with_context(_sse()), mimetype="text/event-stream")
+    resp.call_on_close(release)
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"  # let nginx flush each event
+    return resp
 
 if __name__ == "__main__":
+    warmup.start()
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5050)), debug=True)
@@ -0,0 +1,211 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import asyncio
+import logging
+import os
+import time
+from quart import Quart, Response, g, request, jsonify, make_response
+
+from services.ingest.extract import aextract_fields, ingest_prompt_version
+from services.generator.orchestrator import agenerate_outputs, generate_prompt_version
+from services.generator.registry import get_mode
+from adapters import client_stats, get_async_client
+from adapters import response_cache
+from services.singleflight import acoalesce, canonical_key, shared_singleflight
+from services.http_cache import shared_compressor
+from services import admission, http_common, log, metrics, prompt_loader, tracing, warmup
+from services.admission import Overloaded
+
+# asyncio-native twin of services/app.py serving the same /health, /ingest and
+# /generate contract. Every LLM wait is an awaiting coroutine rather than a
+# blocked thread, so one worker holds hundreds of in-flight generations.
+# Run with: uvicorn services.asgi_app:app --port 5050 (or LOE_SERVER=asgi
+# services/start.sh). The async job API, /ingest/batch and /generate/stream
+# are only served by the threaded app. Blocking work (the SQLite result and
+# singleflight stores, prompt file checks) runs in asyncio.to_thread so it
+# never stalls the loop.
+app = Quart(__name__)
+log.configure()
+warmup.preload()
+logger = logging.getLogger("loe.access")
+
+
+async def _cors_ok():
+    """Return a minimal 204 for preflight with permissive CORS headers."""
+    return http_common.preflight(await make_response("", 204), request.headers)
+
+def _cache_bypass_requested() -> bool:
+    return http_common.cache_bypass_requested(request.headers)
+
+@app.before_request
+async def _start_timer():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_t0 = time.perf_counter()
+    g.trace_token = tracing.start(f"{request.method} {g.metrics_endpoint}")
+    # correlation id: the caller's X-Request-ID if sane, else the trace id
+    g.request_id = http_common.request_id(request.headers, tracing.current().trace_id)
+    g.request_id_token = log.bind_request_id(g.request_id)
+    metrics.REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+async def _observe_request(resp):
+    if "metrics_t0" in g:
+        metrics.REQUEST_SECONDS.labels(g.metrics_endpoint, request.method, str(resp.status_code)).observe(
+            time.perf_counter() - g.metrics_t0)
+    trace = tracing.current()
+    if trace is not None:
+        g.status_code = resp.status_code
+        resp.headers["Server-Timing"] = trace.server_timing()
+        resp.headers["Timing-Allow-Origin"] = request.headers.get("Origin", "*")
+    if "request_id" in g:
+        resp.headers["X-Request-ID"] = g.request_id
+    return resp
+
+@app.teardown_request
+async def _end_request(_exc):
+    if "metrics_endpoint" in g:
+        metrics.REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).dec()
+    if "request_id_token" in g:
+        logger.info("request", extra={
+            "method": request.method,
+            "route": g.metrics_endpoint,
+            "status": g.get("status_code", 500),
+            "ms": log.elapsed_ms(g.metrics_t0),
+        })
+        log.reset_request_id(g.request_id_token)
+    if "trace_token" in g:
+        tracing.finish(g.trace_token, **{
+            "http.method": request.method,
+            "http.route": g.metrics_endpoint,
+            "http.status_code": g.get("status_code", 500),
+        })
+
+@app.after_request
+async def _add_cors(resp):
+    return http_common.add_cors(resp, request.headers)
+
+@app.after_request
+async def _compress(resp):
+    """gzip/br JSON bodies above LOE_COMPRESS_MIN_BYTES (same policy as services/app.py)."""
+    enc = http_common.compress_encoding(resp, request.headers)
+    return http_common.compress(resp, await resp.get_data(), enc) if enc else resp
+
+async def _not_modified(request_key: str):
+    etag = await asyncio.to_thread(http_common.not_modified_etag, request_key, request.headers)
+    if etag is None:
+        return None
+    resp = await make_response("", 304)
+    resp.set_etag(etag)
+    return resp
+
+async def _with_etag(request_key: str, result: dict):
+    resp = jsonify(result)
+    body = await resp.get_data()
+    return await asyncio.to_thread(http_common.remember_etag, resp, request_key, result, body)
+
+@app.before_serving
+async def _warm_up():
+    await warmup.astart()
+
+@app.after_serving
+async def _close_client():
+    client = get_async_client()
+    if hasattr(client, "aclose"):
+        await client.aclose()
+
+@app.get("/health")
+async def health():
+    return jsonify({
+        "ok": True,
+        "mode": "mock" if os.getenv("USE_MOCK", "0") == "1" else "real",
+        "server": "asgi",
+        "ai_clients": client_stats(),
+        "singleflight": shared_singleflight().stats(),
+        "compression": shared_compressor().stats(),
+        "prompts": prompt_loader.stats(),
+        "admission": admission.stats(),
+    })
+
+@app.errorhandler(Overloaded)
+async def _overloaded(e: Overloaded):
+    resp = jsonify({"error": str(e), "retry_after": e.retry_after})
+    resp.status_code = 429
+    resp.headers["Retry-After"] = str(e.retry_after)
+    return resp
+
+@app.get("/ready")
+async def ready():
+    """Readiness (vs /health liveness): 503 until this worker has warmed up."""
+    return jsonify(warmup.status()), 200 if warmup.is_ready() else 503
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route("/ingest", methods=["POST", "OPTIONS"])
+async def ingest():
+    if request.method == "OPTIONS":
+        return await _cors_ok()
+
+    p = await request.get_json(force=True) or {}
+    text = (p.get("text") or "").strip()
+    loe_type = (p.get("loe_type") or "").strip() or None
+    if not text:
+        return jsonify({"error": "Missing 'text'"}), 400
+
+    async def _extract():
+        schema = await aextract_fields(text)
+        if loe_type:
+            schema["loe_type"] = loe_type
+        schema["notes_raw"] = text
+        return schema
+
+    key = canonical_key("ingest", {"text": text, "loe_type": loe_type,
+                                   "prompts": await asyncio.to_thread(ingest_prompt_version)})
+    not_modified = await _not_modified(key)
+    if not_modified:
+        return not_modified
+    async with admission.aadmitted("ingest"):
+        with response_cache.bypass(_cache_bypass_requested()):
+            schema = await acoalesce("ingest", {"text": text, "loe_type": loe_type}, _extract)
+    return await _with_etag(key, {"schema": schema})
+
+@app.route("/generate", methods=["POST", "OPTIONS"])
+async def generate():
+    if request.method == "OPTIONS":
+        return await _cors_ok()
+
+    p = await request.get_json(force=True) or {}
+    schema   = p.get("schema") or {}
+    loe_type = (p.get("loe_type") or schema.get("loe_type") or "").strip() or None
+    # result_id of the result this edit revises: only what changed is regenerated
+    previous = p.get("previous_result_id") or None
+
+    if p.get("draft"):
+        # rendered from the schema by templates, no model call: no queue either
+        if get_mode(loe_type).render_template is None:
+            return jsonify({"error": f"No draft render for loe_type '{loe_type or 'default'}'"}), 400
+        prompts = await asyncio.to_thread(generate_prompt_version, loe_type)
+        key = canonical_key("generate", {"schema": schema, "loe_type": loe_type, "strategy": "template",
+                                         "prompts": prompts})
+        not_modified = await _not_modified(key)
+        if not_modified:
+            return not_modified
+        return await _with_etag(key, await agenerate_outputs(schema, loe_type, strategy="template"))
+
+    key = canonical_key("generate", {"schema": schema, "loe_type": loe_type,
+                                     "prompts": await asyncio.to_thread(generate_prompt_version, loe_type)})
+    not_modified = await _not_modified(key)
+    if not_modified:
+        return not_modified
+    async with admission.aadmitted("generate"):
+        with response_cache.bypass(_cache_bypass_requested()):
+            out = await acoalesce("generate", {"schema": schema, "loe_type": loe_type},
+                                  lambda: agenerate_outputs(schema, loe_type,
+                                                            previous_result_id=previous))
+    return await _with_etag(key, out)
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5050)), debug=True)
@@ -1,2 +1,4 @@
 # For now, reuse the rack_stack builder. Split later if needed.
-from services.generator.modes.rack_stack.prompt import build_prompt
+from services.generator.modes.rack_stack.prompt import (  # noqa: F401
+    SECTIONS, build_prompt, section_prompt, split_prompt,
+)
@@ -2,6 +2,7 @@
 import re
 from services.generator.shared.tables import bom_table_markdown
 from services.generator.shared.derive import primary_site_line
+from services.generator.shared.normalise import to_array
 
 # =============================================================================
 # Constants
@@ -28,6 +29,28 @@ _SITE_OVERVIEW_HEADER_RE = re.compile(
     r"(?m)^\|\s*Site\s*\|\s*Address\s*\|\s*Site Role\s*\|\s*Site Survey\s*\|\s*Installation\s*\|\s*Post-Installation\s*\|\s*Notes\s*\|\s*$"
 )
 
+# Everything the post-processors match on, compiled once at import (so a
+# preloaded gunicorn master compiles them before forking its workers).
+_EMPTY_QUOTE_RE            = re.compile(r"(?m)^\s*>\s*$")
+_TASKS_HEADER_RE           = re.compile(r"(?im)^\s*###\s*Project Tasks\s*(?:\n\s*)?")
+_TASKS_TBD_RE              = re.compile(r"(?mi)^\s*[-*]\s*Site-specific tasks TBD\.?\s*$")
+_FE_TOOLS_RE               = re.compile(r"(?i)field\s+engineer.*tools")
+_DEVICE_TOTALS_RE          = re.compile(r"\*\*Device totals:\*\*")
+_DEVICE_TOTALS_ANYCASE_RE  = re.compile(r"\*\*Device totals:\*\*", flags=re.I)
+_SUMMARY_HEADER_RE         = re.compile(r"(?im)^###\s*Project Summary\s*$")
+_BOM_HEADER_RE             = re.compile(r"(?im)^###\s*Bill of Materials\b")
+_BOM_MENTION_RE            = re.compile(r"(?i)\bBill of Materials\b")
+_PARA_BREAK_RE             = re.compile(r"\n\s*\n")
+_KEY_TASKS_LABEL_RE        = re.compile(r"(?mi)^\s*[-*]\s*Key tasks:\s*\n")
+_KEY_TASKS_BLOCK_RE        = re.compile(
+    r"(?mi)^(?P<header>\s*[-*]\s*Key tasks[^\n]*)(?P<body>(?:\n[ \t]*[-*]\s+.*)*)"
+)
+_H3_RE                     = re.compile(r"(?im)^###\s+")
+_WORK_PACKAGES_HEADER_RE   = re.compile(r"(?im)^###\s+Site Work Packages by Location\s*$")
+_SITE_HEADING_SPLIT_RE     = re.compile(r"(?m)^(####\s+📍[^\n]*\n)")
+_TRAILING_COLON_RE         = re.compile(r"[:\s]+$")
+_WS_RE                     = re.compile(r"\s+")
+
 # =============================================================================
 # Default content (system-owned phase sections)
 # =============================================================================
@@ -138,17 +161,17 @@ def _checkboxes_to_bullets(text: str) -> str:
 def _strip_orphan_blockquotes(text: str) -> str:
     if not text:
         return text or ""
-    return re.sub(r"(?m)^\s*>\s*$", "", text).strip()
+    return _EMPTY_QUOTE_RE.sub("", text).strip()
 
 def _strip_leading_project_tasks_heading(text: str) -> str:
     if not text:
         return text or ""
-    return re.sub(r"(?im)^\s*###\s*Project Tasks\s*(?:\n\s*)?", "", text, count=1).lstrip()
+    return _TASKS_HEADER_RE.sub("", text, count=1).lstrip()
 
 def _strip_site_specific_tbd(tasks: str) -> str:
     if not tasks:
         return tasks or ""
-    return re.sub(r"(?mi)^\s*[-*]\s*Site-specific tasks TBD\.?\s*$", "", tasks).strip()
+    return _TASKS_TBD_RE.sub("", tasks).strip()
 
 # =============================================================================
 # BOM handling
@@ -194,19 +217,19 @@ def _multi_site_bom_markdown(schema: dict, include_rack_unit: bool = True) -> st
 def _replace_bom_tokens(summary: str, schema: dict) -> str:
     bom_md = _multi_site_bom_markdown(schema, include_rack_unit=True)
     if not bom_md:
-        return _BOM_TOKEN_RE.sub("_(No BOM items provided)_", summary)
+        return _BOM_TOKEN_RE.sub("\n\n_(No BOM items provided)_\n\n", summary)
     return _BOM_TOKEN_RE.sub(f"\n\n{bom_md}\n\n", summary)
 
 def _ensure_field_engineer_block(summary: str) -> str:
     if not summary:
         return summary
-    if re.search(r"(?i)field\s+engineer.*tools", summary):
+    if _FE_TOOLS_RE.search(summary):
         return summary
 
     if _BOM_TOKEN_RE.search(summary):
         return _BOM_TOKEN_RE.sub(_FE_BLOCK + "\n\nBOM_TABLE", summary, count=1)
 
-    m = re.search(r"\*\*Device totals:\*\*", summary)
+    m = _DEVICE_TOTALS_RE.search(summary)
     if m:
         return summary[: m.start()].rstrip() + "\n\n" + _FE_BLOCK + "\n\n" + summary[m.start():]
 
@@ -267,13 +290,13 @@ def _inject_site_overview_table(summary: str, schema: dict) -> str:
     if not summary:
         return summary
 
-    m_summary = re.search(r"(?im)^###\s*Project Summary\s*$", summary)
+    m_summary = _SUMMARY_HEADER_RE.search(summary)
     if not m_summary:
         return summary
 
     head_end = m_summary.end()
 
-    m_bom = re.search(r"(?im)^###\s*Bill of Materials\b", summary)
+    m_bom = _BOM_HEADER_RE.search(summary)
     mid_end = m_bom.start() if m_bom else len(summary)
 
     before = summary[:head_end]
@@ -286,7 +309,7 @@ def _inject_site_overview_table(summary: str, schema: dict) -> str:
     mid_no_tables = _TABLE_BLOCK_RE.sub("", mid).strip("\n")
 
     # Split into first paragraph + rest
-    para_match = re.search(r"\n\s*\n", mid_no_tables)
+    para_match = _PARA_BREAK_RE.search(mid_no_tables)
     if para_match:
         first_para = mid_no_tables[:para_match.start()].strip()
         rest = mid_no_tables[para_match.end():].lstrip("\n")
@@ -334,16 +357,13 @@ def _dedupe_site_overview_tables(summary: str) -> str:
 def _tidy_key_tasks(summary: str) -> str:
     if not summary:
         return summary or ""
-    return re.sub(r"(?mi)^\s*[-*]\s*Key tasks:\s*\n", "", summary)
+    return _KEY_TASKS_LABEL_RE.sub("", summary)
 
 def _prune_key_tasks_block(summary: str, schema: dict) -> str:
     if not summary:
         return summary or ""
 
-    m = re.search(
-        r"(?mi)^(?P<header>\s*[-*]\s*Key tasks[^\n]*)(?P<body>(?:\n[ \t]*[-*]\s+.*)*)",
-        summary,
-    )
+    m = _KEY_TASKS_BLOCK_RE.search(summary)
     if not m:
         return summary
 
@@ -389,7 +409,7 @@ def _split_h3_sections(text: str):
     """
     if not text:
         return []
-    parts = re.split(r"(?im)^###\s+", text.strip())
+    parts = _H3_RE.split(text.strip())
     sections = []
     for p in parts:
         if not p.strip():
@@ -414,9 +434,9 @@ def _heading_key(h: str) -> str:
     if not h:
         return ""
     x = h.strip().lower()
-    x = re.sub(r"[:\s]+$", "", x)
+    x = _TRAILING_COLON_RE.sub("", x)
     x = x.replace("—", "-").replace("–", "-")
-    x = re.sub(r"\s+", " ", x)
+    x = _WS_RE.sub(" ", x)
 
     if x.startswith("site survey - activities delivered across"):
         return "site_survey"
@@ -651,19 +671,19 @@ def _ensure_site_work_packages_have_content(tasks: str, schema: dict) -> str:
     if not tasks:
         return tasks or ""
 
-    m = re.search(r"(?im)^###\s+Site Work Packages by Location\s*$", tasks)
+    m = _WORK_PACKAGES_HEADER_RE.search(tasks)
     if not m:
         return tasks
 
     start = m.end()
-    m_next = re.search(r"(?im)^###\s+", tasks[start:])
+    m_next = _H3_RE.search(tasks[start:])
     end = start + m_next.start() if m_next else len(tasks)
 
     before = tasks[:start]
     block = tasks[start:end]
     after = tasks[end:]
 
-    parts = re.split(r"(?m)^(####\s+📍[^\n]*\n)", block)
+    parts = _SITE_HEADING_SPLIT_RE.split(block)
     if len(parts) <= 1:
         return tasks
 
@@ -683,6 +703,175 @@ def _ensure_site_work_packages_have_content(tasks: str, schema: dict) -> str:
 
     return before + rebuilt + after
 
+# =============================================================================
+# Sharded generation: stitch per-shard site cards into the tasks
+# =============================================================================
+
+def _shard_cards(block: str) -> list[tuple[str, str]]:
+    """(heading line, body) for each '#### 📍' card in one shard's reply."""
+    block = _WORK_PACKAGES_HEADER_RE.sub("", block or "", count=1)
+    block = _H3_RE.split(block)[0]  # cards only: stop at any other ### section
+    parts = _SITE_HEADING_SPLIT_RE.split(block.strip() + "\n")
+    return [(parts[i].strip(), parts[i + 1].strip()) for i in range(1, len(parts) - 1, 2)]
+
+
+def _match_cards(cards: list[tuple[str, str]], sites: list, only=None) -> dict[int, tuple[str, str]]:
+    """
+    Cards matched to site indexes (all sites, or just `only`): by site name
+    first, then any cards left over in order.
+    """
+    idxs = list(range(len(sites))) if only is None else list(only)
+    # "#### 📍 {Site Name} — {Address}" -> "site name"
+    names = [h.split("📍", 1)[-1].split("—", 1)[0].strip().lower() for h, _ in cards]
+    picked: dict[int, tuple[str, str]] = {}
+    used = set()
+    for idx in idxs:
+        site = sites[idx] or {}
+        key = (site.get("name") or site.get("address") or "").strip().lower()
+        for j, name in enumerate(names):
+            if key and j not in used and name == key:
+                picked[idx] = cards[j]
+                used.add(j)
+                break
+    leftovers = iter(c for j, c in enumerate(cards) if j not in used)
+    for idx in idxs:
+        if idx not in picked:
+            card = next(leftovers, None)
+            if card is None:
+                break
+            picked[idx] = card
+    return picked
+
+
+def _shared_sections(shared_tasks: str) -> list[tuple[str, str]]:
+    # the cross-site reply shouldn't carry site cards, but drop them if it does
+    return [(h, b) for h, b in _split_h3_sections(shared_tasks or "")
+            if not _WORK_PACKAGES_HEADER_RE.match(f"### {h}")]
+
+
+def _stitch_site_cards(shared_tasks: str, site_cards, schema: dict) -> str:
+    """
+    Sharded generation writes the site cards a few sites per call and the
+    cross-site sections once. Rebuild the tasks the single call would have
+    produced: one card per schema site, in schema order, under "Site Work
+    Packages by Location", then the cross-site sections. Cards are matched
+    to sites by name (else in order); a site no shard wrote a card for gets
+    an empty one, which _ensure_site_work_packages_have_content fills.
+    """
+    if isinstance(site_cards, str):
+        site_cards = [site_cards]
+    cards = [c for block in (site_cards or []) for c in _shard_cards(block or "")]
+    sites = schema.get("sites") or []
+    matched = _match_cards(cards, sites)
+    picked = [matched.get(idx) or (f"#### 📍 {_site_label(site or {}, idx + 1)}", "")
+              for idx, site in enumerate(sites)]
+
+    blocks = ["### Site Work Packages by Location"]
+    blocks += [f"{heading}\n{body}" if body else f"{heading}\n" for heading, body in picked]
+    return "\n\n".join(blocks) + "\n\n" + _rebuild_h3_sections(_shared_sections(shared_tasks))
+
+# =============================================================================
+# Incremental regeneration: model-written parts of a reply
+# =============================================================================
+
+def task_parts(schema: dict, result: dict, only=None) -> dict:
+    """
+    The model-written pieces of a generate reply (before post_process):
+      {"summary": str, "shared_tasks": str, "site_cards": {site index: card}}
+    from either a single "tasks" reply or sharded shared_tasks/site_cards.
+    `only` limits the cards to those site indexes (a partial regeneration).
+    """
+    if "site_cards" in result or "shared_tasks" in result:
+        blocks = result.get("site_cards") or []
+        blocks = [blocks] if isinstance(blocks, str) else blocks
+        shared = result.get("shared_tasks") or ""
+    else:
+        tasks = _strip_leading_project_tasks_heading(result.get("tasks") or "")
+        m = _WORK_PACKAGES_HEADER_RE.search(tasks)
+        if m:
+            m_next = _H3_RE.search(tasks[m.end():])
+            end = m.end() + m_next.start() if m_next else len(tasks)
+            blocks, shared = [tasks[m.end():end]], tasks[:m.start()] + tasks[end:]
+        else:
+            blocks, shared = [], tasks
+    cards = [c for block in blocks for c in _shard_cards(block or "")]
+    matched = _match_cards(cards, schema.get("sites") or [], only)
+    return {
+        "summary": result.get("summary") or "",
+        "shared_tasks": _rebuild_h3_sections(_shared_sections(shared)),
+        "site_cards": {idx: f"{h}\n{b}".strip() for idx, (h, b) in matched.items()},
+    }
+
+
+def splice_sections(old: str, new: str, keys) -> str:
+    """
+    `old` cross-site sections with those whose heading key (_heading_key:
+    site_survey, installation, post_install, client_prereqs, out_of_scope)
+    is in `keys` replaced by (or, if missing, added from) `new`.
+    """
+    fresh = {_heading_key(h): (h, b) for h, b in _split_h3_sections(new)}
+    out, seen = [], set()
+    for h, b in _split_h3_sections(old):
+        k = _heading_key(h)
+        seen.add(k)
+        out.append(fresh.get(k, (h, b)) if k in keys else (h, b))
+    out += [sec for k, sec in fresh.items() if k in keys and k not in seen]
+    return _rebuild_h3_sections(out)
+
+# =============================================================================
+# Template render: the reply written from the schema alone (no model)
+# =============================================================================
+
+_TEMPLATE_PHASES = (
+    ("site_survey", "survey_in_scope", "site survey"),
+    ("installation", "install_in_scope", "installation"),
+    ("post_install", "post_in_scope", "post-installation support"),
+)
+
+def _phase_in_scope(schema: dict, tasks_key: str, flag_key: str) -> bool:
+    """In scope unless every site (and the global scope) rules the phase out."""
+    gs = (schema.get("global_scope") or {}).get(tasks_key)
+    if isinstance(gs, dict) and isinstance(gs.get("include"), bool):
+        if gs["include"]:
+            return True
+    sites = [s for s in (schema.get("sites") or []) if isinstance(s, dict)]
+    if not sites:
+        return not (isinstance(gs, dict) and gs.get("include") is False)
+    return any(_phase_cell_for_site(s, tasks_key, flag_key) != "✘" for s in sites)
+
+def render_reply(schema: dict) -> dict:
+    """
+    A generate reply built by templates only, in the sharded shape
+    post_process stitches: a summary skeleton (its tables, BOM and device
+    totals filled in by post_process), the in-scope phase sections plus
+    prerequisites / out of scope from the schema (merged into the system
+    defaults), and no site cards (so every card is backfilled from the
+    schema by _build_site_card_body).
+    """
+    phases = [(k, label) for k, flag, label in _TEMPLATE_PHASES if _phase_in_scope(schema, k, flag)]
+    n_sites = len([s for s in (schema.get("sites") or []) if isinstance(s, dict)])
+    labels = [label for _, label in phases] or ["rack & stack activities"]
+    scope = labels[0] if len(labels) == 1 else ", ".join(labels[:-1]) + f" and {labels[-1]}"
+    where = f"across {n_sites} sites, led from {{{{PRIMARY_SITE}}}}" if n_sites > 1 else "at {{PRIMARY_SITE}}"
+
+    summary = (
+        "### Project Summary\n\n"
+        f"WWT will deliver {scope} for {{{{CLIENT}}}} {where}, as defined in this Level of Effort.\n\n"
+        f"### Bill of Materials\n\n{_FE_BLOCK}\n\nBOM_TABLE\n\n{{{{DEVICE_TOTALS_SENTENCE}}}}"
+    )
+
+    sections = [(_PHASES[k]["canonical_heading"], "") for k, _ in phases]
+    for key, field in (("client_prereqs", "prerequisites"), ("out_of_scope", "out_of_scope")):
+        extra = [x for x in to_array(schema.get(field)) if x]
+        sections.append((_PHASES[key]["canonical_heading"], "\n".join(f"- {x}" for x in extra)))
+
+    return {
+        "summary": summary,
+        "shared_tasks": _rebuild_h3_sections(sections),
+        "site_cards": [],
+        "open_questions": [],
+    }
+
 # =============================================================================
 # Main
 # =============================================================================
@@ -691,6 +880,10 @@ def post_process(schema: dict, result: dict) -> dict:
     summary = (result.get("summary") or "").strip()
     tasks = (result.get("tasks") or "").strip()
 
+    # Sharded generation: cards + cross-site sections arrive separately
+    if "site_cards" in result or "shared_tasks" in result:
+        tasks = _stitch_site_cards(result.pop("shared_tasks", ""), result.pop("site_cards", []), schema)
+
     # Placeholders
     client = (schema.get("client") or "(Client)").strip()
     site = primary_site_line(schema) or "(TBD)"
@@ -707,7 +900,7 @@ def post_process(schema: dict, result: dict) -> dict:
         summary = _replace_bom_tokens(summary, schema)
     else:
         bom_md = _multi_site_bom_markdown(schema, include_rack_unit=True)
-        if bom_md and not re.search(r"(?i)\bBill of Materials\b", summary):
+        if bom_md and not _BOM_MENTION_RE.search(summary):
             summary += f"\n\n### Bill of Materials by Site\n\n{bom_md}\n\n"
 
     counts = (schema.get("counts") or {})
@@ -718,7 +911,7 @@ def post_process(schema: dict, result: dict) -> dict:
     )
     if "{{DEVICE_TOTALS_SENTENCE}}" in summary:
         summary = summary.replace("{{DEVICE_TOTALS_SENTENCE}}", device_totals)
-    elif not re.search(r"\*\*Device totals:\*\*", summary, flags=re.I):
+    elif not _DEVICE_TOTALS_ANYCASE_RE.search(summary):
         summary += f"\n\n{device_totals}"
 
     # Summary: prune key tasks + cleanup
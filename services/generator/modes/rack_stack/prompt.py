@@ -1,8 +1,36 @@
-from textwrap import dedent
-from services.prompt_loader import load_prompt_file
+import os
+
+from services.prompt_loader import load_template
 from services.generator.shared.text import bullet_block
 from services.generator.shared.derive import sum_bom_qty, derive_mounting_qty_from_notes
 
+PROMPT_DIR = "services/generator/modes/rack_stack"
+
+# The user prompt is four blocks; only context.txt depends on the schema.
+# Legacy layout: intro, context, example (with golden.md), contract.
+# Prefix layout (split_prompt): the static blocks go into the system
+# message ahead of everything volatile, so requests share a long,
+# byte-identical prefix that provider-side prompt caches can reuse.
+_STATIC_BLOCKS = (
+    ("intro.txt", None),
+    ("example.txt", {"golden": "golden.md"}),
+    ("contract.txt", None),
+)
+
+# Parallel-sections strategy: one completion per section, each with its
+# own slice of the contract in place of contract.txt, and its output cap.
+SECTIONS = {"summary": 1200, "tasks": 2400}
+
+# Sharded strategy (large rollouts): from SHARD_MIN_SITES sites the site
+# cards are written SITES_PER_SHARD at a time, each shard with an output
+# cap sized to its sites, and the cross-site task sections once.
+SHARD_MIN_SITES = int(os.getenv("LOE_SHARD_MIN_SITES") or 8)
+SITES_PER_SHARD = int(os.getenv("LOE_SITES_PER_SHARD") or 5)
+SITE_CARD_TOKENS = 300
+SHARED_TASKS_TOKENS = 1600
+
+_static_memo: dict[str, tuple[tuple, str]] = {}
+
 
 def _primary_site(schema: dict) -> str:
     for s in (schema.get("sites") or []):
@@ -17,9 +45,24 @@ def _primary_site(schema: dict) -> str:
     return "(TBD)"
 
 
-def build_prompt(schema: dict) -> str:
-    golden = load_prompt_file("services/generator/modes/rack_stack", "golden.md") or ""
+def _static_templates(contract: str = "contract.txt") -> tuple:
+    return tuple(
+        load_template(PROMPT_DIR, contract if f == "contract.txt" else f, include=inc, strip=True)
+        for f, inc in _STATIC_BLOCKS
+    )
 
+
+def static_prompt(section: str | None = None) -> str:
+    """intro + example + contract (or a section's slice), joined once per file version (byte-stable)."""
+    contract = f"contract_{section}.txt" if section else "contract.txt"
+    templates = _static_templates(contract)
+    memo = _static_memo.get(contract)
+    if memo is None or memo[0] != templates:
+        memo = _static_memo[contract] = (templates, "\n\n".join(t.render() for t in templates))
+    return memo[1]
+
+
+def _context(schema: dict) -> str:
     counts = schema.get("counts") or {}
     device_totals_line = (
         f"**Device totals:** {counts.get('aps_ordered') or 'TBD'} APs ordered — "
@@ -53,65 +96,68 @@ def build_prompt(schema: dict) -> str:
 
     sites_block = bullet_block(site_lines) if site_lines else "- (no sites provided)"
 
-    return dedent(f"""
-    You are a project engineer writing a precise, professional, client-facing Level of Effort (LOE) for a Rack & Stack engagement.
-
-    IMPORTANT – BOM HANDLING
-    - When you see the token {{BOM_TABLE}} in the GOLDEN EXAMPLE, keep it exactly as-is in your output.
-    - Do NOT modify, expand, or remove {{BOM_TABLE}}.
-    - The backend will replace this token with the final Bill of Materials table.
-
-    Use the structured context below and the GOLDEN EXAMPLE as a reference for tone and layout, but you MUST follow the OUTPUT CONTRACT and FORMAT RULES from the system prompt.
-
-    ## Structured context
-    Client: {schema.get('client','') or '(Client)'}
-    Primary site: {_primary_site(schema)}
-    Device totals line to use verbatim:
-    {device_totals_line}
-    Total ordered devices (from BOM): {total_ordered if total_ordered else 'TBD'}
-    Approximate mounting quantity (APs): {mounting_qty}
-
-    Sites and phases:
-    {sites_block}
-
-    Client prerequisites (hints):
-    {bullet_block(prereqs) or '- (none provided)'}
-
-    Out of scope (hints):
-    {bullet_block(exclusions) or '- (none provided)'}
-
-    ## GOLDEN EXAMPLE (style and structure reference ONLY — do NOT copy content verbatim)
-    {golden}
-
-    ## OUTPUT CONTRACT
-    - Return JSON ONLY with keys:
-        "summary" (string) and "tasks" (string).
-    - Do NOT include any extra keys.
-    - Do NOT include any text before or after the JSON.
-    - Do NOT wrap the JSON in code fences.
-
-    You MUST:
-    - Produce exactly ONE concise project summary paragraph in "summary" (do not duplicate or restate it).
-    - In "summary":
-        - Follow the SUMMARY SECTION RULES from the system prompt.
-        - Include a Site Overview table covering ALL sites in the schema.
-        - Include the required device totals sentence exactly as given above.
-    - In "tasks":
-        - Begin with the heading: "### Site Work Packages by Location".
-        - Under it, create one site card per site using headings of the form:
-            "#### 📍 {{Site Name}} — {{Address}}"
-          and list only site-specific tasks under each.
-        - After the site cards, include the following sections in this order:
-            "### Site Survey — Activities Delivered Across Applicable Sites"
-            "### Installation — Activities Delivered Across Applicable Sites"
-            "### Post-Installation — Activities Delivered Across Applicable Sites"
-            "### Client Prerequisites"
-            "### Out of Scope"
-        - Always include "### Client Prerequisites" and "### Out of Scope", even if you only write "- (none provided)".
-
-    You MUST NOT:
-    - Use the word "Generic" in any heading or content.
-    - Reproduce the GOLDEN EXAMPLE text word-for-word.
-    - Invent sites, devices, quantities, or phases that are not supported by the schema.
-    - Create additional top-level sections beyond those described above.
-    """).strip()
+    return load_template(PROMPT_DIR, "context.txt", strip=True).render(
+        client=schema.get("client", "") or "(Client)",
+        primary_site=_primary_site(schema),
+        device_totals_line=device_totals_line,
+        total_ordered=total_ordered if total_ordered else "TBD",
+        mounting_qty=mounting_qty,
+        sites_block=sites_block,
+        prerequisites=bullet_block(prereqs) or "- (none provided)",
+        out_of_scope=bullet_block(exclusions) or "- (none provided)",
+    )
+
+
+def build_prompt(schema: dict) -> str:
+    """
+    Legacy layout: the whole user prompt, schema context ahead of the
+    golden example. Templates are parsed once per file version by the
+    prompt cache, so a request only computes the slot values and joins.
+    """
+    intro, example, contract = _static_templates()
+    return "\n\n".join((intro.render(), _context(schema), example.render(), contract.render()))
+
+
+def split_prompt(schema: dict) -> tuple[str, str]:
+    """Prefix layout: (static block for the system message, volatile user prompt)."""
+    return static_prompt(), _context(schema)
+
+
+def section_prompt(schema: dict, section: str) -> tuple[str, str]:
+    """split_prompt for one section of the parallel-sections strategy."""
+    return static_prompt(section), _context(schema)
+
+
+def _card_calls(schema: dict, sites: list) -> list[tuple[str, dict, int]]:
+    size = max(1, SITES_PER_SHARD)
+    return [
+        ("site_cards", dict(schema, sites=sites[i:i + size]), 200 + SITE_CARD_TOKENS * len(sites[i:i + size]))
+        for i in range(0, len(sites), size)
+    ]
+
+
+def plan_shards(schema: dict) -> list[tuple[str, dict, int]]:
+    """
+    Calls for the sharded strategy as (section, schema for its prompt,
+    max_tokens). Below SHARD_MIN_SITES it's just SECTIONS. Shards keep the
+    schema's order of sites; post.py stitches their cards back together.
+    """
+    sites = schema.get("sites") or []
+    if len(sites) < SHARD_MIN_SITES:
+        return [(section, schema, n) for section, n in SECTIONS.items()]
+    return [("summary", schema, SECTIONS["summary"]),
+            ("shared_tasks", schema, SHARED_TASKS_TOKENS)] + _card_calls(schema, sites)
+
+
+def plan_revision(schema: dict, changes: dict) -> list[tuple[str, dict, int]]:
+    """
+    Calls that regenerate only what an edit touched (see revise.diff):
+    the summary, the cross-site sections, and the cards of changes["sites"].
+    """
+    plan = []
+    if changes["summary"]:
+        plan.append(("summary", schema, SECTIONS["summary"]))
+    if changes["phases"]:
+        plan.append(("shared_tasks", schema, SHARED_TASKS_TOKENS))
+    sites = schema.get("sites") or []
+    return plan + _card_calls(schema, [sites[i] for i in changes["sites"]])
@@ -0,0 +1,146 @@
+# services/generator/modes/rack_stack/revise.py
+"""
+Incremental regeneration for rack_stack: what an edited schema changes in
+the LoE, and how the reused and regenerated pieces fit back together.
+
+A generate's model-written output is kept as parts (post.task_parts): the
+summary, the cross-site task sections, and one card per site keyed by
+site_key(). Everything post_process derives from the schema alone -- BOM
+and site overview tables, device totals, phase defaults -- is re-rendered
+locally from the new schema, so it never needs the model.
+"""
+from __future__ import annotations
+
+import json
+
+from services.generator.modes.rack_stack import post
+from services.generator.modes.rack_stack.prompt import plan_revision as plan  # noqa: F401
+from services.generator.shared.normalise import normalize_schema, site_key, to_number
+
+# Raw per-site scope flags (what the prompt's site list reads) -> phase.
+_PHASE_FLAGS = {"survey_in_scope": "site_survey", "install_in_scope": "installation",
+                "post_in_scope": "post_install"}
+# normalised site.tasks / global_scope keys -> the cross-site section they feed
+_PHASE_TASKS = {"site_survey": "site_survey", "installation": "installation",
+                "optics_installation": "installation", "rack_and_stack": "installation",
+                "post_install": "post_install"}
+# Schema fields only the site cards / cross-site sections read.
+_NOT_SUMMARY = ("sites", "prerequisites", "out_of_scope", "loe_type")
+
+
+def _canon(x) -> str:
+    return json.dumps(x, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def site_keys(schema: dict) -> list[str]:
+    """site_key() of each site, in order; repeats get a "#n" suffix."""
+    seen: dict[str, int] = {}
+    out = []
+    for site in schema.get("sites") or []:
+        key = site_key(site or {})
+        seen[key] = seen.get(key, 0) + 1
+        out.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+    return out
+
+
+def _phase_sites(schema: dict, keys: list[str]) -> dict[str, set]:
+    """phase -> site keys that include it, from the raw flags and the task includes."""
+    out: dict[str, set] = {p: set() for p in set(_PHASE_TASKS.values())}
+    for key, site in zip(keys, schema.get("sites") or []):
+        site = site or {}
+        tasks = site.get("tasks") if isinstance(site.get("tasks"), dict) else {}
+        for flag, phase in _PHASE_FLAGS.items():
+            if site.get(flag):
+                out[phase].add(key)
+        for task, phase in _PHASE_TASKS.items():
+            t = tasks.get(task)
+            if t is True or (isinstance(t, dict) and t.get("include")):
+                out[phase].add(key)
+    return out
+
+
+def _summary_inputs(norm: dict) -> str:
+    """Everything the summary is written from; the totals it states included."""
+    inputs = {k: v for k, v in norm.items() if k not in _NOT_SUMMARY}
+    inputs["site_count"] = len(norm.get("sites") or [])
+    inputs["site_devices"] = sum(
+        to_number(row.get("qty")) or 0
+        for site in norm.get("sites") or [] for row in (site.get("bom") or []) if isinstance(row, dict)
+    )
+    return _canon(inputs)
+
+
+def diff(old: dict, new: dict) -> dict:
+    """
+    What changed between the schema a result was generated from and the
+    re-posted one:
+      {"summary": bool,            totals/scope the summary states changed
+       "phases": [section keys],   cross-site sections to rewrite
+       "sites": [site indexes],    cards to regenerate (new or edited sites)
+       "reuse": {index: key}}      cards to take from the previous result
+    """
+    old_norm, new_norm = normalize_schema(old), normalize_schema(new)
+    old_keys, new_keys = site_keys(old), site_keys(new)
+    old_sites = dict(zip(old_keys, old.get("sites") or []))
+
+    sites, reuse = [], {}
+    for idx, (key, site) in enumerate(zip(new_keys, new.get("sites") or [])):
+        if key in old_sites and _canon(old_sites[key]) == _canon(site):
+            reuse[idx] = key
+        else:
+            sites.append(idx)
+
+    old_phases, new_phases = _phase_sites(old, old_keys), _phase_sites(new, new_keys)
+    phases = {p for p in new_phases if old_phases.get(p) != new_phases[p]}
+    for scope, phase in _PHASE_TASKS.items():
+        old_inc = (old_norm["global_scope"].get(scope) or {}).get("include")
+        new_inc = (new_norm["global_scope"].get(scope) or {}).get("include")
+        if old_inc != new_inc:
+            phases.add(phase)
+    if old_norm.get("prerequisites") != new_norm.get("prerequisites"):
+        phases.add("client_prereqs")
+    if old_norm.get("out_of_scope") != new_norm.get("out_of_scope"):
+        phases.add("out_of_scope")
+
+    return {
+        "summary": _summary_inputs(old_norm) != _summary_inputs(new_norm),
+        "phases": sorted(phases),
+        "sites": sites,
+        "reuse": reuse,
+    }
+
+
+def parts(schema: dict, data: dict, only=None) -> dict:
+    """post.task_parts with the cards keyed by site_key (what a revision record stores)."""
+    out = post.task_parts(schema, data, only)
+    keys = site_keys(schema)
+    out["site_cards"] = {keys[idx]: card for idx, card in out["site_cards"].items()}
+    return out
+
+
+def merge(previous: dict, fresh: dict, changes: dict, schema: dict) -> dict:
+    """The parts of the revised LoE: regenerated where `changes` says, else reused."""
+    keys = site_keys(schema)
+    cards = {}
+    for idx, key in enumerate(keys):
+        if idx in changes["reuse"]:
+            card = previous["site_cards"].get(changes["reuse"][idx])
+        else:
+            card = fresh["site_cards"].get(key)
+        if card:
+            cards[key] = card
+    return {
+        "summary": fresh["summary"] if changes["summary"] else previous["summary"],
+        "shared_tasks": (post.splice_sections(previous["shared_tasks"], fresh["shared_tasks"], changes["phases"])
+                         if changes["phases"] else previous["shared_tasks"]),
+        "site_cards": cards,
+    }
+
+
+def assemble(parts: dict, schema: dict) -> dict:
+    """Parts back into the sharded reply shape post_process stitches."""
+    return {
+        "summary": parts["summary"],
+        "shared_tasks": parts["shared_tasks"],
+        "site_cards": [parts["site_cards"][k] for k in site_keys(schema) if k in parts["site_cards"]],
+    }
@@ -1,26 +1,74 @@
 # services/generator/orchestrator.py
 from __future__ import annotations
-import os, json, re
-from services.prompt_loader import load_prompt_file
+import os
+import asyncio
+import contextvars
+import logging
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+from services.prompt_loader import load_prompt_file, prompt_version
 from services.generator.registry import get_mode
+from services.generator import revisions
 
-from adapters import AIClient
-print(f"[generator] Using AIClient")
+from services.generator.streaming import PartialFieldReader
+from services.metrics import observe_degraded, stage
+from services import log
 
+from adapters import get_async_client, get_client
+from adapters.ai_client import clean_json_text
+from adapters.json_extract import coerce_json_object
+from adapters.resilience import AIHTTPError, CircuitOpenError, is_retryable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_DIR = "services/generator/modes/default"
+
+# "prefix": system prompt + every static prompt block first, the schema
+# context last, so upstream prefix/KV caches can reuse the shared part.
+# "legacy": the mode's build_prompt() as-is (context before the examples).
+PROMPT_LAYOUT = (os.getenv("LOE_PROMPT_LAYOUT") or "prefix").strip().lower()
+
+# Output cap for a single-call generate (every section in one reply).
+MAX_TOKENS = 3000
+# Threads shared by every request for the calls of the "sections" and
+# "sharded" strategies, and how many of them one generate may have in
+# flight at once.
+SECTION_WORKERS     = int(os.getenv("LOE_SECTION_WORKERS") or 16)
+SECTION_CONCURRENCY = int(os.getenv("LOE_SECTION_CONCURRENCY") or 6)
+# When the upstream is down or over budget (circuit open, unreachable,
+# 429/5xx after retries), serve the mode's template render instead of an
+# error, for modes that have one.
+DEGRADED_FALLBACK = os.getenv("LOE_DEGRADED_FALLBACK", "1").lower() in {"1", "true", "yes"}
+
+_section_executor: ThreadPoolExecutor | None = None
+_section_lock = threading.Lock()
+
+
+class _Call(NamedTuple):
+    """One completion of a generate: `section` is None for the single-call strategy."""
+    section: str | None
+    system: str
+    prompt: str
+    max_tokens: int
+
+
+class _Revision(NamedTuple):
+    """A generate that revises an earlier result (previous_result_id)."""
+    result_id: str   # the earlier result's result_id
+    previous: dict   # its revisions record
+    changes: dict    # mode.revise.diff(previous schema, new schema)
+
+
+def generate_prompt_version(loe_type: str | None) -> str:
+    """Fingerprint of the prompt files a generate call reads (for result cache keys)."""
+    return prompt_version(get_mode(loe_type).prompt_dir, DEFAULT_PROMPT_DIR)
 
 def _coerce_json(text: str) -> dict:
-    if isinstance(text, dict):
-        return text
-    try:
-        return json.loads(str(text))
-    except Exception:
-        pass
-    m = re.search(r"\{.*\}", str(text), flags=re.S)
-    if m:
-        try:
-            return json.loads(m.group(0))
-        except Exception:
-            pass
+    obj = coerce_json_object(text)
+    if obj is not None:
+        return obj
     # With json_mode=True this should basically never happen:
     return {"summary": "", "tasks": "", "open_questions": ["Non-JSON response from model"]}
 
@@ -39,34 +87,206 @@ def _ensure_heading(text: str, heading: str) -> str:
     return f"{md}\n\n{stripped}"
 
 
-def generate_outputs(schema: dict, loe_type: str | None = None) -> dict:
+def _section_pool() -> ThreadPoolExecutor:
+    global _section_executor
+    if _section_executor is None:
+        with _section_lock:
+            if _section_executor is None:
+                _section_executor = ThreadPoolExecutor(max_workers=SECTION_WORKERS,
+                                                       thread_name_prefix="loe-section")
+    return _section_executor
+
+
+def _prepare(schema: dict, loe_type: str | None, strategy: str | None = None,
+             previous_result_id: str | None = None):
+    """
+    Resolve mode + prompts for a generate call -> (schema, mode, [_Call, ...], _Revision | None).
+    The calls are None for the "template" strategy: no prompts, no model.
+    """
     schema = dict(schema or {})
     # stamp loe_type if provided separately
     if loe_type and not schema.get("loe_type"):
         schema["loe_type"] = loe_type
 
     mode = get_mode(schema.get("loe_type"))
+    if (strategy or mode.strategy) == "template":
+        if mode.render_template is None:
+            raise ValueError(f"'{mode.key}' LoEs can't be rendered without the model")
+        return schema, mode, None, None
 
     # load system prompt from mode dir, fallback to default
-    system = (
-        load_prompt_file(mode.prompt_dir, "system.txt")
-        or load_prompt_file("services/generator/modes/default", "system.txt")
-        or "Return JSON only."
-    )
-    # build the user prompt via the mode
-    user_prompt = mode.build_prompt(schema)
-
-    client = AIClient()
+    with stage("generate", "prompt_load", mode.key):
+        system = (
+            load_prompt_file(mode.prompt_dir, "system.txt")
+            or load_prompt_file(DEFAULT_PROMPT_DIR, "system.txt")
+            or "Return JSON only."
+        )
+    revision = _revision(mode, schema, previous_result_id)
+    # build the user prompt(s) via the mode
+    with stage("generate", "prompt_build", mode.key):
+        calls = _plan_calls(mode, schema, system, strategy, revision)
+    return schema, mode, calls, revision
+
+
+def _revision(mode, schema: dict, previous_result_id: str | None) -> _Revision | None:
+    """
+    Diff against the result being revised. None (regenerate in full) if the
+    mode can't revise, the result expired, or it came from another mode or
+    other prompt files.
+    """
+    if not previous_result_id or mode.revise is None:
+        return None
+    try:
+        record = revisions.load(previous_result_id)
+    except sqlite3.Error:
+        logger.warning("revision %s: store unavailable", previous_result_id, exc_info=True)
+        return None
+    if record is None:
+        logger.info("revision %s: unknown or expired; generating in full", previous_result_id)
+        return None
+    if record.get("mode") != mode.key or record.get("prompts") != generate_prompt_version(mode.key):
+        logger.info("revision %s: other mode or prompt files; generating in full", previous_result_id)
+        return None
+    with stage("generate", "diff", mode.key):
+        return _Revision(previous_result_id, record, mode.revise.diff(record["schema"], schema))
+
+
+def assemble_prompt(mode, schema: dict, system: str, layout: str | None = None) -> tuple[str, str]:
+    """(system, user) messages for `mode` in the given (default: configured) layout."""
+    if (layout or PROMPT_LAYOUT) == "prefix" and mode.split_prompt is not None:
+        static, user_prompt = mode.split_prompt(schema)
+        return f"{system}\n\n{static}", user_prompt
+    return system, mode.build_prompt(schema)
+
+
+def _plan_calls(mode, schema: dict, system: str, strategy: str | None = None,
+                revision: _Revision | None = None) -> list[_Call]:
+    """
+    The completions a generate makes. The "sections" and "sharded"
+    strategies (and revisions, which only regenerate what changed) always
+    use the prefix layout: each section's static prompt (with its slice of
+    the contract) goes in the system message, the (shard's) schema context
+    last.
+    """
+    strategy = strategy or mode.strategy
+    parts = None
+    if revision is not None:
+        return [_Call(section, f"{system}\n\n{static}", user_prompt, max_tokens)
+                for section, part_schema, max_tokens in mode.revise.plan(schema, revision.changes)
+                for static, user_prompt in [mode.section_prompt(part_schema, section)]]
+    if mode.section_prompt is not None:
+        if strategy == "sharded" and mode.plan_shards is not None:
+            parts = mode.plan_shards(schema)
+        elif strategy in ("sections", "sharded") and mode.sections:
+            parts = [(section, schema, n) for section, n in mode.sections.items()]
+    if parts:
+        calls = []
+        for section, part_schema, max_tokens in parts:
+            static, user_prompt = mode.section_prompt(part_schema, section)
+            calls.append(_Call(section, f"{system}\n\n{static}", user_prompt, max_tokens))
+        return calls
+    system, user_prompt = assemble_prompt(mode, schema, system)
+    return [_Call(None, system, user_prompt, MAX_TOKENS)]
+
+
+def _complete(client, call: _Call, mode) -> str:
     # Single JSON-enforced call (the client already handles param compatibility & repair)
-    raw = client.complete(
-        user_prompt,
-        system=system,
-        json_mode=True,
-        max_tokens=3000,
-    )
+    with stage("generate", f"llm_{call.section}" if call.section else "llm", mode.key):
+        return client.complete(call.prompt, system=call.system, json_mode=True,
+                               max_tokens=call.max_tokens)
+
+
+def _complete_all(client, calls: list[_Call], mode) -> list[str]:
+    """
+    Replies to `calls`, in order, from the shared section pool with at most
+    SECTION_CONCURRENCY of this generate's calls in flight. After a failure
+    nothing new is started, and the first error is raised.
+    """
+    pool = _section_pool()
+    limit = max(1, min(SECTION_CONCURRENCY, len(calls)))
+    raws: list = [None] * len(calls)
+    todo = iter(range(len(calls)))
+    pending: dict = {}
+    error: BaseException | None = None
+    while True:
+        while error is None and len(pending) < limit:
+            i = next(todo, None)
+            if i is None:
+                break
+            pending[pool.submit(contextvars.copy_context().run, _complete, client, calls[i], mode)] = i
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            i = pending.pop(f)
+            if f.exception() is None:
+                raws[i] = f.result()
+            elif error is None:
+                error = f.exception()
+    if error is not None:
+        raise error
+    return raws
+
+
+async def _acomplete(client, call: _Call, mode) -> str:
+    with stage("generate", f"llm_{call.section}" if call.section else "llm", mode.key):
+        return await client.acomplete(call.prompt, system=call.system, json_mode=True,
+                                      max_tokens=call.max_tokens)
+
 
-    data = _coerce_json(raw)
+def _merge(calls: list[_Call], raws: list[str], mode) -> dict:
+    """Parse the reply of each call into one {"summary", "tasks", ...} dict."""
+    if len(calls) == 1 and calls[0].section is None:
+        log.payload(logger, "generate raw LLM output", raws[0] if isinstance(raws[0], str) else "",
+                    mode=mode.key)
+        return _coerce_json(raws[0])
+    data: dict = {}
+    questions: list = []
+    for call, raw in zip(calls, raws):
+        log.payload(logger, "generate raw LLM output", raw if isinstance(raw, str) else "",
+                    mode=mode.key, section=call.section)
+        part = _coerce_json(raw)
+        data.setdefault(call.section, []).append(part.get(call.section, ""))
+        q = part.get("open_questions")
+        if q:
+            questions.extend(q if isinstance(q, list) else [q])
+    # one call per section -> its text; a sharded section -> the shards' texts
+    data = {k: v[0] if len(v) == 1 else v for k, v in data.items()}
+    if questions:
+        data["open_questions"] = questions
+    return data
 
+
+def _keep_revision(schema: dict, mode, data: dict, revision: _Revision | None) -> tuple[dict, str | None]:
+    """
+    Store this result's model-written parts so a later edit can revise it
+    (-> result id, None if the store write failed: the result itself is
+    fine). For a revision, `data` only holds what was regenerated: merge in
+    the reused parts first and return the whole reply.
+    """
+    only = revision.changes["sites"] if revision is not None else None
+    parts = mode.revise.parts(schema, data, only)
+    questions = data.get("open_questions")
+    if revision is not None:
+        parts = mode.revise.merge(revision.previous["parts"], parts, revision.changes, schema)
+        questions = questions or revision.previous.get("open_questions")
+        data = dict(mode.revise.assemble(parts, schema), open_questions=questions)
+    try:
+        result_id = revisions.save({
+            "mode": mode.key,
+            "prompts": generate_prompt_version(mode.key),
+            "schema": schema,
+            "parts": parts,
+            "open_questions": questions,
+        })
+    except (sqlite3.Error, TypeError, ValueError):
+        logger.warning("could not keep revision record; result has no result_id", exc_info=True)
+        result_id = None
+    return data, result_id
+
+
+def _shape(schema: dict, mode, data: dict, sections) -> dict:
+    """Heading normalisation + mode post-processing of a (merged) reply."""
     # normalize headings the UI expects (as Markdown sections)
     data["summary"] = _ensure_heading(data.get("summary", ""), "Project Summary")
     data["tasks"]   = _ensure_heading(data.get("tasks",   ""), "Project Tasks")
@@ -79,5 +299,185 @@ def generate_outputs(schema: dict, loe_type: str | None = None) -> dict:
         "tasks": data.get("tasks", ""),
         "open_questions": data.get("open_questions", []),
     }
-    result = mode.post_process(schema, result) if callable(mode.post_process) else result
+    # other sections (e.g. sharded site cards) are for post_process to stitch in
+    for section in sections:
+        if section not in result:
+            result[section] = data.get(section, "")
+    if callable(mode.post_process):
+        with stage("generate", "post_process", mode.key):
+            result = mode.post_process(schema, result)
+    return result
+
+
+def _finish(schema: dict, mode, calls: list[_Call], raws: list[str],
+            revision: _Revision | None = None, previous_result_id: str | None = None) -> dict:
+    """Parse the model reply(ies) and apply heading normalisation + mode post-processing."""
+    with stage("generate", "coerce", mode.key):
+        data = _merge(calls, raws, mode)
+    result_id = None
+    if mode.revise is not None:
+        with stage("generate", "revision", mode.key):
+            data, result_id = _keep_revision(schema, mode, data, revision)
+
+    sections = list(data) if revision is not None else [call.section for call in calls if call.section]
+    result = _shape(schema, mode, data, sections)
+    if result_id is not None:
+        result["result_id"] = result_id
+    if revision is not None:
+        changes = revision.changes
+        result["revision"] = {
+            "previous_result_id": revision.result_id,
+            "full_generate": False,
+            "llm_calls": len(calls),
+            "summary": "regenerated" if changes["summary"] else "reused",
+            "sections_regenerated": changes["phases"],
+            "sites_regenerated": len(changes["sites"]),
+            "sites_reused": len(changes["reuse"]),
+        }
+    elif previous_result_id and mode.revise is not None:
+        # asked to revise, but that result is gone (expired, another worker's
+        # memory store) or from other prompts: say it was a full generate
+        result["revision"] = {
+            "previous_result_id": previous_result_id,
+            "full_generate": True,
+            "llm_calls": len(calls),
+        }
     return result
+
+
+def _render_template(schema: dict, mode, degraded: str | None = None) -> dict:
+    """
+    The LoE from the mode's templates alone: the "template" strategy, or
+    (with `degraded` = why) the stand-in for a failed model call. Not kept
+    for revisions: nothing in it was written by the model.
+    """
+    with stage("generate", "template", mode.key):
+        data = mode.render_template(schema)
+        result = _shape(schema, mode, data, [k for k in data if k not in ("summary", "tasks")])
+    result["source"] = "template"
+    if degraded:
+        result["degraded"] = degraded
+    return result
+
+
+def _degraded_reason(mode, e: BaseException) -> str | None:
+    """Why `e` should be answered with the template render, or None to raise it."""
+    if not DEGRADED_FALLBACK or mode.render_template is None:
+        return None
+    if isinstance(e, CircuitOpenError):
+        reason = "circuit_open"
+    elif isinstance(e, AIHTTPError) and is_retryable(e):
+        reason = "rate_limited" if e.status_code == 429 else "upstream_error"
+    elif is_retryable(e):
+        reason = "unreachable"
+    else:
+        return None
+    logger.warning("generate degraded to template render (%s): %s", reason, e)
+    observe_degraded(mode.key, reason)
+    return reason
+
+
+def generate_outputs(schema: dict, loe_type: str | None = None, strategy: str | None = None,
+                     previous_result_id: str | None = None) -> dict:
+    """
+    `strategy` overrides the mode's ("single" | "sections" | "sharded" |
+    "template"). "template" renders the LoE from the schema with no model
+    call (modes with render_template) -- also what a generate falls back
+    to, marked "degraded", when the upstream is down or over budget.
+    With "sections" the summary and tasks are separate, smaller completions
+    running concurrently, so the wait is the longest section rather than
+    their sum; "sharded" also splits the site cards across calls, so a
+    large rollout neither truncates nor takes longer per site.
+
+    With `previous_result_id` (the result_id of an earlier result, for
+    modes that can revise) only the parts the schema edit affects are
+    regenerated; the rest is reused and the tables re-rendered locally.
+    """
+    schema, mode, calls, revision = _prepare(schema, loe_type, strategy, previous_result_id)
+    if calls is None:
+        return _render_template(schema, mode)
+
+    client = get_client()
+    try:
+        if len(calls) == 1:
+            raws = [_complete(client, calls[0], mode)]
+        elif calls:
+            with stage("generate", "llm", mode.key):
+                raws = _complete_all(client, calls, mode)
+        else:
+            raws = []
+    except Exception as e:
+        reason = _degraded_reason(mode, e)
+        if reason is None:
+            raise
+        return _render_template(schema, mode, degraded=reason)
+    return _finish(schema, mode, calls, raws, revision, previous_result_id)
+
+
+async def agenerate_outputs(schema: dict, loe_type: str | None = None, strategy: str | None = None,
+                            previous_result_id: str | None = None) -> dict:
+    """
+    generate_outputs for the asyncio app: the LLM wait doesn't hold a thread.
+    Prompt file checks and the revision store are blocking, so _prepare and
+    _finish run in asyncio.to_thread.
+    """
+    schema, mode, calls, revision = await asyncio.to_thread(_prepare, schema, loe_type, strategy,
+                                                            previous_result_id)
+    if calls is None:
+        return _render_template(schema, mode)
+    client = get_async_client()
+    limit = asyncio.Semaphore(max(1, SECTION_CONCURRENCY))
+
+    async def bounded(call: _Call) -> str:
+        async with limit:
+            return await _acomplete(client, call, mode)
+
+    try:
+        if len(calls) == 1:
+            raws = [await _acomplete(client, calls[0], mode)]
+        elif not calls:
+            raws = []
+        else:
+            with stage("generate", "llm", mode.key):
+                raws = list(await asyncio.gather(*(bounded(call) for call in calls)))
+    except Exception as e:
+        reason = _degraded_reason(mode, e)
+        if reason is None:
+            raise
+        return _render_template(schema, mode, degraded=reason)
+    return await asyncio.to_thread(_finish, schema, mode, calls, raws, revision, previous_result_id)
+
+
+def generate_outputs_stream(schema: dict, loe_type: str | None = None):
+    """
+    Streaming variant of generate_outputs. Yields events as dicts:
+      {"event": "delta",  "data": {"field": "summary"|"tasks", "text": str}}
+      {"event": "result", "data": <same shape as generate_outputs()>}
+
+    Deltas are the raw model text for each section as it arrives; the final
+    "result" event carries the post-processed output the UI should keep.
+    Always one streamed call: its deltas already arrive section by section.
+    If the upstream fails, the "result" is the degraded template render.
+    """
+    schema, mode, calls, _ = _prepare(schema, loe_type, strategy="single")
+    call = calls[0]
+
+    client = get_client()
+    reader = PartialFieldReader(("summary", "tasks"))
+    parts = []
+    try:
+        with stage("generate", "llm_stream", mode.key):
+            for chunk in client.stream(call.prompt, system=call.system, max_tokens=call.max_tokens):
+                parts.append(chunk)
+                for field, text in reader.feed(chunk):
+                    yield {"event": "delta", "data": {"field": field, "text": text}}
+    except Exception as e:
+        reason = _degraded_reason(mode, e)
+        if reason is None:
+            raise
+        yield {"event": "result", "data": _render_template(schema, mode, degraded=reason)}
+        return
+
+    with stage("generate", "json_repair", mode.key):
+        raw = clean_json_text("".join(parts))
+    yield {"event": "result", "data": _finish(schema, mode, calls, [raw])}
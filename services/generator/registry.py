@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from types import ModuleType
 from typing import Callable
 
-from services.generator.modes.rack_stack import prompt as rs_prompt, post as rs_post
+from services.generator.modes.rack_stack import prompt as rs_prompt, post as rs_post, revise as rs_revise
 from services.generator.modes.default    import prompt as df_prompt, post as df_post
 
 @dataclass
@@ -10,6 +11,29 @@ class Mode:
     prompt_dir: str
     build_prompt: Callable[[dict], str]
     post_process: Callable[[dict, dict], dict]
+    # (static, volatile) split of the prompt for the prefix-cache layout;
+    # None = the mode only has build_prompt (always the legacy layout).
+    split_prompt: Callable[[dict], tuple[str, str]] | None = None
+    # How generate calls the model. "single": one JSON completion carrying
+    # every section. "sections": one concurrent completion per key of
+    # `sections` ({section: max_tokens}), prompted by section_prompt(schema,
+    # section) -> (static, volatile), merged before post_process.
+    strategy: str = "single"
+    sections: dict[str, int] = field(default_factory=dict)
+    section_prompt: Callable[[dict, str], tuple[str, str]] | None = None
+    # "sharded": like "sections", but plan_shards(schema) lists the calls
+    # as (section, schema for the prompt, max_tokens), so one section can
+    # be split across several calls (e.g. site cards, a few sites each).
+    # A section split over several calls reaches post_process as a list.
+    plan_shards: Callable[[dict], list[tuple[str, dict, int]]] | None = None
+    # Incremental regeneration (generate with previous_result_id): a module
+    # with diff / plan / parts / merge / assemble, see rack_stack/revise.py.
+    # None = every generate is a full one.
+    revise: ModuleType | None = None
+    # The whole reply written from the schema by templates (no model call):
+    # strategy "template" (a draft), and the degraded output when the
+    # upstream is down or over budget. None = the mode needs the model.
+    render_template: Callable[[dict], dict] | None = None
 
 MODES = {
     "rack_stack": Mode(
@@ -17,12 +41,24 @@ MODES = {
         "services/generator/modes/rack_stack",
         rs_prompt.build_prompt,
         rs_post.post_process,
+        rs_prompt.split_prompt,
+        strategy="sharded",
+        sections=rs_prompt.SECTIONS,
+        section_prompt=rs_prompt.section_prompt,
+        plan_shards=rs_prompt.plan_shards,
+        revise=rs_revise,
+        render_template=rs_post.render_reply,
     ),
     "default": Mode(
         "default",
         "services/generator/modes/default",
         df_prompt.build_prompt,
         df_post.post_process,
+        df_prompt.split_prompt,
+        sections=df_prompt.SECTIONS,
+        section_prompt=df_prompt.section_prompt,
+        # no plan_shards: default's post_process doesn't stitch site cards,
+        # so "sharded" runs as "sections" here
     ),
 }
 
@@ -0,0 +1,28 @@
+# services/generator/revisions.py
+from __future__ import annotations
+
+import os
+import uuid
+
+from services.store import TTLStore, shared_store
+
+# How long a result can be revised from (POST /generate previous_result_id).
+REVISION_TTL = float(os.getenv("LOE_REVISION_TTL") or 86400)
+
+_NS = "revision"
+
+
+def save(record: dict, store: TTLStore | None = None) -> str:
+    """
+    Keep what a generate produced -- the schema, the mode and prompt version,
+    and the model-written parts -- under a new result id.
+    """
+    result_id = uuid.uuid4().hex
+    (store or shared_store()).put(_NS, result_id, record, REVISION_TTL)
+    return result_id
+
+
+def load(result_id: str | None, store: TTLStore | None = None) -> dict | None:
+    if not result_id or not isinstance(result_id, str):
+        return None
+    return (store or shared_store()).get(_NS, result_id.strip())
@@ -1,5 +1,12 @@
 import re
 
+_X_QTY_RE        = re.compile(r"\bx\s*(\d+)\b", flags=re.I)
+_NUMBER_RE       = re.compile(r"\b(\d+)\b")
+_MOUNTING_QTY_RE = re.compile(r"(require\s+mount(?:ing)?|to\s+be\s+mounted)\D+(\d{2,5})", flags=re.I)
+_PHASE_START_RE  = re.compile(r"(?im)^(?:core\s*&\s*user|phase\s*\d+)\b")
+_PARA_BREAK_RE   = re.compile(r"\n\s*\n")
+_WS_RE           = re.compile(r"\s+")
+
 def _qty_from_row(r) -> int:
     """Return an integer qty from either a dict row or a string row."""
     try:
@@ -7,7 +14,7 @@ def _qty_from_row(r) -> int:
             return int(r.get("qty") or 0)
         # string (or other): try patterns like "x6" or any trailing/standalone number
         s = str(r)
-        m = re.search(r"\bx\s*(\d+)\b", s, flags=re.I) or re.search(r"\b(\d+)\b", s)
+        m = _X_QTY_RE.search(s) or _NUMBER_RE.search(s)
         return int(m.group(1)) if m else 0
     except Exception:
         return 0
@@ -37,7 +44,7 @@ def derive_mounting_qty_from_notes(notes: str) -> int | None:
     """Extract quantities from phrases like 'require mounting 12'."""
     if not notes:
         return None
-    m = re.search(r"(require\s+mount(?:ing)?|to\s+be\s+mounted)\D+(\d{2,5})", notes, flags=re.I)
+    m = _MOUNTING_QTY_RE.search(notes)
     if m:
         try:
             return int(m.group(2))
@@ -50,13 +57,13 @@ def extract_phase_block(notes: str) -> str:
     """Extracts a section starting with 'Core & User' or 'Phase #' from notes."""
     if not notes:
         return ""
-    start = re.search(r"(?im)^(?:core\s*&\s*user|phase\s*\d+)\b", notes)
+    start = _PHASE_START_RE.search(notes)
     if not start:
         return ""
     tail = notes[start.start():]
-    m = re.search(r"\n\s*\n", tail)
+    m = _PARA_BREAK_RE.search(tail)
     chunk = tail[: m.start()] if m else tail
-    lines = [re.sub(r"\s+", " ", ln).strip() for ln in chunk.splitlines() if ln.strip()]
+    lines = [_WS_RE.sub(" ", ln).strip() for ln in chunk.splitlines() if ln.strip()]
     return "\n".join(lines)
 
 
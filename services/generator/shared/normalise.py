@@ -1,7 +1,11 @@
 # services/generator/shared/normalise.py
-import json, re
+import re
+
+from adapters.json_extract import coerce_json_object
 
 _SPLIT = re.compile(r"[\r\n,;]+")
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_X_QTY_RE = re.compile(r"\bx\s*(\d+)\b", flags=re.I)
 
 def to_array(x):
     if x is None:
@@ -43,62 +47,20 @@ def stringify_mapping(m):
         return "; ".join(parts)
     return trim(m)
 
-# Regex to grab the biggest JSON-looking block
-_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
-
-
 def coerce_json(text):
     """
     Try *really hard* to turn an LLM response into a Python dict.
 
-    Handles:
+    Handles (via the shared single-pass extractor in adapters/json_extract.py):
       - Plain JSON
       - JSON wrapped in ```json ... ``` fences
       - Extra prose before/after the JSON
+      - Raw newlines/tabs inside string values
     Returns:
       - dict on success
       - None on failure
     """
-    # Already parsed?
-    if isinstance(text, dict):
-        return text
-
-    if text is None:
-        return None
-
-    s = str(text).strip()
-    if not s:
-        return None
-
-    # 1) Strip code fences like ```json ... ```
-    # Leading fence
-    if s.startswith("```"):
-        # remove the first line (``` or ```json)
-        s = re.sub(r"^```[a-zA-Z0-9_-]*\s*", "", s, count=1, flags=re.MULTILINE)
-        # remove a trailing ``` if present
-        s = re.sub(r"```$", "", s.strip(), count=1, flags=re.MULTILINE).strip()
-
-    # 2) First attempt: parse as-is
-    try:
-        obj = json.loads(s)
-        if isinstance(obj, dict):
-            return obj
-    except Exception:
-        pass
-
-    # 3) Fallback: extract the largest {...} block and try that
-    m = _JSON_OBJECT_RE.search(s)
-    if m:
-        candidate = m.group(0)
-        try:
-            obj = json.loads(candidate)
-            if isinstance(obj, dict):
-                return obj
-        except Exception:
-            pass
-
-    # 4) Give up
-    return None
+    return coerce_json_object(text)
 
 
 def _sum_devices_from_sites(s: dict) -> int | None:
@@ -265,9 +227,13 @@ def _coerce_site(s):
     # ensure stable site_id
     if not out["site_id"]:
         base = out["name"] or out["address"] or out["country"] or "site"
-        out["site_id"] = re.sub(r"[^a-z0-9]+","-", base.lower()).strip("-")
+        out["site_id"] = _SLUG_RE.sub("-", base.lower()).strip("-")
     return out
 
+def site_key(s) -> str:
+    """Stable id of a raw or normalised site: its site_id, else a slug of its name/address."""
+    return _coerce_site(s)["site_id"]
+
 # ---------- NEW: global_scope coercer ---------------------------------------
 
 def _coerce_global_scope(gs) -> dict:
@@ -352,10 +318,10 @@ def _merge_devices_into_bom(bom: list, devices) -> list:
             qty = to_number(x.get("qty")) or 0
         else:
             s = trim(x)
-            m = re.search(r"\bx\s*(\d+)\b", s, flags=re.I)
+            m = _X_QTY_RE.search(s)
             if m:
                 qty = int(m.group(1))
-                typ = trim(re.sub(r"\bx\s*\d+\b", "", s, flags=re.I))
+                typ = trim(_X_QTY_RE.sub("", s))
             else:
                 typ = s
         if typ or qty:
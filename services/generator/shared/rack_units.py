@@ -3,7 +3,8 @@
 import json
 import re
 from pathlib import Path
-from typing import Any, Dict, List
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping
 
 # ---------------------------------------------------------------------------
 # Paths / lookup
@@ -12,6 +13,9 @@ from typing import Any, Dict, List
 BASE_DIR = Path(__file__).resolve().parent
 LOOKUP_PATH = BASE_DIR / "rack_units.json"
 
+_WS_RE     = re.compile(r"\s+")
+_VENDOR_RE = re.compile(r"(?i)^(Cisco|Juniper|Dell|Arista|HP|HPE)\s+")
+
 
 def _canon_model(raw: str) -> str:
     """
@@ -25,9 +29,9 @@ def _canon_model(raw: str) -> str:
     """
     s = (raw or "").strip()
     # normalise whitespace
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", s)
     # strip leading common vendor names
-    s = re.sub(r"(?i)^(Cisco|Juniper|Dell|Arista|HP|HPE)\s+", "", s)
+    s = _VENDOR_RE.sub("", s)
     return s.upper()
 
 
@@ -65,7 +69,9 @@ def _load_lookup() -> Dict[str, int]:
     return lookup
 
 
-RACK_UNITS_LOOKUP: Dict[str, int] = _load_lookup()
+# Loaded once at import and read-only from then on: under a preloaded gunicorn
+# master every worker shares the same (copy-on-write) pages.
+RACK_UNITS_LOOKUP: Mapping[str, int] = MappingProxyType(_load_lookup())
 
 # Optional type-based defaults if we don't know the specific model
 TYPE_DEFAULTS: Dict[str, int] = {
@@ -1,13 +1,20 @@
 import re
 
+_VENDOR_RE        = re.compile(r"^(Juniper|Cisco)\s+", flags=re.I)
+_EXTERNAL_AP_RE   = re.compile(r"External\s*APs?-?\s*", flags=re.I)
+_AP_MODEL_RE      = re.compile(r"\bAP\s+(\d+[A-Z]?)\b", flags=re.I)
+_WS_RE            = re.compile(r"\s+")
+_MIST_EDGE_RE     = re.compile(r"(?i)(mist\s*edge(\s*me10)?|me10)")
+_ANTENNA_PATCH_RE = re.compile(r"(?i)476RPTP|antenna\s*patch\s*wifi")
+
 def _canon_label(s: str) -> str:
     s = (s or "").strip()
-    s = re.sub(r"^(Juniper|Cisco)\s+", "", s, flags=re.I)
-    s = re.sub(r"External\s*APs?-?\s*", "", s, flags=re.I)
-    s = re.sub(r"\bAP\s+(\d+[A-Z]?)\b", r"AP\1", s, flags=re.I)
-    s = re.sub(r"\s+", " ", s).strip()
-    if re.fullmatch(r"(?i)(mist\s*edge(\s*me10)?|me10)", s): return "Mist Edge ME10"
-    if re.search(r"(?i)476RPTP|antenna\s*patch\s*wifi", s):  return "ATS-01106"
+    s = _VENDOR_RE.sub("", s)
+    s = _EXTERNAL_AP_RE.sub("", s)
+    s = _AP_MODEL_RE.sub(r"AP\1", s)
+    s = _WS_RE.sub(" ", s).strip()
+    if _MIST_EDGE_RE.fullmatch(s): return "Mist Edge ME10"
+    if _ANTENNA_PATCH_RE.search(s):  return "ATS-01106"
     return s
 
 def bom_table_markdown(schema: dict, include_rack_unit: bool = False) -> str:
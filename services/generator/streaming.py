@@ -0,0 +1,91 @@
+# services/generator/streaming.py
+from __future__ import annotations
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class PartialFieldReader:
+    """
+    Incrementally decode the string values of selected top-level keys while a
+    JSON object is still streaming in, e.g. '{"summary": "### Proj' yields
+    ("summary", "### Proj") before the closing quote has arrived.
+
+    Only keys on the outermost object are tracked; anything before the first
+    '{' (prose, code fences) is ignored.
+    """
+
+    def __init__(self, fields=("summary", "tasks")):
+        self.fields = set(fields)
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._uni: str | None = None  # pending \\uXXXX hex digits
+        self._expect_key = False
+        self._is_key = False
+        self._key_buf: list[str] = []
+        self._last_key = ""
+        self._capture: str | None = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        """Consume `chunk`; return (field, decoded_text) deltas in order."""
+        out: list[tuple[str, str]] = []
+        buf: list[str] = []
+
+        def emit(ch: str) -> None:
+            if self._capture:
+                buf.append(ch)
+            elif self._is_key:
+                self._key_buf.append(ch)
+
+        for ch in chunk or "":
+            if self._in_str:
+                if self._uni is not None:
+                    self._uni += ch
+                    if len(self._uni) == 4:
+                        try:
+                            emit(chr(int(self._uni, 16)))
+                        except ValueError:
+                            pass
+                        self._uni = None
+                elif self._esc:
+                    self._esc = False
+                    if ch == "u":
+                        self._uni = ""
+                    else:
+                        emit(_ESCAPES.get(ch, ch))
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._capture:
+                        if buf:
+                            out.append((self._capture, "".join(buf)))
+                            buf = []
+                        self._capture = None
+                    elif self._is_key:
+                        self._last_key = "".join(self._key_buf)
+                        self._is_key = False
+                else:
+                    emit(ch)
+                continue
+
+            if ch == '"' and self._depth >= 1:
+                self._in_str = True
+                if self._depth == 1 and self._expect_key:
+                    self._is_key, self._key_buf = True, []
+                elif self._depth == 1 and self._last_key in self.fields:
+                    self._capture = self._last_key
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+            elif ch in "}]":
+                self._depth = max(self._depth - 1, 0)
+            elif self._depth == 1 and ch == ",":
+                self._expect_key, self._last_key = True, ""
+            elif self._depth == 1 and ch == ":":
+                self._expect_key = False
+
+        if self._capture and buf:
+            out.append((self._capture, "".join(buf)))
+        return out
@@ -1,4 +1,46 @@
+import os
+import shutil
+import tempfile
+
 bind = "0.0.0.0:5050"
 workers = 2
-threads = 4
+# AI client connection pool is sized from the same env var (adapters/http_pool.py)
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
 timeout = 60
+
+# /metrics: each worker writes its samples here and the scrape merges them
+# (services/metrics.py). Must be set before the workers import the app; an
+# empty value (e.g. from an env_file) counts as unset.
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = (os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+                                          or os.path.join(tempfile.gettempdir(), "loe-prometheus"))
+
+
+def on_starting(server):
+    # stale files from a previous run would be merged into the new counters
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+# Import the app (prompts, rack_units.json, compiled regexes -- see
+# services/warmup.py) once in the master; workers inherit it copy-on-write.
+preload_app = True
+# ...so the app must not start threads at import (services/app.py): the log
+# writer is started per worker in post_worker_init instead.
+os.environ["LOE_PRELOADED"] = "1"
+
+
+def pre_fork(server, worker):
+    from services.warmup import freeze
+    freeze()
+
+
+def post_worker_init(worker):
+    # per-worker: log writer thread, gateway connections, then /ready
+    from services.warmup import start
+    start()
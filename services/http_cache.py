@@ -0,0 +1,170 @@
+# services/http_cache.py
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+from services import metrics
+from services.store import TTLStore, shared_store
+
+try:  # optional; gzip is always available
+    import brotli
+except ImportError:
+    brotli = None
+
+# How long a served result stays revalidatable (If-None-Match -> 304).
+RESULT_TTL        = float(os.getenv("LOE_RESULT_TTL") or 86400)
+COMPRESS_MIN_BYTES = int(os.getenv("LOE_COMPRESS_MIN_BYTES") or 1024)
+GZIP_LEVEL        = int(os.getenv("LOE_GZIP_LEVEL") or 6)
+BROTLI_QUALITY    = int(os.getenv("LOE_BROTLI_QUALITY") or 5)
+
+_NS_ETAG = "etag"  # canonical request key -> etag of the last body served
+
+
+# --- conditional responses -------------------------------------------------
+
+ENCODED_SUFFIXES = ("-gzip", "-br")
+
+
+def _matching_tag(if_none_match: str | None, etag: str) -> str | None:
+    """The client's tag that matches `etag` (possibly an encoded variant), or None."""
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return etag
+    for raw in if_none_match.split(","):
+        tag = raw.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        base = tag
+        # compressed representations carry "<etag>-<encoding>"
+        for suffix in ENCODED_SUFFIXES:
+            if base.endswith(suffix):
+                base = base[: -len(suffix)]
+                break
+        if base == etag:
+            return tag
+    return None
+
+
+class ResultStore:
+    """
+    Remember the representation served for each canonical request so a
+    re-POST of the same body with `If-None-Match` can be answered with 304.
+
+    The ETag is strong: request key prefix + digest of the exact body, so a
+    regenerated (different) result under the same request gets a new tag.
+    """
+
+    def __init__(self, store: TTLStore | None = None, ttl: float = RESULT_TTL):
+        self.store = store or shared_store()
+        self.ttl = ttl
+
+    def not_modified(self, request_key: str, if_none_match: str | None) -> str | None:
+        """
+        The ETag to echo in a 304 if the client's copy is still the one we'd
+        serve (the client's own tag, so an encoded variant round-trips).
+        """
+        if not if_none_match:
+            return None
+        etag = self.store.get(_NS_ETAG, request_key)
+        return _matching_tag(if_none_match, etag) if etag else None
+
+    def remember(self, request_key: str, body: bytes) -> str:
+        """Tag `body` and keep only request key -> tag; the body itself isn't stored."""
+        etag = f"{request_key[:16]}-{hashlib.sha256(body).hexdigest()[:32]}"
+        self.store.put(_NS_ETAG, request_key, etag, self.ttl)
+        return etag
+
+
+# --- compression -----------------------------------------------------------
+
+def _parse_accept_encoding(header: str | None) -> dict[str, float]:
+    out: dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[name] = q
+    return out
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str | None:
+    """'br' (if brotli is installed) or 'gzip' per the client's q-values, else None."""
+    prefs = _parse_accept_encoding(accept_encoding)
+    star = prefs.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for enc in candidates:
+        q = prefs.get(enc, star)
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+class Compressor:
+    """Compress response bodies and keep the cost visible in stats/metrics."""
+
+    def __init__(self, min_bytes: int = COMPRESS_MIN_BYTES):
+        self.min_bytes = min_bytes
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        t0 = time.perf_counter()
+        if encoding == "br":
+            out = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            out = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        elapsed = time.perf_counter() - t0
+        metrics.observe_compression(encoding, len(body), len(out), elapsed)
+        with self._lock:
+            s = self._stats.setdefault(encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0})
+            s["responses"] += 1
+            s["bytes_in"] += len(body)
+            s["bytes_out"] += len(out)
+            s["seconds"] += elapsed
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for enc, s in self._stats.items():
+                out[enc] = dict(s, seconds=round(s["seconds"], 4),
+                                ratio=round(s["bytes_out"] / s["bytes_in"], 3) if s["bytes_in"] else None)
+            return {"min_bytes": self.min_bytes, "brotli": brotli is not None, "by_encoding": out}
+
+
+_RESULTS: ResultStore | None = None
+_COMPRESSOR: Compressor | None = None
+_LOCK = threading.Lock()
+
+
+def shared_results() -> ResultStore:
+    global _RESULTS
+    if _RESULTS is None:
+        with _LOCK:
+            if _RESULTS is None:
+                _RESULTS = ResultStore()
+    return _RESULTS
+
+
+def shared_compressor() -> Compressor:
+    global _COMPRESSOR
+    if _COMPRESSOR is None:
+        with _LOCK:
+            if _COMPRESSOR is None:
+                _COMPRESSOR = Compressor()
+    return _COMPRESSOR
@@ -0,0 +1,85 @@
+# services/http_common.py
+from __future__ import annotations
+
+import re
+
+from services.http_cache import negotiate_encoding, shared_compressor, shared_results
+
+# HTTP policy shared by the Flask app (services/app.py) and its Quart twin
+# (services/asgi_app.py). Both response classes are werkzeug-based, so these
+# take the request headers and response objects directly; only the calls
+# Quart awaits (make_response, get_data) stay in the apps. The ETag helpers
+# touch the SQLite result store: the asyncio app runs them in a thread.
+
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+CORS_ALLOW_HEADERS = ("Content-Type, Authorization, X-LoE-Cache, X-Request-ID, Cache-Control, "
+                      "Prefer, If-None-Match")
+CORS_EXPOSE_HEADERS = "ETag, Retry-After, Server-Timing, X-Request-ID"
+
+
+def request_id(headers, fallback: str) -> str:
+    """The caller's X-Request-ID if sane, else `fallback` (the trace id)."""
+    rid = headers.get("X-Request-ID") or ""
+    return rid if REQUEST_ID_RE.match(rid) else fallback
+
+
+def preflight(resp, headers):
+    """Fill a 204 preflight response with permissive CORS headers."""
+    resp.headers["Access-Control-Allow-Origin"]  = headers.get("Origin", "*")
+    resp.headers["Access-Control-Allow-Headers"] = CORS_ALLOW_HEADERS
+    resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    resp.headers["Vary"] = "Origin"
+    return resp
+
+
+def add_cors(resp, headers):
+    origin = headers.get("Origin")
+    if origin:
+        resp.headers["Access-Control-Allow-Origin"] = origin
+        resp.headers["Access-Control-Expose-Headers"] = CORS_EXPOSE_HEADERS
+        resp.vary.add("Origin")
+    return resp
+
+
+def cache_bypass_requested(headers) -> bool:
+    """`X-LoE-Cache: bypass` or `Cache-Control: no-cache` forces a fresh LLM call."""
+    if (headers.get("X-LoE-Cache") or "").strip().lower() == "bypass":
+        return True
+    return "no-cache" in (headers.get("Cache-Control") or "").lower()
+
+
+def compress_encoding(resp, headers) -> str | None:
+    """gzip/br for JSON bodies above LOE_COMPRESS_MIN_BYTES, else None."""
+    if (resp.status_code < 200 or resp.status_code in (204, 304)
+            or "Content-Encoding" in resp.headers or resp.mimetype != "application/json"):
+        return None
+    resp.vary.add("Accept-Encoding")
+    enc = negotiate_encoding(headers.get("Accept-Encoding"))
+    if enc is None or (resp.content_length or 0) < shared_compressor().min_bytes:
+        return None
+    return enc
+
+
+def compress(resp, body: bytes, enc: str):
+    resp.set_data(shared_compressor().compress(body, enc))
+    resp.headers["Content-Encoding"] = enc
+    etag, weak = resp.get_etag()
+    if etag:
+        resp.set_etag(f"{etag}-{enc}", weak=weak)
+    return resp
+
+
+def not_modified_etag(request_key: str, headers) -> str | None:
+    """The ETag to 304 with if the client's If-None-Match is still current."""
+    if (headers.get("X-LoE-Cache") or "").strip().lower() == "bypass":
+        return None
+    return shared_results().not_modified(request_key, headers.get("If-None-Match"))
+
+
+def remember_etag(resp, request_key: str, result: dict, body: bytes):
+    """Tag `resp` with its ETag and remember it for later 304s."""
+    if result.get("degraded"):  # a stand-in: the next request should try the model again
+        return resp
+    resp.set_etag(shared_results().remember(request_key, body))
+    return resp
@@ -0,0 +1,76 @@
+# services/ingest/batch.py
+from __future__ import annotations
+
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator
+
+from services.ingest.extract import extract_fields
+
+# Per-batch fan-out; a request can ask for less (or more, up to the max).
+BATCH_CONCURRENCY     = int(os.getenv("LOE_BATCH_CONCURRENCY") or 4)
+BATCH_MAX_CONCURRENCY = int(os.getenv("LOE_BATCH_MAX_CONCURRENCY") or 8)
+BATCH_MAX_ITEMS       = int(os.getenv("LOE_BATCH_MAX_ITEMS") or 100)
+
+
+def normalise_items(raw, default_loe_type: str | None = None) -> list[dict]:
+    """
+    Accept ["email text", ...] or [{"text": ..., "loe_type"?: ...}, ...].
+    Raises ValueError for a missing/oversized list; empty texts are kept so
+    they report a per-item error at the right index.
+    """
+    if not isinstance(raw, list) or not raw:
+        raise ValueError("Missing 'items' (a non-empty list)")
+    if len(raw) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many items ({len(raw)} > {BATCH_MAX_ITEMS})")
+    out = []
+    for it in raw:
+        if isinstance(it, dict):
+            text = it.get("text")
+            loe_type = (it.get("loe_type") or "").strip() or default_loe_type
+        else:
+            text, loe_type = it, default_loe_type
+        out.append({"text": (text or "").strip() if isinstance(text, str) else "", "loe_type": loe_type})
+    return out
+
+
+def _ingest_one(item: dict) -> dict:
+    if not item["text"]:
+        raise ValueError("Missing 'text'")
+    schema = extract_fields(item["text"])
+    if item["loe_type"]:
+        schema["loe_type"] = item["loe_type"]
+    schema["notes_raw"] = item["text"]
+    return schema
+
+
+def ingest_batch(items: list[dict], concurrency: int | None = None,
+                 ingest: Callable[[dict], dict] = _ingest_one) -> Iterator[dict]:
+    """
+    Run `ingest` over `items` on a bounded pool and yield one record per item
+    as soon as it finishes (completion order, tagged with its `index`):
+      {"index": i, "ok": True,  "schema": {...}}
+      {"index": i, "ok": False, "error": "..."}
+    A failing item never affects the others. If the consumer stops early
+    (client disconnect), queued items are cancelled.
+    """
+    n = max(1, min(int(concurrency or BATCH_CONCURRENCY), BATCH_MAX_CONCURRENCY, len(items)))
+    pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="loe-batch")
+    try:
+        futures = {
+            pool.submit(contextvars.copy_context().run, ingest, it): i
+            for i, it in enumerate(items)
+        }
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                i = futures[f]
+                err = f.exception()
+                if err is None:
+                    yield {"index": i, "ok": True, "schema": f.result()}
+                else:
+                    yield {"index": i, "ok": False, "error": str(err)}
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,20 +1,22 @@
 # services/ingest/extract.py
-import json, re, os
-from services.prompt_loader import load_prompt_file
+import asyncio
+import logging
+from services.prompt_loader import load_prompt_file, load_template, prompt_version
 from services.generator.shared.rack_units import enrich_schema_rack_units
 
 
-# Import classes only (choose at runtime)
-from adapters.mock_client import AIClient as MockAIClient
-from adapters.ai_client  import AIClient as RealAIClient
+from adapters import get_async_client, get_client
+from services.metrics import stage
+from services import log
 
 from services.generator.shared.normalise import normalize_schema, coerce_json as _coerce_llm_json
 
+logger = logging.getLogger(__name__)
+
 
 def _get_client():
-    """Decide mock vs real at call time based on USE_MOCK env."""
-    use_mock = os.getenv("USE_MOCK", "0") == "1"
-    return MockAIClient() if use_mock else RealAIClient()
+    """Shared process-wide client; mock vs real is decided from USE_MOCK env."""
+    return get_client()
 
 
 def _empty_schema(notes_raw: str = "") -> dict:
@@ -79,54 +81,85 @@ def _coerce_json_or_empty(text: str) -> dict:
     """
     obj = _coerce_llm_json(text)
 
-    print("[DEBUG] coerce_json type:", type(obj))
-
     if isinstance(obj, dict):
-        print("[DEBUG] coerce_json keys:", list(obj.keys()))
         return obj
 
-    print("[DEBUG] coerce_json failed, falling back to _empty_schema")
+    logger.warning("ingest reply was not a JSON object; using an empty schema",
+                   extra={"reply_chars": len(text or "")})
     return _empty_schema()
 
 
 
-def extract_fields(email_text: str) -> dict:
-    email_text = (email_text or "").strip()
-    if len(email_text) < 10:
-        return _empty_schema(notes_raw=email_text)
+INGEST_PROMPT_DIR = "services/ingest/prompts"
 
-    system  = load_prompt_file("services/ingest/prompts", "system.txt")
-    content = load_prompt_file("services/ingest/prompts", "content.txt").replace("{{EMAIL_TEXT}}", email_text)
 
-    client = _get_client()
-    raw = client.complete(
-        content,
-        system=system,
-        json_mode=False,
-        max_tokens=6000,
-    )
-
-    # TEMP: debug
-    print("=== RAW LLM OUTPUT (first 1000 chars) ===")
-    print(raw[:1000])
-    print("=== END RAW ===")
-
-    data = _coerce_json_or_empty(raw)
-
-    # 🔍 DEBUG: see what the LLM JSON actually contains **before** normalize_schema
-    try:
-        print("[DEBUG] pre-normalize client:", data.get("client"))
-        print("[DEBUG] pre-normalize sites len:", len(data.get("sites") or []))
-        if (data.get("sites") or []):
-            print("[DEBUG] pre-normalize first site keys:",
-                list((data.get("sites") or [{}])[0].keys()))
-    except Exception as e:
-        print("[DEBUG] pre-normalize debug failed:", e)
+def ingest_prompt_version() -> str:
+    """Fingerprint of the ingest prompt files (for result cache keys)."""
+    return prompt_version(INGEST_PROMPT_DIR)
+
+
+def _ingest_prompts(email_text: str) -> tuple[str, str]:
+    with stage("ingest", "prompt_load"):
+        system  = load_prompt_file(INGEST_PROMPT_DIR, "system.txt")
+        content = load_template(INGEST_PROMPT_DIR, "content.txt").render(EMAIL_TEXT=email_text)
+    return system, content
+
+
+def _finish_fields(raw: str, email_text: str) -> dict:
+    log.payload(logger, "ingest raw LLM output", raw)
+
+    with stage("ingest", "coerce"):
+        data = _coerce_json_or_empty(raw)
+
+    # what the LLM JSON actually contains **before** normalize_schema
+    if logger.isEnabledFor(logging.DEBUG):
+        sites = data.get("sites") if isinstance(data.get("sites"), list) else []
+        logger.debug("ingest pre-normalize", extra={
+            "client": data.get("client"),
+            "sites": len(sites),
+            "first_site_keys": list(sites[0].keys()) if sites and isinstance(sites[0], dict) else [],
+        })
 
     data["notes_raw"] = email_text
 
     # Single place to clean + coerce everything
-    data = normalize_schema(data)
-    data = enrich_schema_rack_units(data)
+    with stage("ingest", "normalise"):
+        data = normalize_schema(data)
+    with stage("ingest", "rack_unit_enrich"):
+        data = enrich_schema_rack_units(data)
     return data
 
+
+def extract_fields(email_text: str) -> dict:
+    email_text = (email_text or "").strip()
+    if len(email_text) < 10:
+        return _empty_schema(notes_raw=email_text)
+
+    system, content = _ingest_prompts(email_text)
+
+    client = _get_client()
+    with stage("ingest", "llm"):
+        raw = client.complete(
+            content,
+            system=system,
+            json_mode=False,
+            max_tokens=6000,
+        )
+    return _finish_fields(raw, email_text)
+
+
+async def aextract_fields(email_text: str) -> dict:
+    """extract_fields for the asyncio app."""
+    email_text = (email_text or "").strip()
+    if len(email_text) < 10:
+        return _empty_schema(notes_raw=email_text)
+
+    system, content = await asyncio.to_thread(_ingest_prompts, email_text)  # file checks block
+    with stage("ingest", "llm"):
+        raw = await get_async_client().acomplete(
+            content,
+            system=system,
+            json_mode=False,
+            max_tokens=6000,
+        )
+    return _finish_fields(raw, email_text)
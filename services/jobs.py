@@ -0,0 +1,154 @@
+# services/jobs.py
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from services.store import TTLStore, shared_store
+
+JOB_WORKERS   = int(os.getenv("LOE_JOB_WORKERS") or 8)
+# Jobs waiting for a worker beyond this are refused (caller gets a 503).
+JOB_QUEUE_MAX = int(os.getenv("LOE_JOB_QUEUE_MAX") or 64)
+JOB_TTL       = float(os.getenv("LOE_JOB_TTL") or 3600)
+# Long-poll cap; keep below the gunicorn timeout.
+JOB_MAX_WAIT  = float(os.getenv("LOE_JOB_MAX_WAIT") or 25)
+
+_NS = "job"
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class JobManager:
+    """
+    Run /ingest and /generate work on a bounded background executor so web
+    threads return immediately. Job state lives in the shared TTL store, so
+    `GET /jobs/<id>` works from any worker.
+    """
+
+    def __init__(self, store: TTLStore | None = None, workers: int = JOB_WORKERS,
+                 queue_max: int = JOB_QUEUE_MAX, ttl: float = JOB_TTL):
+        self.store = store or shared_store()
+        self.workers = workers
+        self.queue_max = queue_max
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="loe-job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._local: dict[str, Future] = {}
+        # Finished jobs whose final save to the store failed: polls on this
+        # worker still see them finish instead of "running" until expiry.
+        self._unsaved: dict[str, dict] = {}
+
+    def _save(self, job: dict) -> dict:
+        job["updated"] = time.time()
+        self.store.put(_NS, job["id"], job, self.ttl)
+        return job
+
+    def submit(self, kind: str, fn: Callable[[], Any]) -> dict:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_max:
+                raise QueueFullError("Job queue is full; try again shortly")
+            self._pending += 1
+
+        try:
+            job = self._save({
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "status": "queued",
+                "result": None,
+                "error": None,
+                "created": time.time(),
+            })
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        ctx = contextvars.copy_context()
+        fut = self._executor.submit(ctx.run, self._run, dict(job), fn)
+        with self._lock:
+            self._local[job["id"]] = fut
+        fut.add_done_callback(lambda _f, jid=job["id"]: self._forget(jid))
+        return job
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._local.pop(job_id, None)
+
+    def _run(self, job: dict, fn: Callable[[], Any]) -> None:
+        try:
+            self._save(dict(job, status="running"))
+        except sqlite3.Error:
+            logger.warning("job %s: could not save running state", job["id"], exc_info=True)
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(dict(job, status="error", error=str(e)))
+            return
+        self._finish(dict(job, status="done", result=result))
+
+    def _finish(self, job: dict) -> None:
+        """Save a finished job; if the store fails, keep it in memory on this worker."""
+        try:
+            self._save(job)
+        except sqlite3.Error:
+            logger.warning("job %s: could not save %s state; kept in memory", job["id"],
+                           job["status"], exc_info=True)
+            job["updated"] = time.time()
+            with self._lock:
+                cutoff = time.time() - self.ttl
+                self._unsaved = {k: v for k, v in self._unsaved.items() if v["updated"] > cutoff}
+                self._unsaved[job["id"]] = job
+
+    def get(self, job_id: str, wait: float = 0.0) -> dict | None:
+        """Job record; with `wait` > 0, block until it finishes or the wait elapses."""
+        deadline = time.monotonic() + min(max(wait, 0.0), JOB_MAX_WAIT)
+        while True:
+            with self._lock:
+                job = self._unsaved.get(job_id)
+            if job is None:
+                job = self.store.get(_NS, job_id)
+            if job is None or job["status"] in ("done", "error"):
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._lock:
+                fut = self._local.get(job_id)
+            if fut is not None:
+                # Started on this worker: wake as soon as it finishes.
+                try:
+                    fut.result(timeout=remaining)
+                except Exception:
+                    pass
+            else:
+                time.sleep(min(0.25, remaining))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"pending": self._pending, "workers": self.workers, "queue_max": self.queue_max,
+                    "unsaved": len(self._unsaved)}
+
+
+_JOBS: JobManager | None = None
+_JOBS_LOCK = threading.Lock()
+
+
+def shared_jobs() -> JobManager:
+    global _JOBS
+    if _JOBS is None:
+        with _JOBS_LOCK:
+            if _JOBS is None:
+                _JOBS = JobManager()
+    return _JOBS
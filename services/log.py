@@ -0,0 +1,158 @@
+# services/log.py
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_LEVEL          = (os.getenv("LOE_LOG_LEVEL") or "INFO").upper()
+# Raw prompts/LLM output are only logged when this is on AND the logger is at
+# DEBUG, and then only for a sample of requests, truncated.
+LOG_PAYLOADS       = os.getenv("LOE_LOG_PAYLOADS", "0").lower() in {"1", "true", "yes"}
+LOG_PAYLOAD_SAMPLE = float(os.getenv("LOE_LOG_PAYLOAD_SAMPLE") or 1.0)
+LOG_PAYLOAD_CHARS  = int(os.getenv("LOE_LOG_PAYLOAD_CHARS") or 1000)
+LOG_QUEUE_MAX      = int(os.getenv("LOE_LOG_QUEUE_MAX") or 10000)
+
+_REQUEST_ID: contextvars.ContextVar[str | None] = contextvars.ContextVar("loe_request_id", default=None)
+
+# LogRecord attributes that aren't user-supplied `extra=` fields.
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+# --- correlation ids -------------------------------------------------------
+
+def bind_request_id(request_id: str) -> contextvars.Token:
+    return _REQUEST_ID.set(request_id)
+
+
+def reset_request_id(token: contextvars.Token) -> None:
+    try:
+        _REQUEST_ID.reset(token)
+    except ValueError:  # reset from another context (streamed body)
+        _REQUEST_ID.set(None)
+
+
+def request_id() -> str | None:
+    return _REQUEST_ID.get()
+
+
+class _RequestIdFilter(logging.Filter):
+    # Runs in the emitting thread, where the request's context is live.
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _REQUEST_ID.get()
+        return True
+
+
+# --- formatting / handlers -------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        rid = getattr(record, "request_id", None)
+        if rid:
+            out["request_id"] = rid
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and not k.startswith("_"):
+                out[k] = v
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never block a request on logging: drop (and count) when the queue is full."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve msg % args and the traceback here (objects may change or
+        # not pickle later); JSON formatting happens on the listener thread.
+        # Work on a copy: handlers after this one still see the original.
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+_LISTENER: logging.handlers.QueueListener | None = None
+_CONFIGURED_PID: int | None = None
+_LOCK = threading.Lock()
+
+
+def configure(level: str = LOG_LEVEL) -> None:
+    """
+    Route every logger through a bounded queue to one stdout writer thread.
+    Idempotent; after a fork it starts a fresh writer thread in the child.
+    """
+    global _LISTENER, _CONFIGURED_PID
+    with _LOCK:
+        if _CONFIGURED_PID == os.getpid():
+            return
+        q: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        _LISTENER = logging.handlers.QueueListener(q, stream, respect_handler_level=False)
+        _LISTENER.start()
+
+        handler = _DroppingQueueHandler(q)
+        handler.addFilter(_RequestIdFilter())
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            if isinstance(h, _DroppingQueueHandler):
+                root.removeHandler(h)
+        root.addHandler(handler)
+        root.setLevel(level)
+        _CONFIGURED_PID = os.getpid()
+
+
+def _stop() -> None:
+    if _LISTENER is not None and _CONFIGURED_PID == os.getpid():
+        _LISTENER.stop()  # flush what's queued
+
+
+atexit.register(_stop)
+
+
+# --- payload dumps ---------------------------------------------------------
+
+def payload(logger: logging.Logger, label: str, text: str, **fields) -> None:
+    """
+    DEBUG-log a (truncated) prompt/LLM payload for a sample of calls. Costs
+    nothing -- no slicing, no formatting -- unless LOE_LOG_PAYLOADS is on
+    and the logger is enabled for DEBUG.
+    """
+    if not LOG_PAYLOADS or not logger.isEnabledFor(logging.DEBUG):
+        return
+    if LOG_PAYLOAD_SAMPLE < 1.0 and random.random() >= LOG_PAYLOAD_SAMPLE:
+        return
+    logger.debug("%s", label, extra=dict(fields, chars=len(text or ""),
+                                         payload=(text or "")[:LOG_PAYLOAD_CHARS]))
+
+
+def elapsed_ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
@@ -0,0 +1,163 @@
+# services/metrics.py
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+from adapters import hooks
+from services import tracing
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# (set in services/gunicorn.conf.py) and /metrics merges them, so any worker
+# can answer a scrape. Without the env var the default in-process registry
+# is used (flask dev server, uvicorn single worker).
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or ""
+
+# LLM calls take tens of seconds; the local stages take milliseconds.
+_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120)
+_SIZE_BUCKETS = (100, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000)
+
+STAGE_SECONDS = Histogram(
+    "loe_stage_seconds", "Time spent per pipeline stage",
+    ["op", "stage", "mode"], buckets=_BUCKETS,
+)
+STAGE_IN_FLIGHT = Gauge(
+    "loe_stage_in_flight", "Pipeline stages currently running",
+    ["op", "stage"], multiprocess_mode="livesum",
+)
+REQUEST_SECONDS = Histogram(
+    "loe_http_request_seconds", "HTTP request latency",
+    ["endpoint", "method", "status"], buckets=_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "loe_http_requests_in_flight", "HTTP requests currently being served",
+    ["endpoint"], multiprocess_mode="livesum",
+)
+
+UPSTREAM_RESPONSES = Counter(
+    "loe_upstream_responses_total", "LLM gateway responses by status ('error' = transport failure)",
+    ["backend", "status"],
+)
+UPSTREAM_SECONDS = Histogram(
+    "loe_upstream_seconds", "LLM gateway round-trip time",
+    ["backend"], buckets=_BUCKETS,
+)
+LLM_CHARS = Histogram(
+    "loe_llm_chars", "Characters per LLM call",
+    ["direction"], buckets=_SIZE_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "loe_llm_tokens_total", "Tokens reported by the gateway",
+    ["direction"],
+)
+JSON_PATH = Counter(
+    "loe_json_path_total", "How json_mode replies became valid JSON",
+    ["path"],
+)
+JSON_PATH_SECONDS = Histogram(
+    "loe_json_path_seconds", "Local extract/repair time for json_mode replies",
+    ["path"], buckets=_BUCKETS,
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "loe_admission_queue_depth", "Requests waiting for an admission slot",
+    ["endpoint"], multiprocess_mode="livesum",
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "loe_admission_in_flight", "Requests holding an admission slot",
+    ["endpoint"], multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "loe_admission_rejected_total", "Requests refused with 429 (queue_full, deadline, timeout, worker_full)",
+    ["endpoint", "reason"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "loe_admission_wait_seconds", "Time admitted requests spent queued",
+    ["endpoint"], buckets=_BUCKETS,
+)
+
+GENERATE_DEGRADED = Counter(
+    "loe_generate_degraded_total", "Generates served from the mode's templates after an upstream failure",
+    ["mode", "reason"],
+)
+
+COMPRESSION_SECONDS = Counter(
+    "loe_compression_seconds_total", "CPU time spent compressing responses", ["encoding"],
+)
+COMPRESSION_BYTES = Counter(
+    "loe_compression_bytes_total", "Response bytes before/after compression", ["encoding", "side"],
+)
+
+
+@contextmanager
+def stage(op: str, name: str, mode: str = ""):
+    """
+    Time one pipeline stage: `with stage("generate", "llm", mode.key): ...`.
+    Also recorded as a span on the request's trace (Server-Timing).
+    """
+    STAGE_IN_FLIGHT.labels(op, name).inc()
+    t0 = time.perf_counter()
+    try:
+        with tracing.span(name, mode=mode or None):
+            yield
+    finally:
+        STAGE_SECONDS.labels(op, name, mode or "-").observe(time.perf_counter() - t0)
+        STAGE_IN_FLIGHT.labels(op, name).dec()
+
+
+def observe_degraded(mode: str, reason: str) -> None:
+    GENERATE_DEGRADED.labels(mode, reason).inc()
+
+
+def observe_compression(encoding: str, bytes_in: int, bytes_out: int, seconds: float) -> None:
+    COMPRESSION_SECONDS.labels(encoding).inc(seconds)
+    COMPRESSION_BYTES.labels(encoding, "in").inc(bytes_in)
+    COMPRESSION_BYTES.labels(encoding, "out").inc(bytes_out)
+
+
+def _on_adapter_event(event: str, f: dict) -> None:
+    if event == "upstream":
+        UPSTREAM_RESPONSES.labels(f["backend"], str(f["status"])).inc()
+        UPSTREAM_SECONDS.labels(f["backend"]).observe(f["seconds"])
+        LLM_CHARS.labels("prompt").observe(f["prompt_chars"])
+        if f["response_chars"]:
+            LLM_CHARS.labels("response").observe(f["response_chars"])
+        if f["prompt_tokens"]:
+            LLM_TOKENS.labels("prompt").inc(f["prompt_tokens"])
+        if f["completion_tokens"]:
+            LLM_TOKENS.labels("completion").inc(f["completion_tokens"])
+        if f.get("cached_tokens"):
+            LLM_TOKENS.labels("cached").inc(f["cached_tokens"])
+    elif event == "json_path":
+        JSON_PATH.labels(f["path"]).inc()
+        if f["seconds"] is not None:
+            JSON_PATH_SECONDS.labels(f["path"]).observe(f["seconds"])
+
+
+hooks.subscribe(_on_adapter_event)
+
+
+def render() -> tuple[bytes, str]:
+    """(body, content type) for the /metrics endpoint."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """gunicorn child_exit hook: drop a dead worker's live gauges."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
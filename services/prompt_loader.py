@@ -1,13 +1,190 @@
 # services/prompt_loader.py
+from __future__ import annotations
+
+import hashlib
 import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Mapping
+
+from services.prompt_template import Template
+
+PROMPT_SUFFIXES = (".txt", ".md")
+
+# Relative prompt dirs ("services/ingest/prompts") resolve against the repo
+# root, not the process CWD.
+ROOT = Path(__file__).resolve().parent.parent
+
+# Seconds between stat() checks of a cached prompt; 0 = check on every call.
+# An edited file (new mtime or size) is re-read on the next check.
+CHECK_INTERVAL = float(os.getenv("LOE_PROMPT_CHECK_INTERVAL") or 2.0)
+
+
+class _Entry:
+    __slots__ = ("text", "sha", "mtime_ns", "size", "checked")
+
+    def __init__(self, text: str | None, sha: str | None, mtime_ns: int, size: int, checked: float):
+        self.text = text          # None = file doesn't exist
+        self.sha = sha
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checked = checked
+
+
+class PromptCache:
+    """
+    Process-wide prompt file cache keyed by absolute path. Entries are
+    revalidated by (mtime, size) at most every `check_interval` seconds,
+    so edits hot-reload without a restart, and each carries a sha256 of
+    the text for downstream cache keys.
+    """
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._files: dict[str, _Entry] = {}
+        self._dirs: dict[str, tuple[tuple[str, ...], float]] = {}
+        self._templates: dict[tuple, tuple[tuple, Template]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.stats_calls = 0
+        self.compiles = 0
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def resolve(prompt_dir: str, fname: str = "") -> str:
+        path = Path(prompt_dir, fname) if fname else Path(prompt_dir)
+        return str(path if path.is_absolute() else ROOT / path)
+
+    def _fresh(self, checked: float, now: float) -> bool:
+        return self.check_interval > 0 and now - checked < self.check_interval
+
+    def entry(self, path: str) -> _Entry:
+        now = time.monotonic()
+        e = self._files.get(path)
+        if e is not None and self._fresh(e.checked, now):
+            self.hits += 1
+            return e
+        with self._lock:
+            e = self._files.get(path)
+            if e is not None and self._fresh(e.checked, now):
+                self.hits += 1
+                return e
+            self.stats_calls += 1
+            try:
+                st = os.stat(path)
+            except OSError:
+                e = _Entry(None, None, 0, 0, now)
+            else:
+                if e is not None and e.text is not None and (e.mtime_ns, e.size) == (st.st_mtime_ns, st.st_size):
+                    e.checked = now
+                    self.hits += 1
+                    return e
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+                self.loads += 1
+                e = _Entry(text, hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                           st.st_mtime_ns, st.st_size, now)
+            self._files[path] = e
+            return e
+
+    def names(self, prompt_dir: str) -> tuple[str, ...]:
+        """Prompt files in a directory (listing refreshed like the files are)."""
+        path = self.resolve(prompt_dir)
+        now = time.monotonic()
+        hit = self._dirs.get(path)
+        if hit is not None and self._fresh(hit[1], now):
+            return hit[0]
+        try:
+            names = tuple(sorted(n for n in os.listdir(path) if n.endswith(PROMPT_SUFFIXES)))
+        except OSError:
+            names = ()
+        self._dirs[path] = (names, now)
+        return names
+
+    def version(self, *prompt_dirs: str) -> str:
+        """Short hash over every prompt file in `prompt_dirs` (changes on any edit)."""
+        h = hashlib.sha256()
+        for d in prompt_dirs:
+            for name in self.names(d):
+                h.update(f"{d}/{name}={self.entry(self.resolve(d, name)).sha}\n".encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def template(self, prompt_dir: str, fname: str, include: Mapping[str, str] | None = None,
+                 strip: bool = False) -> Template:
+        """
+        `fname` compiled into a Template, with `include` slots ({slot: other
+        file in the same dir}) bound in at compile time. Recompiled only when
+        one of those files changes.
+        """
+        include = dict(include or {})
+        path = self.resolve(prompt_dir, fname)
+        main = self.entry(path)
+        parts = {slot: self.entry(self.resolve(prompt_dir, f)) for slot, f in include.items()}
+        key = (path, strip, tuple(sorted(include.items())))
+        version = (main.sha, tuple(parts[slot].sha for slot in sorted(parts)))
+        hit = self._templates.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        tpl = Template(main.text or "", strip=strip)
+        if parts:
+            tpl = tpl.partial(**{slot: e.text or "" for slot, e in parts.items()})
+        self._templates[key] = (version, tpl)
+        self.compiles += 1
+        return tpl
+
+    def preload(self, prompt_dirs: Iterable[str]) -> int:
+        n = 0
+        for d in prompt_dirs:
+            for name in self.names(d):
+                n += self.entry(self.resolve(d, name)).text is not None
+        return n
+
+    def stats(self) -> dict:
+        return {
+            "files": sum(e.text is not None for e in list(self._files.values())),
+            "hits": self.hits,
+            "loads": self.loads,
+            "stat_calls": self.stats_calls,
+            "templates_compiled": self.compiles,
+            "check_interval": self.check_interval,
+        }
+
+
+_CACHE = PromptCache()
+
 
 def load_prompt_file(prompt_dir: str | None, fname: str) -> str:
     """
     Try <prompt_dir>/<fname>. If not found, return "" (caller can fall back).
     """
-    if prompt_dir:
-        path = os.path.join(prompt_dir, fname)
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                return f.read()
-    return ""
+    if not prompt_dir:
+        return ""
+    return _CACHE.entry(_CACHE.resolve(prompt_dir, fname)).text or ""
+
+
+def load_template(prompt_dir: str, fname: str, include: Mapping[str, str] | None = None,
+                  strip: bool = False) -> Template:
+    """Compiled Template for <prompt_dir>/<fname> (see PromptCache.template)."""
+    return _CACHE.template(prompt_dir, fname, include, strip)
+
+
+def prompt_sha(prompt_dir: str, fname: str) -> str | None:
+    """sha256 of the prompt's current text (None if the file doesn't exist)."""
+    return _CACHE.entry(_CACHE.resolve(prompt_dir, fname)).sha
+
+
+def prompt_version(*prompt_dirs: str) -> str:
+    """Fingerprint of every prompt in `prompt_dirs`, for result/ETag cache keys."""
+    return _CACHE.version(*prompt_dirs)
+
+
+def preload(prompt_dirs: Iterable[str]) -> int:
+    """Read every prompt file in `prompt_dirs` into the cache; returns the count."""
+    return _CACHE.preload(prompt_dirs)
+
+
+def stats() -> dict:
+    return _CACHE.stats()
@@ -0,0 +1,60 @@
+# services/prompt_template.py
+from __future__ import annotations
+
+import re
+from typing import Mapping
+
+# {{name}} is a slot; anything else (including single-brace {BOM_TABLE}) is text.
+_SLOT_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+
+
+class Template:
+    """
+    A prompt parsed once into static segments and named slots.
+
+    `parts` alternates text and slots: parts[0::2] are static strings,
+    parts[1::2] are (name, literal) pairs. render() only joins strings --
+    no scanning, no replace() over the whole prompt. A slot with no value
+    renders as its original {{literal}}, so unknown placeholders survive.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str = "", strip: bool = False, parts: list | None = None):
+        if parts is None:
+            parts = []
+            pos = 0
+            for m in _SLOT_RE.finditer(text):
+                parts.append(text[pos:m.start()])
+                parts.append((m.group(1), m.group(0)))
+                pos = m.end()
+            parts.append(text[pos:])
+            if strip:
+                parts[0] = parts[0].lstrip()
+                parts[-1] = parts[-1].rstrip()
+        self.parts = parts
+
+    @property
+    def slots(self) -> list[str]:
+        return [name for name, _ in self.parts[1::2]]
+
+    def render(self, values: Mapping[str, object] | None = None, **kw) -> str:
+        values = dict(values or {}, **kw)
+        out = [self.parts[0]]
+        for i in range(1, len(self.parts), 2):
+            name, literal = self.parts[i]
+            v = values.get(name)
+            out.append(literal if v is None else str(v))
+            out.append(self.parts[i + 1])
+        return "".join(out)
+
+    def partial(self, **values: str) -> "Template":
+        """Bind some slots now (e.g. a static example file) and merge the text around them."""
+        parts = [self.parts[0]]
+        for i in range(1, len(self.parts), 2):
+            name, literal = self.parts[i]
+            if name in values:
+                parts[-1] += str(values[name]) + self.parts[i + 1]
+            else:
+                parts.extend((self.parts[i], self.parts[i + 1]))
+        return Template(parts=parts)
@@ -0,0 +1,264 @@
+# services/singleflight.py
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable
+
+from services.store import TTLStore, shared_store
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: coalesce within the process only
+    fcntl = None
+
+SF_ENABLED = os.getenv("LOE_SINGLEFLIGHT", "1").lower() in {"1", "true", "yes"}
+SF_DIR     = os.getenv("LOE_SINGLEFLIGHT_DIR") or os.path.join(tempfile.gettempdir(), "loe-singleflight")
+# How long a worker waits on another worker's identical call before giving
+# up and making its own (keep below the gunicorn timeout).
+SF_WAIT    = float(os.getenv("LOE_SINGLEFLIGHT_WAIT") or 55)
+# Finished results are handed across workers through the shared store; they
+# only need to live long enough for the waiters to pick them up.
+SF_TTL     = float(os.getenv("LOE_SINGLEFLIGHT_TTL") or 30)
+
+_NS = "sf"
+
+logger = logging.getLogger(__name__)
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.replace("\r\n", "\n").strip()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def canonical_key(kind: str, payload: Any) -> str:
+    """
+    Stable hash of a request body: key order, CRLFs and surrounding
+    whitespace don't matter, so a double-submit from another tab matches.
+    """
+    blob = json.dumps([kind, _canonical(payload)], sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent identical calls into one.
+
+    Within a process, followers wait on the leader's Future. Across gunicorn
+    workers, the leader holds an flock on `<dir>/<key>.lock`; a worker that
+    finds it held waits for the lock, then picks the leader's result out of
+    the shared store (or runs the call itself if the leader failed).
+    """
+
+    def __init__(self, store: TTLStore | None = None, lock_dir: str = SF_DIR,
+                 wait: float = SF_WAIT, ttl: float = SF_TTL):
+        self.store = store or shared_store()
+        self.lock_dir = lock_dir if fcntl else ""
+        self.wait = wait
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._ainflight: dict[str, asyncio.Future] = {}
+        self._counters = {"leaders": 0, "joined_local": 0, "joined_remote": 0, "wait_timeouts": 0,
+                          "publish_errors": 0}
+        if self.lock_dir:
+            try:
+                os.makedirs(self.lock_dir, exist_ok=True)
+            except OSError:
+                self.lock_dir = ""
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            self._count("joined_local")
+            return copy.deepcopy(fut.result())
+
+        try:
+            out = self._do_across_workers(key, fn)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(out)
+            return out
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # --- cross-worker -------------------------------------------------------
+
+    def _acquire(self, path: str, blocking_until: float | None) -> int | None:
+        """flock `path`; None if `blocking_until` passes first."""
+        while True:
+            fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if blocking_until is None or time.monotonic() >= blocking_until:
+                        os.close(fd)
+                        return None
+                    time.sleep(0.05)
+            # The previous holder unlinks the file on release; make sure we
+            # locked the file that is still at `path`, not an orphan.
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def _release(self, path: str, fd: int) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _publish(self, key: str, out: Any) -> None:
+        """Hand a leader's result to waiting workers; best effort (they re-run it on a miss)."""
+        try:
+            self.store.put(_NS, key, {"at": time.time(), "value": out}, self.ttl)
+        except (sqlite3.Error, TypeError, ValueError):
+            self._count("publish_errors")
+            logger.warning("singleflight: could not publish result for %s", key[:12], exc_info=True)
+
+    def _do_across_workers(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            self._count("leaders")
+            return fn()
+
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        fd = self._acquire(path, None)
+        if fd is None:
+            # Another worker is already making this call; wait for it.
+            since = time.time()
+            fd = self._acquire(path, time.monotonic() + self.wait)
+            if fd is None:
+                self._count("wait_timeouts")
+                self._count("leaders")
+                return fn()
+            shared = self.store.get(_NS, key)
+            if shared is not None and shared["at"] >= since:
+                self._release(path, fd)
+                self._count("joined_remote")
+                return shared["value"]
+
+        self._count("leaders")
+        try:
+            out = fn()
+            self._publish(key, out)
+            return out
+        finally:
+            self._release(path, fd)
+
+    # --- asyncio ---
+
+    async def ado(self, key: str, afn: Callable[[], Awaitable[Any]]) -> Any:
+        """do() for the asyncio app; lock waits and store reads/writes run off the event loop."""
+        fut = self._ainflight.get(key)
+        if fut is not None:
+            self._count("joined_local")
+            return copy.deepcopy(await asyncio.shield(fut))
+        fut = self._ainflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            out = await self._ado_across_workers(key, afn)
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody joined
+            raise
+        else:
+            fut.set_result(out)
+            return out
+        finally:
+            self._ainflight.pop(key, None)
+
+    async def _ado_across_workers(self, key: str, afn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.lock_dir:
+            self._count("leaders")
+            return await afn()
+
+        path = os.path.join(self.lock_dir, f"{key}.lock")
+        fd = self._acquire(path, None)  # non-blocking attempt
+        if fd is None:
+            since = time.time()
+            fd = await asyncio.to_thread(self._acquire, path, time.monotonic() + self.wait)
+            if fd is None:
+                self._count("wait_timeouts")
+                self._count("leaders")
+                return await afn()
+            shared = await asyncio.to_thread(self.store.get, _NS, key)
+            if shared is not None and shared["at"] >= since:
+                self._release(path, fd)
+                self._count("joined_remote")
+                return shared["value"]
+
+        self._count("leaders")
+        try:
+            out = await afn()
+            await asyncio.to_thread(self._publish, key, out)
+            return out
+        finally:
+            self._release(path, fd)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out["in_flight"] = len(self._inflight) + len(self._ainflight)
+        out["cross_worker"] = bool(self.lock_dir)
+        return out
+
+
+_SF: SingleFlight | None = None
+_SF_LOCK = threading.Lock()
+
+
+def shared_singleflight() -> SingleFlight:
+    global _SF
+    if _SF is None:
+        with _SF_LOCK:
+            if _SF is None:
+                _SF = SingleFlight()
+    return _SF
+
+
+def coalesce(kind: str, payload: Any, fn: Callable[[], Any]) -> Any:
+    """Run `fn` once for all concurrent callers with the same (kind, payload)."""
+    if not SF_ENABLED:
+        return fn()
+    return shared_singleflight().do(canonical_key(kind, payload), fn)
+
+
+async def acoalesce(kind: str, payload: Any, afn: Callable[[], Awaitable[Any]]) -> Any:
+    """coalesce() for coroutines."""
+    if not SF_ENABLED:
+        return await afn()
+    return await shared_singleflight().ado(canonical_key(kind, payload), afn)
@@ -1,3 +1,10 @@
 #!/usr/bin/env bash
 set -e
+# LOE_SERVER=asgi serves the asyncio app (services/asgi_app.py) instead.
+if [ "${LOE_SERVER:-wsgi}" = "asgi" ]; then
+  # per-worker /metrics files (gunicorn does this in gunicorn.conf.py)
+  export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/loe-prometheus}"
+  rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+  exec uvicorn services.asgi_app:app --host 0.0.0.0 --port 5050 --workers "${WEB_CONCURRENCY:-1}"
+fi
 exec gunicorn -c services/gunicorn.conf.py services.app:app
@@ -0,0 +1,110 @@
+# services/store.py
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any
+
+# SQLite file shared by every gunicorn worker on the host, so a job started
+# on one worker can be polled through another.
+STORE_PATH = os.getenv("LOE_STORE_PATH", os.path.join(tempfile.gettempdir(), "loe-store.sqlite3"))
+# In-process fallback (LOE_STORE_PATH="" or unwritable): expired entries are
+# swept at most this often (s), and past this many entries the oldest
+# writes go first, so entries nobody reads again can't pile up.
+MEMORY_SWEEP_INTERVAL = float(os.getenv("LOE_STORE_MEMORY_SWEEP") or 60)
+MEMORY_MAX_ENTRIES    = int(os.getenv("LOE_STORE_MEMORY_ENTRIES") or 5000)
+
+
+class TTLStore:
+    """
+    Small namespaced key/value store with per-entry expiry. Values are JSON.
+    Backed by SQLite when `path` is writable, otherwise an in-process dict.
+    """
+
+    def __init__(self, path: str = STORE_PATH, max_entries: int = MEMORY_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._mem: dict[tuple[str, str], tuple[str, float]] = {}
+        self._swept = time.monotonic()
+        if self.path:
+            try:
+                self._db().execute(
+                    "CREATE TABLE IF NOT EXISTS kv ("
+                    " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                    " expires REAL NOT NULL, PRIMARY KEY (ns, key))"
+                )
+                self._db().execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv(expires)")
+            except sqlite3.Error:
+                self.path = ""
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        blob = json.dumps(value, ensure_ascii=False)
+        expires = time.time() + ttl
+        if not self.path:
+            with self._lock:
+                self._mem.pop((ns, key), None)  # re-insert: newest last
+                self._mem[(ns, key)] = (blob, expires)
+                self._evict_memory()
+            return
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO kv(ns, key, value, expires) VALUES (?, ?, ?, ?)",
+                   (ns, key, blob, expires))
+        db.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+
+    def _evict_memory(self) -> None:
+        """Drop expired entries (periodically) and the oldest beyond max_entries; holds _lock."""
+        if time.monotonic() - self._swept >= MEMORY_SWEEP_INTERVAL:
+            now = time.time()
+            self._mem = {k: v for k, v in self._mem.items() if v[1] > now}
+            self._swept = time.monotonic()
+        while len(self._mem) > self.max_entries:
+            del self._mem[next(iter(self._mem))]
+
+    def get(self, ns: str, key: str) -> Any | None:
+        now = time.time()
+        if not self.path:
+            with self._lock:
+                hit = self._mem.get((ns, key))
+                if hit and hit[1] > now:
+                    return json.loads(hit[0])
+                self._mem.pop((ns, key), None)
+            return None
+        row = self._db().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires > ?", (ns, key, now)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, ns: str, key: str) -> None:
+        if not self.path:
+            with self._lock:
+                self._mem.pop((ns, key), None)
+            return
+        self._db().execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+
+_STORE: TTLStore | None = None
+_STORE_LOCK = threading.Lock()
+
+
+def shared_store() -> TTLStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = TTLStore()
+    return _STORE
@@ -0,0 +1,198 @@
+# services/tracing.py
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from adapters import hooks
+
+# "" = Server-Timing only; a file path appends one OTLP/JSON document per
+# request; an http(s) URL POSTs it to a collector (e.g. .../v1/traces).
+TRACE_EXPORT  = (os.getenv("LOE_TRACE_EXPORT") or "").strip()
+TRACE_SAMPLE  = float(os.getenv("LOE_TRACE_SAMPLE") or 1.0)
+SERVICE_NAME  = os.getenv("LOE_SERVICE_NAME") or "loe-backend"
+
+
+class Trace:
+    """Spans for one HTTP request. Shared (by reference) with worker threads."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes: dict = {}
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start_ns: int, end_ns: int, **attrs) -> None:
+        with self._lock:
+            self.spans.append({"name": name, "start": start_ns, "end": end_ns,
+                               "attrs": {k: v for k, v in attrs.items() if v is not None}})
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per span, then the total so far."""
+        with self._lock:
+            spans = list(self.spans)
+        parts = []
+        for sp in spans:
+            entry = f"{sp['name']};dur={(sp['end'] - sp['start']) / 1e6:.1f}"
+            desc = " ".join(f"{k}={v}" for k, v in sp["attrs"].items())
+            if desc:
+                entry += f';desc="{desc}"'
+            parts.append(entry)
+        parts.append(f"total;dur={(time.time_ns() - self.start_ns) / 1e6:.1f}")
+        return ", ".join(parts)
+
+    def to_otlp(self) -> dict:
+        """OTLP/JSON (ExportTraceServiceRequest) with the request as root span."""
+        def attrs(d: dict) -> list[dict]:
+            out = []
+            for k, v in d.items():
+                if isinstance(v, bool):
+                    val = {"boolValue": v}
+                elif isinstance(v, int):
+                    val = {"intValue": str(v)}
+                elif isinstance(v, float):
+                    val = {"doubleValue": v}
+                else:
+                    val = {"stringValue": str(v)}
+                out.append({"key": k, "value": val})
+            return out
+
+        with self._lock:
+            spans = list(self.spans)
+        otlp_spans = [{
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2,  # SERVER
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": attrs(self.attributes),
+        }]
+        for sp in spans:
+            otlp_spans.append({
+                "traceId": self.trace_id,
+                "spanId": secrets.token_hex(8),
+                "parentSpanId": self.span_id,
+                "name": sp["name"],
+                "kind": 3 if sp["name"] == "llm_call" else 1,  # CLIENT / INTERNAL
+                "startTimeUnixNano": str(sp["start"]),
+                "endTimeUnixNano": str(sp["end"]),
+                "attributes": attrs(sp["attrs"]),
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": attrs({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "loe.tracing"}, "spans": otlp_spans}],
+        }]}
+
+
+_CURRENT: contextvars.ContextVar[Trace | None] = contextvars.ContextVar("loe_trace", default=None)
+
+
+def start(name: str) -> contextvars.Token:
+    """Begin a request trace in the current context (pass the token to finish())."""
+    return _CURRENT.set(Trace(name))
+
+
+def current() -> Trace | None:
+    return _CURRENT.get()
+
+
+def finish(token: contextvars.Token, **attrs) -> None:
+    trace = _CURRENT.get()
+    try:
+        _CURRENT.reset(token)
+    except ValueError:  # finished from another context (e.g. a streamed body)
+        _CURRENT.set(None)
+    if trace is None:
+        return
+    trace.end_ns = time.time_ns()
+    trace.attributes.update(attrs)
+    if TRACE_EXPORT and random.random() < TRACE_SAMPLE:
+        _exporter().submit(trace)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record a span on the current request's trace (no-op outside a request)."""
+    trace = _CURRENT.get()
+    if trace is None:
+        yield
+        return
+    t0 = time.time_ns()
+    try:
+        yield
+    finally:
+        trace.add(name, t0, time.time_ns(), **attrs)
+
+
+def _on_adapter_event(event: str, f: dict) -> None:
+    trace = _CURRENT.get()
+    if trace is None:
+        return
+    end = time.time_ns()
+    if event == "upstream":
+        # one span per attempt (retries and hedges each show up)
+        trace.add("llm_call", end - int(f["seconds"] * 1e9), end,
+                  backend=f["backend"], status=f["status"],
+                  prompt_tokens=f["prompt_tokens"], completion_tokens=f["completion_tokens"],
+                  cached_tokens=f.get("cached_tokens"))
+    elif event == "json_path" and f["seconds"] is not None:
+        trace.add("json_repair", end - int(f["seconds"] * 1e9), end, path=f["path"])
+
+
+hooks.subscribe(_on_adapter_event)
+
+
+# --- export ----------------------------------------------------------------
+
+class _Exporter:
+    """Ship finished traces off the request path (background thread)."""
+
+    def __init__(self, target: str):
+        self.target = target
+        self._q: queue.Queue[Trace] = queue.Queue(maxsize=1000)
+        threading.Thread(target=self._run, name="loe-trace-export", daemon=True).start()
+
+    def submit(self, trace: Trace) -> None:
+        try:
+            self._q.put_nowait(trace)
+        except queue.Full:
+            pass  # never block a request on tracing
+
+    def _run(self) -> None:
+        while True:
+            doc = self._q.get().to_otlp()
+            try:
+                if self.target.startswith(("http://", "https://")):
+                    requests.post(self.target, json=doc, timeout=5)
+                else:
+                    with open(self.target, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(doc) + "\n")
+            except (OSError, requests.RequestException):
+                pass
+
+
+_EXPORTER: _Exporter | None = None
+_EXPORTER_LOCK = threading.Lock()
+
+
+def _exporter() -> _Exporter:
+    global _EXPORTER
+    if _EXPORTER is None:
+        with _EXPORTER_LOCK:
+            if _EXPORTER is None:
+                _EXPORTER = _Exporter(TRACE_EXPORT)
+    return _EXPORTER
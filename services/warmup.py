@@ -0,0 +1,149 @@
+# services/warmup.py
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import threading
+import time
+
+from services import log
+from services.prompt_loader import preload as preload_prompts
+
+# LOE_WARMUP=0 skips the prompt preload and the gateway connection warm-up;
+# /ready is then true at once.
+WARMUP           = os.getenv("LOE_WARMUP", "1").lower() in {"1", "true", "yes"}
+WARM_CONNECTIONS = int(os.getenv("LOE_WARM_CONNECTIONS") or 2)
+
+# Every directory load_prompt_file() reads from (repo-relative).
+PROMPT_DIRS = (
+    "services/ingest/prompts",
+    "services/generator/modes/default",
+    "services/generator/modes/rack_stack",
+)
+
+logger = logging.getLogger(__name__)
+
+_READY = threading.Event()
+_STATE: dict = {"pid": None, "steps": {}, "errors": {}}
+_LOCK = threading.Lock()
+
+
+def preload() -> None:
+    """
+    Load the read-only data every request needs: prompt files into the
+    prompt cache (services/prompt_loader.py). rack_units.json and the
+    post-processing regexes are loaded and compiled by importing the app.
+    Runs at app import, so with gunicorn's
+    preload_app it happens once in the master and the forked workers share
+    the pages; the master also gc.freeze()s before forking (gunicorn.conf.py)
+    so the collector doesn't dirty them.
+    """
+    if not WARMUP:
+        return
+    t0 = time.perf_counter()
+    n = preload_prompts(PROMPT_DIRS)
+    _STATE["steps"]["prompts"] = {"files": n, "ms": log.elapsed_ms(t0)}
+
+
+def _warm_clients() -> None:
+    from adapters import get_client
+    t0 = time.perf_counter()
+    client = get_client()
+    warm = getattr(client, "warm", None)
+    if warm is not None:
+        _record_connections(warm(WARM_CONNECTIONS), t0)
+
+
+def _record_connections(result: dict, t0: float) -> None:
+    _STATE["steps"]["connections"] = {"endpoints": len(result), "ms": log.elapsed_ms(t0)}
+    for name, ok in result.items():
+        if ok is not True:
+            _STATE["errors"][name] = ok
+            logger.warning("gateway warm-up failed", extra={"endpoint": name, "error": ok})
+
+
+def _claim() -> bool:
+    """True for the first start in this process (a forked worker starts fresh)."""
+    with _LOCK:
+        if _STATE["pid"] == os.getpid():
+            return False
+        _STATE["pid"] = os.getpid()
+        _STATE["errors"] = {}
+        _READY.clear()
+        return True
+
+
+def _finish(t0: float) -> None:
+    _STATE["steps"]["total_ms"] = log.elapsed_ms(t0)
+    _READY.set()
+    logger.info("worker ready", extra={"warmup": _STATE["steps"]})
+
+
+def start(background: bool = True) -> None:
+    """
+    Per-worker warm-up (gunicorn post_worker_init, or the dev server): make
+    sure the preload happened, open pooled connections to the gateways, then
+    flip /ready. Warm-up failures are logged but never keep a worker unready.
+    """
+    if not _claim():
+        return
+
+    def _run():
+        t0 = time.perf_counter()
+        log.configure()  # this process' log writer thread
+        try:
+            if WARMUP:
+                if "prompts" not in _STATE["steps"]:
+                    preload()
+                _warm_clients()
+        except Exception as e:  # best effort
+            _STATE["errors"]["warmup"] = str(e)
+            logger.exception("warm-up failed")
+        _finish(t0)
+
+    if background:
+        threading.Thread(target=_run, name="loe-warmup", daemon=True).start()
+    else:
+        _run()
+
+
+async def astart() -> None:
+    """start() for the asyncio app: warms the async client's own pool."""
+    if not _claim():
+        return
+    from adapters import get_async_client
+    t0 = time.perf_counter()
+    log.configure()
+    try:
+        if WARMUP:
+            if "prompts" not in _STATE["steps"]:
+                preload()
+            t1 = time.perf_counter()
+            client = get_async_client()
+            awarm = getattr(client, "awarm", None)
+            if awarm is not None:
+                _record_connections(await awarm(WARM_CONNECTIONS), t1)
+    except Exception as e:
+        _STATE["errors"]["warmup"] = str(e)
+        logger.exception("warm-up failed")
+    _finish(t0)
+
+
+def is_ready() -> bool:
+    return _READY.is_set()
+
+
+def status() -> dict:
+    return {
+        "ready": is_ready(),
+        "pid": os.getpid(),
+        "warmup": dict(_STATE["steps"]),
+        "errors": dict(_STATE["errors"]),
+    }
+
+
+def freeze() -> None:
+    """gunicorn pre_fork: move everything loaded so far out of the GC's reach."""
+    if hasattr(gc, "freeze"):
+        gc.freeze()